@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from collections import namedtuple
+
+import numpy as np
+
+Waist = namedtuple("Waist", ["waist", "waist_position", "rayleigh_range", "q_param"])
+
+
+def free_space(distance: np.ndarray | float) -> np.ndarray:
+    """
+    Build ABCD matrices for free-space propagation
+
+    Args:
+        distance (np.ndarray | float): Propagation distances in mm
+
+    Returns:
+        matrix (np.ndarray): (..., 2, 2) ABCD matrices
+    """
+
+    distance = np.asarray(distance, dtype=float)
+    matrix = np.zeros(distance.shape + (2, 2))
+    matrix[..., 0, 0] = 1
+    matrix[..., 0, 1] = distance
+    matrix[..., 1, 1] = 1
+    return matrix
+
+
+def thin_lens(focal_length: np.ndarray | float) -> np.ndarray:
+    """
+    Build ABCD matrices for thin lenses
+
+    Args:
+        focal_length (np.ndarray | float): Focal lengths in mm
+
+    Returns:
+        matrix (np.ndarray): (..., 2, 2) ABCD matrices
+    """
+
+    focal_length = np.asarray(focal_length, dtype=float)
+    matrix = np.zeros(focal_length.shape + (2, 2))
+    matrix[..., 0, 0] = 1
+    matrix[..., 1, 0] = -1 / focal_length
+    matrix[..., 1, 1] = 1
+    return matrix
+
+
+def propagate(matrix: np.ndarray, q_param: np.ndarray | complex) -> np.ndarray:
+    """
+    Propagate complex beam parameters through ABCD matrices
+
+    Args:
+        matrix (np.ndarray): (..., 2, 2) ABCD matrices
+        q_param (np.ndarray | complex): Complex beam parameters (mm units), broadcast against matrix
+
+    Returns:
+        q_param (np.ndarray): Output complex beam parameters
+    """
+
+    A, B = matrix[..., 0, 0], matrix[..., 0, 1]
+    C, D = matrix[..., 1, 0], matrix[..., 1, 1]
+    q_param = np.asarray(q_param, dtype=complex)
+    return (A * q_param + B) / (C * q_param + D)
+
+
+def get_waist(q_param: np.ndarray | complex, wavelength: float) -> Waist:
+    """
+    Get the waist size and position of complex beam parameters
+
+    Args:
+        q_param (np.ndarray | complex): Complex beam parameters (mm units)
+        wavelength (float): Wavelength of the beam in nm
+
+    Returns:
+        waist (Waist): Waist radius, waist position relative to the q-parameter plane,
+                       Rayleigh range and q-parameter arrays
+    """
+
+    q_param = np.asarray(q_param, dtype=complex)
+    return Waist(
+        waist=np.sqrt(wavelength * 1e-6 * q_param.imag / np.pi),
+        waist_position=-q_param.real,
+        rayleigh_range=q_param.imag,
+        q_param=q_param,
+    )
+
+
+class AbcdChain:
+    """
+    Chain of free-space and interface ABCD matrices along a beam
+
+    Elements alternate between free-space propagation and interfaces,
+    starting at the beam origin and ending at the origin of the final segment
+
+    Args:
+        q_param (complex): Complex beam parameter at the start of the chain (mm units)
+        wavelength (float): Wavelength of the beam in nm
+        distances (list[float]): Free-space distance before each interface in mm
+        matrices (list[tuple]): (A, B, C, D) matrix of each interface
+        labels (list[str]): Label of each interface
+    """
+
+    def __init__(
+        self,
+        q_param: complex,
+        wavelength: float,
+        distances: list[float],
+        matrices: list[tuple],
+        labels: list[str] = None,
+    ):
+        if len(distances) != len(matrices):
+            raise ValueError("Each interface must have a preceding distance")
+
+        self.q_param = complex(q_param)
+        self.wavelength = wavelength
+        self.distances = [float(distance) for distance in distances]
+        self.matrices = [np.array(matrix, dtype=float).reshape(2, 2) for matrix in matrices]
+        if labels is None:
+            labels = [str(i) for i in range(len(matrices))]
+        self.labels = list(labels)
+
+    def __len__(self) -> int:
+        return len(self.matrices)
+
+    def get_matrix(
+        self,
+        distances: dict[int, np.ndarray] = None,
+        focal_lengths: dict[int | str, np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Build the total ABCD matrix of the chain for a sweep of parameters
+        All swept arrays are broadcast against each other
+
+        Args:
+            distances (dict[int, np.ndarray]): Free-space distances to override, keyed by element number
+            focal_lengths (dict[int | str, np.ndarray]): Interfaces to replace by thin lenses,
+                                                         keyed by element number or label
+
+        Returns:
+            matrix (np.ndarray): (..., 2, 2) total ABCD matrices
+        """
+
+        distances = {} if distances is None else distances
+        focal_lengths = {} if focal_lengths is None else focal_lengths
+        for key in focal_lengths:
+            if not isinstance(key, int) and key not in self.labels:
+                raise ValueError(f"No interface labeled {key} in chain")
+
+        total = np.eye(2)
+        for i, (distance, matrix, label) in enumerate(
+            zip(self.distances, self.matrices, self.labels)
+        ):
+            total = free_space(distances.get(i, distance)) @ total
+            if i in focal_lengths:
+                matrix = thin_lens(focal_lengths[i])
+            elif label in focal_lengths:
+                matrix = thin_lens(focal_lengths[label])
+            total = matrix @ total
+        return total
+
+    def sweep(
+        self,
+        q_params: np.ndarray | complex = None,
+        distances: dict[int, np.ndarray] = None,
+        focal_lengths: dict[int | str, np.ndarray] = None,
+    ) -> Waist:
+        """
+        Propagate input beams through the chain for a sweep of parameters in one batched pass
+
+        Args:
+            q_params (np.ndarray | complex): Input complex beam parameters (defaults to the traced input beam)
+            distances (dict[int, np.ndarray]): Free-space distances to override, keyed by element number
+            focal_lengths (dict[int | str, np.ndarray]): Interfaces to replace by thin lenses,
+                                                         keyed by element number or label
+
+        Returns:
+            waist (Waist): Waist radius, waist position relative to the final interface,
+                           Rayleigh range and q-parameter for each sweep point
+        """
+
+        if q_params is None:
+            q_params = self.q_param
+        matrix = self.get_matrix(distances, focal_lengths)
+        return get_waist(propagate(matrix, q_params), self.wavelength)
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+from copy import copy
+
+import numpy as np
+
+from PyOpticL.intersect import intersect
+from PyOpticL.trace import TraceScene, Tracer
+
+
+def axis_angle_matrix(axis: np.ndarray, angle: float) -> np.ndarray:
+    """
+    Build a rotation matrix from an axis and angle
+
+    Args:
+        axis (np.ndarray): (x, y, z) rotation axis
+        angle (float): Rotation angle in degrees
+
+    Returns:
+        rotation (np.ndarray): 3x3 rotation matrix
+    """
+
+    axis = np.asarray(axis, dtype=float)
+    axis = axis / np.linalg.norm(axis)
+    angle = np.deg2rad(angle)
+    cross = np.array(
+        [
+            [0, -axis[2], axis[1]],
+            [axis[2], 0, -axis[0]],
+            [-axis[1], axis[0], 0],
+        ]
+    )
+    return np.eye(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * cross @ cross
+
+
+class AlignmentVariable:
+    """
+    Degree of freedom of a beam child used by the alignment solver
+
+    Args:
+        name (str): Name of the beam child
+        kind (str): 'rotation' (angle in degrees about axis, relative to the current rotation)
+                    or 'constraint' (value of the child's placement constraint in mm)
+        axis (np.ndarray): (x, y, z) global rotation axis for rotations
+        step (float): Step used for finite-difference derivatives
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        axis: np.ndarray = (0, 0, 1),
+        step: float = 1e-4,
+    ):
+        if kind not in ("rotation", "constraint"):
+            raise ValueError("Alignment variable must be a 'rotation' or 'constraint'")
+        self.name = name
+        self.kind = kind
+        self.axis = np.asarray(axis, dtype=float)
+        self.step = step
+
+
+class AlignmentResult:
+    """
+    Result of an alignment solve
+
+    Args:
+        values (np.ndarray): Solved value of each variable
+        residuals (np.ndarray): Final (y, z) position error in mm and
+                                (y, z) direction error in the target interface frame
+        iterations (int): Number of iterations used
+        evaluations (int): Number of traces used
+        converged (bool): Whether the residual reached the requested tolerance
+        stalled (bool): Whether the solve stopped early because steps no longer
+                        reduced the error or changed the values by more than the tolerance
+    """
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        residuals: np.ndarray,
+        iterations: int,
+        evaluations: int,
+        converged: bool,
+        stalled: bool = False,
+    ):
+        self.values = values
+        self.residuals = residuals
+        self.iterations = iterations
+        self.evaluations = evaluations
+        self.converged = converged
+        self.stalled = stalled
+
+    def __repr__(self):
+        return (
+            f"AlignmentResult(values={self.values}, "
+            f"error={np.linalg.norm(self.residuals):.3g}, converged={self.converged}, "
+            f"stalled={self.stalled})"
+        )
+
+
+class AlignmentSolver:
+    """
+    Levenberg-Marquardt solver aligning a beam onto a target interface
+    Residuals are evaluated with the headless tracer and differentiated by finite differences
+
+    Args:
+        scene (TraceScene): Snapshot of a beam path
+        variables (list[AlignmentVariable]): Degrees of freedom to solve for
+        target (str): Name of the object the beam should hit
+        target_members (list[str]): Names of all objects belonging to the target (defaults to the target)
+        position (tuple): (y, z) target intercept in the frame of the target interface in mm
+        direction (np.ndarray): (x, y, z) target global beam direction
+                                (defaults to normal incidence on the target interface)
+        beam_index (int): Index of the beam to align (defaults to the lowest index beam reaching the target)
+        angle_weight (float): Weight of direction errors relative to position errors in mm per radian
+        policy (str): Work queue policy for tracing
+        max_depth (int): Maximum depth of the beam tree (None for no limit)
+        max_segments (int): Maximum number of segments in the beam tree (None for no limit)
+        min_power (float): Minimum relative power of traced beams (None for no limit)
+    """
+
+    def __init__(
+        self,
+        scene: TraceScene,
+        variables: list[AlignmentVariable],
+        target: str,
+        target_members: list[str] = None,
+        position: tuple = (0, 0),
+        direction: np.ndarray = None,
+        beam_index: int = None,
+        angle_weight: float = 100,
+        policy: str = "depth",
+        max_depth: int = None,
+        max_segments: int = None,
+        min_power: float = None,
+    ):
+        self.scene = scene
+        self.variables = variables
+        self.target = target
+        self.position = np.asarray(position, dtype=float)
+        self.direction = None if direction is None else np.asarray(direction, float)
+        self.beam_index = beam_index
+        self.angle_weight = angle_weight
+        self.policy = policy
+        self.max_depth = max_depth
+        self.max_segments = max_segments
+        self.min_power = min_power
+        self.evaluations = 0
+
+        members = [target] if target_members is None else target_members
+        self.members = set(members)
+        self.target_rows = np.flatnonzero(
+            np.isin(np.array(scene.owners, dtype=object), members)
+        )
+        if len(self.target_rows) == 0:
+            raise ValueError(f"Target {target} does not have any interfaces")
+
+        # all beam children are placed again by every trace
+        self.children = {}
+        self.active = scene.active.copy()
+        for child in scene.children:
+            self.children[child.name] = child
+            self.active[child.rows] = False
+        for variable in variables:
+            if variable.name not in self.children:
+                raise ValueError(f"{variable.name} is not a beam child")
+        self.roots = [record for record in scene.segments if record.parent is None]
+
+    def get_initial_values(self) -> np.ndarray:
+        """
+        Get the variable values of the unmodified scene
+
+        Returns:
+            values (np.ndarray): Initial value of each variable
+        """
+
+        return np.array(
+            [
+                0.0
+                if variable.kind == "rotation"
+                else self.children[variable.name].constraint_value
+                for variable in self.variables
+            ]
+        )
+
+    def build_scene(self, values: np.ndarray) -> TraceScene:
+        """
+        Create a copy of the scene with variables applied and all beam children unplaced
+
+        Args:
+            values (np.ndarray): Value of each variable
+
+        Returns:
+            scene (TraceScene): Scene ready to be traced
+        """
+
+        table = copy(self.scene.table)
+        table.positions = table.positions.copy()
+        table.normals = table.normals.copy()
+        transverses = self.scene.transverses.copy()
+
+        children = {}
+        for name, child in self.children.items():
+            child = copy(child)
+            child.placed = False
+            children[name] = child
+
+        for variable, value in zip(self.variables, values):
+            child = children[variable.name]
+            if variable.kind == "constraint":
+                child.constraint_value = value
+                continue
+
+            # rotate the child and its subcomponents about the child origin
+            rotation = axis_angle_matrix(variable.axis, value)
+            rows = child.rows
+            table.positions[rows] = (
+                child.base + (table.positions[rows] - child.base) @ rotation.T
+            )
+            table.normals[rows] = table.normals[rows] @ rotation.T
+            transverses[rows] = transverses[rows] @ rotation.T
+            child.interface_offset = rotation @ child.interface_offset
+            child.offset = rotation @ child.offset
+
+        scene = copy(self.scene)
+        scene.table = table
+        scene.transverses = transverses
+        scene.active = self.active.copy()
+        scene.children = [children[child.name] for child in self.scene.children]
+        scene.segments = [root.derive() for root in self.roots]
+        return scene
+
+    def get_residuals(self, values: np.ndarray) -> np.ndarray:
+        """
+        Trace the scene for a set of variable values and measure the error at the target
+
+        Args:
+            values (np.ndarray): Value of each variable
+
+        Returns:
+            residuals (np.ndarray): (y, z) position error in mm and weighted (y, z)
+                                    direction error in the target interface frame
+        """
+
+        scene = self.build_scene(values)
+        result = Tracer(
+            scene,
+            self.policy,
+            self.max_depth,
+            self.max_segments,
+            min_power=self.min_power,
+        ).trace()
+        self.evaluations += 1
+
+        records = [
+            record
+            for record in result.records
+            if record.alive
+            and record.end in self.members
+            and (self.beam_index is None or record.index == self.beam_index)
+        ]
+        if len(records) == 0:
+            raise RuntimeError(f"Beam does not reach target {self.target}")
+        record = min(records, key=lambda record: record.index)
+
+        intercepts, distances = intersect(
+            scene.table, record.position, record.direction, np.inf, self.target_rows
+        )
+        closest = int(np.argmin(distances))
+        if not np.isfinite(distances[closest]):
+            raise RuntimeError(f"Beam does not reach target {self.target}")
+        row = self.target_rows[closest]
+
+        # errors in the frame of the target interface
+        normal = scene.table.normals[row]
+        transverse = scene.transverses[row]
+        axes = np.stack([transverse, np.cross(normal, transverse)])
+        position = axes @ (intercepts[closest] - scene.table.positions[row])
+        direction = axes @ record.direction
+        if self.direction is not None:
+            direction = direction - axes @ self.direction
+        return np.concatenate(
+            [position - self.position, self.angle_weight * direction]
+        )
+
+    def get_jacobian(self, values: np.ndarray, residuals: np.ndarray) -> np.ndarray:
+        """
+        Estimate the Jacobian of the residuals by forward differences
+        Where a probe moves the beam off the target, a backward difference is used instead,
+        then both again with a smaller step (a variable without any usable probe gets a zero column)
+
+        Args:
+            values (np.ndarray): Value of each variable
+            residuals (np.ndarray): Residuals at values
+
+        Returns:
+            jacobian (np.ndarray): (4, V) derivative of each residual by each variable
+        """
+
+        jacobian = np.zeros((len(residuals), len(values)))
+        for i, variable in enumerate(self.variables):
+            for step in (
+                variable.step,
+                -variable.step,
+                variable.step / 10,
+                -variable.step / 10,
+            ):
+                shifted = values.copy()
+                shifted[i] += step
+                try:
+                    shifted_residuals = self.get_residuals(shifted)
+                except RuntimeError:
+                    continue
+                jacobian[:, i] = (shifted_residuals - residuals) / step
+                break
+        return jacobian
+
+    def solve(
+        self,
+        values: np.ndarray = None,
+        tolerance: float = 1e-6,
+        max_iterations: int = 50,
+    ) -> AlignmentResult:
+        """
+        Solve for the variable values that put the beam on target
+
+        Args:
+            values (np.ndarray): Starting values (defaults to the unmodified scene)
+            tolerance (float): Residual norm at which the solve has converged
+                               (it also stops once steps are smaller than this)
+            max_iterations (int): Maximum number of iterations
+
+        Returns:
+            result (AlignmentResult): Solved values and final residuals
+        """
+
+        if values is None:
+            values = self.get_initial_values()
+        values = np.asarray(values, dtype=float)
+        residuals = self.get_residuals(values)
+        cost = residuals @ residuals
+        damping = 1e-3
+
+        iteration = 0
+        converged = np.sqrt(cost) < tolerance
+        stalled = False
+        while not converged and not stalled and iteration < max_iterations:
+            iteration += 1
+            jacobian = self.get_jacobian(values, residuals)
+            normal = jacobian.T @ jacobian
+            gradient = jacobian.T @ residuals
+
+            # increase damping until a step reduces the error
+            while damping < 1e12:
+                scaled = normal + damping * np.diag(np.diag(normal) + 1e-12)
+                step = -np.linalg.lstsq(scaled, gradient, rcond=None)[0]
+                try:
+                    new_residuals = self.get_residuals(values + step)
+                except RuntimeError:
+                    damping *= 10
+                    continue
+                new_cost = new_residuals @ new_residuals
+                if new_cost < cost:
+                    break
+                damping *= 10
+            else:
+                stalled = True  # no step reduces the error any further
+                break
+
+            values = values + step
+            residuals, cost = new_residuals, new_cost
+            damping = max(damping / 10, 1e-12)
+            converged = np.sqrt(cost) < tolerance
+            stalled = not converged and np.linalg.norm(step) < tolerance
+
+        return AlignmentResult(
+            values=values,
+            residuals=residuals,
+            iterations=iteration,
+            evaluations=self.evaluations,
+            converged=bool(converged),
+            stalled=bool(stalled),
+        )
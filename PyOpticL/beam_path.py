@@ -1,17 +1,59 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from itertools import product
 from math import isclose
+from multiprocessing import get_all_start_methods, get_context
 from types import SimpleNamespace
 
 import FreeCAD as App
 import numpy as np
 import Part
 
+from PyOpticL.abcd import AbcdChain
+from PyOpticL.alignment import AlignmentResult, AlignmentSolver, AlignmentVariable
+from PyOpticL.caustic import Caustic, beam_radius, sample_caustic
+from PyOpticL.checkpoint import load_trace, save_trace, scene_fingerprint
+from PyOpticL.export import TraceWriter
 from PyOpticL.icons import beam_icon
-from PyOpticL.layout import Layout
-from PyOpticL.settings import get_enable_beam_transparency
+from PyOpticL.jones import JonesPath, polarizer_matrix, waveplate_matrix
+from PyOpticL.intersect import InterfaceTable, intersect
+from PyOpticL.layout import (
+    Layout,
+    compute_placements,
+    get_revision,
+    register_document_cache,
+    suspend_invalidation,
+)
+from PyOpticL.profiling import profile_scope, profiled
+from PyOpticL.settings import (
+    get_beam_shape_cache_directory,
+    get_beam_shape_cache_size,
+    get_beam_shape_tolerance,
+    get_enable_beam_transparency,
+    get_max_trace_depth,
+    get_max_trace_segments,
+    get_min_trace_power,
+    get_trace_checkpoint_directory,
+    get_trace_queue_policy,
+)
+from PyOpticL.shape_cache import ShapeCache, quantize
+from PyOpticL.spatial import SegmentIndex
+from PyOpticL.tolerance import Tolerance, ToleranceAnalysis, ToleranceResult
+from PyOpticL.trace import (
+    BeamBundle,
+    ChildSpec,
+    Ghost,
+    SegmentRecord,
+    TraceResult,
+    TraceScene,
+    Tracer,
+    trace_ghosts,
+    trace_scene,
+)
 from PyOpticL.utils import Dimension as dim
-from PyOpticL.utils import collect_children, wavelength_to_rgb
+from PyOpticL.utils import collect_children, rotation_matrix, wavelength_to_rgb
 
 JonesComponent = tuple[float, float]  # (real, imag)
 JonesState = tuple[JonesComponent, JonesComponent]  # ((Ex_re, Ex_im), (Ey_re, Ey_im))
@@ -91,6 +133,10 @@ def elliptical_polarization(
     return _serialize_jones_vector((phase * ex, phase * ey))
 
 
+# beam shapes shared between segments with the same beam parameters
+_beam_shapes = ShapeCache()
+
+
 class DeleteObserver:
     def __init__(self, names):
         self.names = names
@@ -102,6 +148,75 @@ class DeleteObserver:
         App.removeDocumentObserver(self)
 
 
+class TransformCache:
+    """
+    Cache of interface lists and global object transforms used while computing beam paths
+    Transforms are keyed by object and placement revision, so moved objects are refreshed
+    """
+
+    def __init__(self):
+        self.interfaces = {}  # (document, object) -> interfaces
+        self.transforms = {}  # (document, object) -> (revision, base, rotation)
+
+    def get_interfaces(self, obj: App.DocumentObject) -> list[Interface]:
+        """
+        Get the interfaces of an object, built once per cache
+
+        Args:
+            obj (App.DocumentObject): Object providing the interfaces
+
+        Returns:
+            interfaces (list[Interface]): Interfaces of the object
+        """
+
+        key = (obj.Document.Name, obj.Name)
+        if key not in self.interfaces:
+            self.interfaces[key] = obj.Proxy.interfaces()
+        return self.interfaces[key]
+
+    def get_transform(self, proxy: Layout) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the global transform of an object
+
+        Args:
+            proxy (Layout): Proxy of the object
+
+        Returns:
+            base (np.ndarray): (x, y, z) global position of the object
+            rotation (np.ndarray): 3x3 global rotation matrix of the object
+        """
+
+        key = (proxy.document_id, proxy.object_id)
+        revision = getattr(proxy, "placement_revision", 0)
+        cached = self.transforms.get(key)
+        if cached is None or cached[0] != revision:
+            placement = proxy.get_object().Placement
+            base = np.array(placement.Base)
+            cached = (revision, base, rotation_matrix(placement.Rotation))
+            self.transforms[key] = cached
+        return cached[1], cached[2]
+
+
+# transform cache shared by all beam paths during a compute, None when idle
+_transform_cache = None
+
+
+def get_interfaces(obj: App.DocumentObject) -> list[Interface]:
+    """
+    Get the interfaces of an object, using the transform cache when active
+
+    Args:
+        obj (App.DocumentObject): Object providing the interfaces
+
+    Returns:
+        interfaces (list[Interface]): Interfaces of the object
+    """
+
+    if _transform_cache is not None:
+        return _transform_cache.get_interfaces(obj)
+    return obj.Proxy.interfaces()
+
+
 class BeamSegment(Layout):
     """
     Class representing a beam segment
@@ -119,6 +234,7 @@ class BeamSegment(Layout):
         waist_position (float): Position of the beam waist in mm
         waist (float): Beam waist radius in mm
         rayleigh_range (float): Rayleigh range in mm
+        frequency (float): Optical frequency shift of the beam in Hz
     """
 
     object_group = "beam_path"
@@ -134,6 +250,7 @@ class BeamSegment(Layout):
         waist_position: dim,
         waist: dim = None,
         rayleigh_range: dim = None,
+        frequency: float = 0,
     ):
 
         super().__init__(
@@ -146,6 +263,8 @@ class BeamSegment(Layout):
         self.set_polarization_state(polarization)
         self.power = power
         self.waist_position = waist_position
+        self.frequency = frequency
+        self.bundle = None  # members of a bundle segment, see set_bundle
         self.distance = 0  # to be set during path calculation
 
         if rayleigh_range is not None:
@@ -330,6 +449,118 @@ class BeamSegment(Layout):
         relative_direction = rotation.inverted().multVec(App.Vector(*global_direction))
         return np.array(relative_direction)
 
+    def to_record(self, placement: App.Placement = None) -> SegmentRecord:
+        """
+        Convert this beam segment to a document independent segment record
+
+        Args:
+            placement (App.Placement): Global placement of the segment (defaults to current placement)
+
+        Returns:
+            record (SegmentRecord): Record with the same beam properties in the global frame
+        """
+
+        obj = self.get_object()
+        if placement is None:
+            placement = obj.Placement
+
+        record = SegmentRecord(
+            index=self.index,
+            position=np.array(placement.Base),
+            direction=np.array(placement.Rotation.multVec(App.Vector(*self.direction))),
+            wavelength=self.wavelength,
+            jones=_normalize_jones_vector(self.polarization_jones),
+            power=self.power,
+            waist_position=self.waist_position,
+            rayleigh_range=self.rayleigh_range,
+            frequency=getattr(self, "frequency", 0),
+        )
+        record.bundle = self.get_bundle(placement.Rotation)
+        record.distance = self.distance
+        if obj.StartObject is not None:
+            record.start = obj.StartObject.Name
+        if obj.EndObject is not None:
+            record.end = obj.EndObject.Name
+        record.name = obj.Name
+        return record
+
+    def add_output(self, record: SegmentRecord) -> BeamSegment:
+        """
+        Add a child beam segment created from a segment record
+
+        Args:
+            record (SegmentRecord): Output beam in the global frame
+
+        Returns:
+            output_beam (BeamSegment): The added child beam segment
+        """
+
+        output_beam = BeamSegment(
+            index=record.index,
+            direction=self.get_relative_direction(record.direction),
+            wavelength=record.wavelength,
+            polarization=record.jones,
+            power=record.power,
+            waist_position=record.waist_position,
+            rayleigh_range=record.rayleigh_range,
+            frequency=record.frequency,
+        )
+        output_beam.set_bundle(record.bundle, self.get_object().Placement.Rotation)
+        self.add(output_beam, origin=self.get_relative_position(record.position))
+        return output_beam
+
+    def set_bundle(self, bundle: BeamBundle, rotation: App.Rotation):
+        """
+        Store the members of a bundle segment
+        Member directions are stored relative to the segment like the beam direction
+
+        Args:
+            bundle (BeamBundle): Members in the global frame (None for a plain segment)
+            rotation (App.Rotation): Global rotation of the segment
+        """
+
+        if bundle is None:
+            self.bundle = None
+            return
+
+        inverse = rotation.inverted()
+        self.bundle = dict(
+            indices=[int(index) for index in bundle.indices],
+            directions=[
+                tuple(inverse.multVec(App.Vector(*direction)))
+                for direction in bundle.directions
+            ],
+            powers=[float(power) for power in bundle.powers],
+            frequencies=[float(frequency) for frequency in bundle.frequencies],
+            distances=[float(distance) for distance in bundle.distances],
+        )
+
+    def get_bundle(self, rotation: App.Rotation) -> BeamBundle:
+        """
+        Get the members of a bundle segment
+
+        Args:
+            rotation (App.Rotation): Global rotation of the segment
+
+        Returns:
+            bundle (BeamBundle): Members in the global frame (None for a plain segment)
+        """
+
+        if getattr(self, "bundle", None) is None:
+            return None
+
+        bundle = BeamBundle(
+            self.bundle["indices"],
+            [
+                rotation.multVec(App.Vector(*direction))
+                for direction in self.bundle["directions"]
+            ],
+            self.bundle["powers"],
+            self.bundle["frequencies"],
+        )
+        bundle.distances = np.array(self.bundle["distances"])
+        return bundle
+
     def get_q_parameter(self) -> complex:
         """
         Calculate the complex beam parameter
@@ -351,11 +582,26 @@ class BeamSegment(Layout):
             w_f (float): Beam radius at the given position in mm
         """
 
-        z_f = q_param.real
-        z_R = q_param.imag
-        w_0 = np.sqrt(self.wavelength * 1e-6 * z_R / np.pi)  # beam waist
-        w_f = w_0 * np.sqrt(1 + (z_f / z_R) ** 2)  # beam radius
-        return w_f
+        return float(beam_radius(q_param, self.wavelength))
+
+    def get_caustic(self, z: np.ndarray = None, samples: int = 100) -> Caustic:
+        """
+        Sample the beam radius, wavefront curvature and Gouy phase along the segment
+
+        Args:
+            z (np.ndarray): Distances from the segment origin to sample at in mm
+                            (defaults to evenly spaced samples over the segment)
+            samples (int): Number of samples if z is not given
+
+        Returns:
+            caustic (Caustic): Sampled z, radius, curvature, gouy_phase and segment arrays
+        """
+
+        if z is None:
+            z = np.linspace(0, self.distance, samples)
+        return sample_caustic(
+            [self.get_q_parameter()], [self.wavelength], [self.distance], z
+        )
 
     def get_next_beam_point(self, q_param, ddw: float) -> float:
         """
@@ -385,6 +631,94 @@ class BeamSegment(Layout):
 
         return z_f - z_i
 
+    def get_profile(
+        self, ddw: float, distance: float = None
+    ) -> list[tuple[float, float]]:
+        """
+        Sample the beam radius along the segment
+        Points are spaced by change in slope, so the profile is dense near the waist
+
+        Args:
+            ddw (float): Minimum change in beam slope between points
+            distance (float): Length to sample over in mm (defaults to the segment length)
+
+        Returns:
+            profile (list): (z, radius) points from the start to the end of the segment in mm
+        """
+
+        if distance is None:
+            distance = self.distance
+
+        q_param = self.get_q_parameter()  # initial q parameter
+        current_position = 0  # track position along beam segment
+        profile = [(0, self.get_beam_radius(q_param))]
+        while current_position < distance:
+            dz = self.get_next_beam_point(q_param, ddw)  # get next point distance
+            dz = min(dz, distance - current_position)  # clip to remaining distance
+            # step q_param and update position
+            q_param += dz
+            current_position += dz
+            profile.append((current_position, self.get_beam_radius(q_param)))
+        return profile
+
+    def build_shape(self, ddw: float, distance: float = None) -> Part.Shape:
+        """
+        Build the beam shape along the x-axis by revolving the beam profile
+
+        Args:
+            ddw (float): Minimum change in beam slope between profile points
+            distance (float): Length of the shape in mm (defaults to the segment length)
+
+        Returns:
+            shape (Part.Shape): Solid beam shape starting at the origin
+        """
+
+        if distance is None:
+            distance = self.distance
+
+        profile = self.get_profile(ddw, distance)
+        points = [App.Vector(0, 0, 0)]
+        points += [App.Vector(z, radius, 0) for z, radius in profile]
+        points += [App.Vector(distance, 0, 0), App.Vector(0, 0, 0)]
+        face = Part.Face(Part.makePolygon(points))
+        return face.revolve(App.Vector(0, 0, 0), App.Vector(1, 0, 0), 360)
+
+    def get_aligned_shape(self, direction: tuple, distance: float) -> Part.Shape:
+        """
+        Get the beam shape along a direction relative to the segment
+        Segments with the same beam parameters share their shape
+
+        Args:
+            direction (tuple): (x, y, z) direction of the beam relative to the segment
+            distance (float): Length of the beam in mm
+
+        Returns:
+            shape (Part.Shape): Solid beam shape starting at the segment origin
+        """
+
+        tolerance = get_beam_shape_tolerance()
+        key = (
+            quantize(self.waist_position),
+            quantize(self.rayleigh_range),
+            quantize(distance),
+            quantize(self.wavelength),
+            quantize(tolerance),
+        )
+        _beam_shapes.max_size = get_beam_shape_cache_size()
+        shape = _beam_shapes.get(
+            key,
+            lambda: self.build_shape(tolerance, distance),
+            directory=get_beam_shape_cache_directory(),
+        )
+
+        # cached shapes lie along the x-axis, rotate onto the beam direction
+        shape.Placement = App.Placement(
+            App.Vector(0, 0, 0),
+            App.Rotation(App.Vector(1, 0, 0), App.Vector(*direction)),
+        )
+        return shape
+
+    @profiled("compute_shape")
     def compute_shape(self):
         """
         Calculate the beam segment properties
@@ -398,52 +732,21 @@ class BeamSegment(Layout):
         else:
             self.relative_power = 1.0
 
-        # generate segment shape using conical sections
-        shapes = []
-        q_param = self.get_q_parameter()  # initial q parameter
-        current_position = 0  # track position along beam segments
-        while current_position < self.distance:
-            # TODO: may want to make ddw a user-defined parameter
-            dz = self.get_next_beam_point(q_param, 1e-3)  # get next segment distance
-            dz = min(dz, self.distance - current_position)  # clip to remaining distance
-            # calculate starting and ending radius for segment
-            radius1 = self.get_beam_radius(q_param)
-            radius2 = self.get_beam_radius(q_param + dz)
-            # create conical section
-            # freecad does not support cones with equal radii
-            if isclose(radius1, radius2):
-                shape = Part.makeCylinder(
-                    radius1,
-                    dz,
-                    App.Vector(*self.direction) * current_position,
-                    App.Vector(*self.direction),
-                )
-            else:
-                shape = Part.makeCone(
-                    radius1,
-                    radius2,
-                    dz,
-                    App.Vector(*self.direction) * current_position,
-                    App.Vector(*self.direction),
-                )
-            shapes.append(shape)
-            # step q_param and update position
-            q_param += dz
-            current_position += dz
-        # add sphere as cap for smoother beam transitions
-        beam_radius = self.get_beam_radius(self.get_q_parameter() + self.distance)
-        # sphere = Part.makeSphere(
-        #     beam_radius,
-        #     App.Vector(*self.direction) * self.distance,
-        # )
-        # shapes.append(sphere)
-        # fuse all shapes together
-        shape = shapes[0]
-        for s in shapes[1:]:
-            shape = shape.fuse(s)
+        # bundle segments show one beam per member
+        if getattr(self, "bundle", None) is not None:
+            shape = Part.makeCompound(
+                [
+                    self.get_aligned_shape(direction, distance)
+                    for direction, distance in zip(
+                        self.bundle["directions"], self.bundle["distances"]
+                    )
+                ]
+            )
+        else:
+            shape = self.get_aligned_shape(self.direction, self.distance)
 
         # apply placement and set shape
-        shape.Placement = obj.Placement
+        shape.Placement = obj.Placement * shape.Placement
         obj.Shape = shape
         # color and transparency based on wavelength and power
         obj.ViewObject.ShapeColor = wavelength_to_rgb(self.wavelength)
@@ -476,14 +779,19 @@ class BeamSegment(Layout):
             dim(1.5, "mm"),
             App.Vector(0, 0, 0),
         )
-        part = part.fuse(
-            Part.makeCylinder(
-                dim(1.5, "mm"),
-                self.distance,
-                App.Vector(0, 0, 0),
-                App.Vector(*self.direction),
+        if getattr(self, "bundle", None) is not None:
+            members = zip(self.bundle["directions"], self.bundle["distances"])
+        else:
+            members = [(self.direction, self.distance)]
+        for direction, distance in members:
+            part = part.fuse(
+                Part.makeCylinder(
+                    dim(1.5, "mm"),
+                    distance,
+                    App.Vector(0, 0, 0),
+                    App.Vector(*direction),
+                )
             )
-        )
         return part
 
     def recompute(self):
@@ -517,6 +825,7 @@ class BeamPath(Layout):
 
     object_group = "beam_path"
     object_icon = beam_icon
+    keeps_parent_rotation = True  # the base rotation only sets the input beam direction
 
     def __init__(
         self,
@@ -648,103 +957,1024 @@ class BeamPath(Layout):
         child.make_property("Offset", "App::PropertyVector", editable=True)
         child_obj.Offset = App.Vector(0, offset[0], offset[1])
 
-        return child
+        return child
+
+    def measure_properties(self, after_object: Layout, beam_index: int = None):
+        """
+        Measures the properties of a beam mid-layout
+        Only the part of the trace needed to reach the object is run and results are
+        memoized until the layout changes, the document is not modified
+
+        Args:
+            after_object (Layout): The object after which to measure the beam
+            beam_index (int): The index of the beam to measure (defaults to the lowest index beam after object)
+
+        Returns: A beam properties object containing the following attributes
+            beam_obj: The BeamSegment object representing the beam (None if not yet in the document)
+            beam_waist: The beam waist
+            waist_position: The position of the waist (relative to after_object)
+            rayleigh_range: The beam's rayleigh range
+            wavelength: The beam's wavelength
+            polarization_angle: The beam's polarization angle
+            power: The beam's power
+            initial_radius: The beam's radius at the object
+            final_radius: The beam's final radius (at the time of measurement)
+            segment_length: The beam's segment length
+            position: The position of the beam (relative to the beam path object)
+            rotation: The beam's rotation (relative to the beam path object)
+        """
+        global _measurements_revision
+
+        obj = self.get_object()
+        after_obj = after_object.get_object()
+
+        # results stay valid until the structure of any layout changes
+        key = (obj.Document.Name, obj.Name, after_obj.Name, beam_index)
+        revision = get_revision()
+        if revision != _measurements_revision:
+            _measurements.clear()
+            _measurements_revision = revision
+        elif key in _measurements:
+            return _measurements[key]
+
+        # placements are needed for the snapshot, compute them top down
+        # (this does not change the layout revision)
+        ancestors = []
+        parent = obj
+        while parent is not None:
+            ancestors.append(parent)
+            parent = parent.Parent
+        for ancestor in reversed(ancestors):
+            ancestor.Proxy.compute_placement()
+        compute_placements(obj.BoundParent)
+        for child in obj.BeamChildren:
+            # beam children outside the bound parent are placed separately
+            parent = child.Parent
+            while parent is not None and parent != obj.BoundParent:
+                parent = parent.Parent
+            if parent is None:
+                compute_placements(child)
+
+        def matches(record: SegmentRecord) -> bool:
+            return (
+                record.alive
+                and record.end == after_obj.Name
+                and (beam_index is None or record.index == beam_index)
+            )
+
+        # only trace as far as needed to reach the object
+        scene = self.snapshot()
+        record = next((record for record in scene.segments if matches(record)), None)
+        if record is None:
+            tracer = Tracer(
+                scene,
+                policy=get_trace_queue_policy(),
+                max_depth=get_max_trace_depth(),
+                max_segments=get_max_trace_segments(),
+                min_power=get_min_trace_power(),
+            )
+            result = tracer.trace(stop=matches)
+            record = next((record for record in result.records if matches(record)), None)
+
+        properties = None
+        if record is not None:
+            properties = self.get_record_properties(record)
+        _measurements[key] = properties
+        return properties
+
+    def get_record_properties(self, record: SegmentRecord) -> SimpleNamespace:
+        """
+        Get the readout properties of a traced segment, as shown on beam segment objects
+
+        Args:
+            record (SegmentRecord): Traced segment in the global frame
+
+        Returns:
+            properties (SimpleNamespace): Beam properties (see measure_properties)
+        """
+
+        obj = self.get_object()
+        path_rotation = App.Rotation("XYZ", 0, 0, 0)
+        if obj.Parent != None:
+            path_rotation = obj.Parent.Placement.Rotation
+        inverse = path_rotation.inverted()
+
+        # positions of segments are stored relative to their parent segment
+        if record.parent is not None:
+            origin = record.parent.position
+        else:
+            origin = np.array(obj.Placement.Base)
+        position = inverse.multVec(App.Vector(*(record.position - origin)))
+        direction = inverse.multVec(App.Vector(*record.direction))
+        rotation = App.Rotation(App.Vector(1, 0, 0), direction)
+
+        ex, ey = _normalize_jones_vector(record.jones)
+        s1 = np.abs(ex) ** 2 - np.abs(ey) ** 2
+        s2 = 2 * np.real(ex * np.conjugate(ey))
+
+        q_param = record.q_parameter
+        return SimpleNamespace(
+            beam_obj=(
+                obj.Document.getObject(record.name).Proxy
+                if record.name is not None
+                else None
+            ),
+            beam_waist=float(beam_radius(q_param + record.waist_position, record.wavelength)),
+            waist_position=record.waist_position,
+            rayleigh_range=record.rayleigh_range,
+            wavelength=App.Units.Quantity(f"{record.wavelength} nm").Value,
+            polarization_angle=float(np.degrees(0.5 * np.arctan2(s2, s1)) % 180),
+            power=App.Units.Quantity(f"{record.power} W").Value,
+            initial_radius=float(beam_radius(q_param, record.wavelength)),
+            final_radius=float(beam_radius(q_param + record.distance, record.wavelength)),
+            segment_length=record.distance,
+            position=position,
+            rotation=rotation.getYawPitchRoll()[::-1],
+        )
+
+    def get_beam_children(self, beam_index: int, pending: bool = False) -> list[Layout]:
+        """
+        Get the beam children interacting with a beam index
+
+        Args:
+            beam_index (int): Index of the beam
+            pending (bool): Whether to only return children that have not been placed yet
+
+        Returns:
+            children (list[Layout]): Beam children in the order they were added
+        """
+
+        return [
+            child.Proxy
+            for child in self.get_object().BeamChildren
+            if child.Proxy.beam_index == beam_index
+            and not (pending and child.Proxy.placed)
+        ]
+
+    def get_index_path(self, beam_index: int) -> list[BeamSegment]:
+        """
+        Get the chain of beam segments leading to and following a beam index
+
+        Args:
+            beam_index (int): Index of the beam to follow
+
+        Returns:
+            segments (list[BeamSegment]): Segments from the input beam to the end of the beam
+        """
+
+        def leads_to(index: int) -> bool:
+            # beam indices are extended bitwise at each split
+            shift = beam_index.bit_length() - index.bit_length()
+            return shift >= 0 and beam_index >> shift == index
+
+        obj = self.get_object()
+        roots = [
+            beam
+            for beam in obj.BeamSegments
+            if not isinstance(beam.Parent.Proxy, BeamSegment)
+        ]
+        segments = []
+        current = roots[0] if len(roots) > 0 else None
+        while current is not None:
+            segments.append(current.Proxy)
+            current = next(
+                (
+                    child
+                    for child in current.Children
+                    if isinstance(child.Proxy, BeamSegment)
+                    and leads_to(child.Proxy.index)
+                ),
+                None,
+            )
+        return segments
+
+    def get_caustic(
+        self, beam_index: int, z: np.ndarray = None, samples: int = 1000
+    ) -> Caustic:
+        """
+        Sample the beam radius, wavefront curvature and Gouy phase along a beam index path
+        The beam path must already be computed
+
+        Args:
+            beam_index (int): Index of the beam to follow
+            z (np.ndarray): Distances along the beam from the beam path origin in mm
+                            (defaults to evenly spaced samples over the whole beam)
+            samples (int): Number of samples if z is not given
+
+        Returns:
+            caustic (Caustic): Sampled z, radius, curvature, gouy_phase and segment arrays
+                               (segment indexes the list returned by get_index_path)
+        """
+
+        segments = self.get_index_path(beam_index)
+        if len(segments) == 0:
+            raise RuntimeError("Beam path has no beam segments, recompute it first")
+
+        lengths = np.array([segment.distance for segment in segments])
+        if z is None:
+            z = np.linspace(0, lengths.sum(), samples)
+        return sample_caustic(
+            [segment.get_q_parameter() for segment in segments],
+            [segment.wavelength for segment in segments],
+            lengths,
+            z,
+        )
+
+    def get_end_interface(self, segment: BeamSegment) -> Interface:
+        """
+        Get the interface a computed beam segment ends at
+
+        Args:
+            segment (BeamSegment): Segment to look up
+
+        Returns:
+            interface (Interface): Interface of the end object closest to the end of the segment
+        """
+
+        end_obj = segment.get_object().EndObject
+        if end_obj is None:
+            raise RuntimeError("Beam segment does not end at an object")
+
+        # gather all interfaces associated with the end object
+        objs = [end_obj]
+        collect_children(end_obj, objs)
+        interfaces = []
+        for obj in objs:
+            if hasattr(obj.Proxy, "interfaces"):
+                interfaces.extend(get_interfaces(obj))
+
+        end_position = (
+            segment.get_global_position()
+            + segment.get_global_direction() * segment.distance
+        )
+        return min(
+            interfaces,
+            key=lambda interface: np.linalg.norm(
+                interface.get_global_position() - end_position
+            ),
+        )
+
+    def get_jones_path(self, beam_index: int) -> JonesPath:
+        """
+        Build the chain of interface Jones matrices along a beam index path
+        The beam path must already be computed
+
+        Args:
+            beam_index (int): Index of the beam to follow
+
+        Returns:
+            path (JonesPath): Chain from the beam path origin to the origin of the final segment
+        """
+
+        segments = self.get_index_path(beam_index)
+        if len(segments) == 0:
+            raise RuntimeError("Beam path has no beam segments, recompute it first")
+
+        matrices, labels, retardances = [], [], []
+        for segment, next_segment in zip(segments[:-1], segments[1:]):
+            interface = self.get_end_interface(segment)
+
+            # the next segment is reflected if it leaves along the mirrored direction
+            direction = segment.get_global_direction()
+            normal = interface.get_global_normal()
+            mirrored = direction - 2 * np.dot(direction, normal) * normal
+            reflected = np.allclose(
+                next_segment.get_global_direction(), mirrored, atol=1e-6
+            )
+
+            matrices.append(interface.get_jones_matrix(reflected))
+            labels.append(segment.get_object().EndObject.Label)
+            retardances.append(getattr(interface, "retardance", None))
+
+        return JonesPath(matrices, labels, retardances)
+
+    def get_abcd_chain(self, beam_index: int) -> AbcdChain:
+        """
+        Build the chain of free-space and interface ABCD matrices along a beam index path
+        The beam path must already be computed
+
+        Args:
+            beam_index (int): Index of the beam to follow
+
+        Returns:
+            chain (AbcdChain): Chain from the beam path origin to the origin of the final segment
+        """
+
+        segments = self.get_index_path(beam_index)
+        if len(segments) == 0:
+            raise RuntimeError("Beam path has no beam segments, recompute it first")
+
+        distances, matrices, labels = [], [], []
+        for segment in segments[:-1]:
+            interface = self.get_end_interface(segment)
+            distances.append(segment.distance)
+            matrices.append(interface.abcd_matrix)
+            labels.append(segment.get_object().EndObject.Label)
+
+        return AbcdChain(
+            q_param=segments[0].get_q_parameter(),
+            wavelength=segments[-1].wavelength,
+            distances=distances,
+            matrices=matrices,
+            labels=labels,
+        )
+
+    def analyze_tolerances(
+        self,
+        tolerances: dict[Layout, Tolerance],
+        end_objects: list[Layout],
+        samples: int = 1000,
+        seed: int = None,
+        processes: int = None,
+    ) -> list[ToleranceResult]:
+        """
+        Run a Monte Carlo analysis of placement errors on a snapshot of the beam path
+        Samples are traced headlessly, the document is only recomputed once
+
+        Args:
+            tolerances (dict[Layout, Tolerance]): Placement error distribution of each object,
+                                                  subcomponents move with their parent
+            end_objects (list[Layout]): Objects to measure beam position, angle and coupling at
+            samples (int): Number of samples
+            seed (int): Seed for the random number generator
+            processes (int): Number of worker processes (defaults to the number of cores, 1 for serial)
+
+        Returns:
+            results (list[ToleranceResult]): Errors at each end object, in order
+        """
+
+        self.recompute()
+        scene = self.snapshot()
+
+        groups, frames = {}, {}
+        for layout in [*tolerances, *end_objects]:
+            obj = layout.get_object()
+            members = [obj]
+            collect_children(obj, members)
+            groups[obj.Name] = [member.Name for member in members]
+            frames[obj.Name] = (
+                np.array(obj.Placement.Base),
+                rotation_matrix(obj.Placement.Rotation),
+            )
+
+        analysis = ToleranceAnalysis(
+            scene,
+            {
+                layout.get_object().Name: tolerance
+                for layout, tolerance in tolerances.items()
+            },
+            [layout.get_object().Name for layout in end_objects],
+            groups=groups,
+            frames=frames,
+            policy=get_trace_queue_policy(),
+            max_depth=get_max_trace_depth(),
+            max_segments=get_max_trace_segments(),
+            min_power=get_min_trace_power(),
+        )
+        return analysis.run(samples, seed, processes)
+
+    def align(
+        self,
+        target: Layout,
+        rotations: list[Layout] = (),
+        constraints: list[Layout] = (),
+        position: tuple = (0, 0),
+        direction: tuple = None,
+        beam_index: int = None,
+        axis: tuple = (0, 0, 1),
+        apply: bool = True,
+    ) -> AlignmentResult:
+        """
+        Solve for beam child rotations and placement constraints that put the beam on a target
+
+        Args:
+            target (Layout): Object the beam should hit
+            rotations (list[Layout]): Beam children whose rotation about axis is solved for
+            constraints (list[Layout]): Beam children whose placement constraint value is solved for
+            position (tuple): (y, z) target intercept relative to the center of the target interface
+            direction (tuple): (x, y, z) target beam direction in the beam path frame
+                               (defaults to normal incidence on the target interface)
+            beam_index (int): Index of the beam to align (defaults to the lowest index beam reaching the target)
+            axis (tuple): (x, y, z) rotation axis in the beam path frame
+            apply (bool): Whether to apply the solution to the document and re-trace the beam path
+                          (only done if the solve converged)
+
+        Returns:
+            result (AlignmentResult): Solved values (rotation angles in degrees relative to the
+                                      current rotation, then constraint values) and final residuals
+        """
+
+        self.recompute()
+        obj = self.get_object()
+        path_rotation = obj.Placement.Rotation
+        global_axis = np.array(path_rotation.multVec(App.Vector(*axis)))
+
+        variables = [
+            AlignmentVariable(child.get_object().Name, "rotation", axis=global_axis)
+            for child in rotations
+        ] + [
+            AlignmentVariable(child.get_object().Name, "constraint", step=1e-3)
+            for child in constraints
+        ]
+
+        target_obj = target.get_object()
+        members = [target_obj]
+        collect_children(target_obj, members)
+        if direction is not None:
+            direction = np.array(path_rotation.multVec(App.Vector(*direction)))
+
+        solver = AlignmentSolver(
+            self.snapshot(),
+            variables,
+            target=target_obj.Name,
+            target_members=[member.Name for member in members],
+            position=position,
+            direction=direction,
+            beam_index=beam_index,
+            policy=get_trace_queue_policy(),
+            max_depth=get_max_trace_depth(),
+            max_segments=get_max_trace_segments(),
+            min_power=get_min_trace_power(),
+        )
+        result = solver.solve()
+        if not apply:
+            return result
+        if not result.converged:
+            print(
+                f"Warning: Alignment of {obj.Label} did not converge, the solution was not applied ({result})"
+            )
+            return result
+
+        # apply solved values, rotations are about the axis in the beam path frame
+        document = obj.Document
+        for variable, value in zip(variables, result.values):
+            child_obj = document.getObject(variable.name)
+            if variable.kind == "rotation":
+                child_obj.BasePlacement = App.Placement(
+                    child_obj.BasePlacement.Base,
+                    App.Rotation(App.Vector(*axis), value)
+                    * child_obj.BasePlacement.Rotation,
+                )
+            else:
+                child_obj.ConstraintValue = value
+
+        # place all beam children again and re-trace from the input beam
+        for child_obj in obj.BeamChildren:
+            child_obj.Proxy.placed = False
+        roots = [
+            beam.Name
+            for beam in obj.BeamSegments
+            if not isinstance(beam.Parent.Proxy, BeamSegment)
+        ]
+        self.retrace(roots)
+        # the whole path was traced again, the writes above are accounted for
+        self.path_dirty = False
+        return result
+
+    def compute_path(self):
+        """
+        Calculate the beam path through the layout
+        """
+
+        global _transform_cache
+
+        obj = self.get_object()
+
+        # reset rotation so that child placements are correct
+        if obj.Parent != None:
+            obj.Placement.Rotation = obj.Parent.Placement.Rotation
+        else:
+            obj.Placement.Rotation = App.Rotation("XYZ", 0, 0, 0)
+
+        # transforms are cached for the outermost compute and dropped afterwards
+        outermost = _transform_cache is None
+        if outermost:
+            _transform_cache = TransformCache()
+        try:
+            with profile_scope(obj.Label):
+                # use a trace computed ahead of time by recompute_parallel if available
+                result = _precomputed_traces.pop((obj.Document.Name, obj.Name), None)
+                if result is None:
+                    result = self.trace()
+                else:
+                    self.report_stats(result)
+                self.materialize(result)
+        finally:
+            if outermost:
+                _transform_cache = None
+        # placing children flags the beam path itself
+        self.path_dirty = False
+
+        obj.purgeTouched()  # prevent triggering recompute
+
+    def bound_changed(self):
+        """Called when an object under the bound parent changes, the path is re-traced"""
+
+        self.path_dirty = True
+
+    def is_dirty(self) -> bool:
+        """
+        Check if the beam path or any of its beam children needs to be recomputed
+
+        Returns:
+            dirty (bool): Whether a recompute would change anything
+        """
+
+        return super().is_dirty() or getattr(self, "path_dirty", True)
+
+    def recompute(self):
+        """
+        Recompute the beam path layout if anything it depends on changed
+        """
+
+        obj = self.get_object()
+        if getattr(self, "placement_dirty", True):
+            # segments and beam children move along with the beam path
+            compute_placements(obj)
+        if getattr(self, "path_dirty", True):
+            self.compute_path()
+        self.recompute_beam_children()
+
+    def recompute_beam_children(self):
+        """Recompute the placed beam children whose inputs changed"""
+
+        obj = self.get_object()
+        for child in obj.BeamChildren:
+            if child.Proxy.placed and child.Proxy.is_dirty():
+                child.Proxy.recompute()
+        # placed beam children flag their ancestors, which includes this beam path
+        self.subtree_dirty = False
+
+    @profiled("snapshot")
+    def snapshot(self) -> TraceScene:
+        """
+        Capture the current state of the layout as a document independent trace scene
+        Unplaced beam children (and their subcomponents) are included at the position they
+        would have at the beam path origin and only become active once placed
+
+        Returns:
+            scene (TraceScene): Interfaces, beam children and existing segments of this beam path
+        """
+
+        obj = self.get_object()
+
+        # frame the beam path is traced in (see compute_path)
+        if obj.Parent != None:
+            path_rotation = obj.Parent.Placement.Rotation
+        else:
+            path_rotation = App.Rotation("XYZ", 0, 0, 0)
+        path_placement = App.Placement(obj.Placement.Base, path_rotation)
+
+        # placements of unplaced beam children before they are moved onto the beam
+        pending = {}
+        for child in obj.BeamChildren:
+            if child.Proxy.placed:
+                continue
+            pending[child.Name] = path_placement * child.BasePlacement
+            subtree = []
+            collect_children(child, subtree)
+            for sub in subtree:
+                pending[sub.Name] = pending[sub.Parent.Name] * sub.BasePlacement
+
+        # gather interfaces of all objects under the bound parent
+        interfaces, owners, geometry, offsets, active = [], [], [], [], []
+        rows = {}  # owner name -> table rows
+
+        def add_interfaces(owner: App.DocumentObject, is_active: bool):
+            placement = pending.get(owner.Name, owner.Placement)
+            for interface in get_interfaces(owner):
+                position, normal, transverse = interface.get_global_geometry(placement)
+                rows.setdefault(owner.Name, []).append(len(interfaces))
+                # detach from the document so the scene can be used on its own
+                interface = copy(interface)
+                interface.parent = None
+                interfaces.append(interface)
+                owners.append(owner.Name)
+                geometry.append((position, normal, transverse))
+                offsets.append(position - np.array(placement.Base))
+                active.append(is_active)
+
+        bound_children = []
+        collect_children(obj.BoundParent, bound_children)
+        bound_names = set()
+        for child in bound_children:
+            bound_names.add(child.Name)
+            if hasattr(child.Proxy, "interfaces"):
+                add_interfaces(child, child.Name not in pending)
+
+        # beam children outside the bound parent only interact with their own beam
+        children = []
+        for child in obj.BeamChildren:
+            proxy = child.Proxy
+            subtree = [child]
+            collect_children(child, subtree)
+            for sub in subtree:
+                if sub.Name not in rows and hasattr(sub.Proxy, "interfaces"):
+                    add_interfaces(sub, False)
+
+            child_rows = [row for sub in subtree for row in rows.get(sub.Name, [])]
+            placement = pending.get(child.Name, child.Placement)
+            interface_row = None
+            interface_offset = np.zeros(3)
+            if len(child_rows) > 0:
+                interface_row = child_rows[proxy.interface_index]
+                interface_offset = offsets[interface_row]
+            children.append(
+                ChildSpec(
+                    name=child.Name,
+                    label=child.Label,
+                    beam_index=proxy.beam_index,
+                    after_object=(
+                        child.AfterObject.Name if child.AfterObject is not None else None
+                    ),
+                    constraint_type=child.ConstraintType,
+                    constraint_value=child.ConstraintValue.Value,
+                    offset=np.array(placement.Rotation.multVec(child.Offset)),
+                    base=np.array(placement.Base),
+                    rows=child_rows,
+                    interface_row=interface_row,
+                    interface_offset=interface_offset,
+                    placed=proxy.placed,
+                    bound=child.Name in bound_names,
+                )
+            )
+
+        # existing beam segments, placements are composed without touching the document
+        segments = []
+        records = {}
+        placements = {}
+        for beam in obj.BeamSegments:
+            parent = beam.Parent
+            if parent is not None and parent.Name in records:
+                placement = placements[parent.Name] * beam.BasePlacement
+            else:
+                placement = path_placement * beam.BasePlacement
+            placements[beam.Name] = placement
+            record = beam.Proxy.to_record(placement)
+            if parent is not None and parent.Name in records:
+                record.parent = records[parent.Name]
+                record.parent.children.append(record)
+            records[beam.Name] = record
+            segments.append(record)
+
+        if len(segments) == 0:
+            # initial input beam
+            direction = obj.BasePlacement.Rotation.multVec(App.Vector(1, 0, 0))
+            segments.append(
+                SegmentRecord(
+                    index=1,
+                    position=np.array(path_placement.Base),
+                    direction=np.array(path_rotation.multVec(direction)),
+                    wavelength=self.wavelength,
+                    jones=_normalize_jones_vector(self.polarization),
+                    power=self.power,
+                    waist_position=self.waist_position,
+                    rayleigh_range=self.rayleigh_range,
+                )
+            )
+
+        bound_placement = obj.BoundParent.Placement
+        return TraceScene(
+            interfaces=interfaces,
+            owners=owners,
+            positions=[position for position, _, _ in geometry],
+            normals=[normal for _, normal, _ in geometry],
+            transverses=[transverse for _, _, transverse in geometry],
+            active=active,
+            children=children,
+            segments=segments,
+            bound_base=np.array(bound_placement.Base),
+            bound_rotation=rotation_matrix(bound_placement.Rotation),
+            final_distance=self.final_distance,
+        )
+
+    def trace(
+        self, retrace: list[str] = None, writer: TraceWriter = None
+    ) -> TraceResult:
+        """
+        Trace the beam path without modifying the document
+        If a checkpoint directory is set, a stored result is restored when the inputs
+        of the trace are unchanged (see get_fingerprint)
+
+        Args:
+            retrace (list[str]): Names of segments whose children should be re-traced
+                                 (defaults to tracing all loose ends)
+            writer (TraceWriter): Writer to stream traced segments to (optional)
+
+        Returns:
+            result (TraceResult): The traced segments and placed children
+        """
+
+        scene = self.snapshot()
+
+        # streamed traces always run so that every segment reaches the writer
+        directory = get_trace_checkpoint_directory()
+        fingerprint = None
+        if directory is not None and writer is None:
+            fingerprint = self.get_fingerprint(scene, retrace)
+            result = load_trace(directory, fingerprint)
+            if result is not None:
+                self.report_stats(result)
+                return result
+
+        tracer = Tracer(
+            scene,
+            policy=get_trace_queue_policy(),
+            max_depth=get_max_trace_depth(),
+            max_segments=get_max_trace_segments(),
+            writer=writer,
+            min_power=get_min_trace_power(),
+        )
+        if retrace:
+            records = [record for record in scene.segments if record.name in retrace]
+            result = tracer.trace(seeds=records, retrace=records)
+        else:
+            result = tracer.trace()
+        self.report_stats(result)
+        if fingerprint is not None:
+            save_trace(directory, fingerprint, result)
+        return result
+
+    def get_fingerprint(self, scene: TraceScene, retrace: list[str] = None) -> str:
+        """
+        Get the fingerprint of a trace of this beam path, which changes whenever the
+        source, beam children, constraints, interface placements or trace settings change
+
+        Args:
+            scene (TraceScene): Snapshot of this beam path
+            retrace (list[str]): Names of segments whose children are re-traced
+
+        Returns:
+            fingerprint (str): Hex digest identifying the trace inputs
+        """
+
+        return scene_fingerprint(
+            scene,
+            retrace=sorted(retrace or []),
+            policy=get_trace_queue_policy(),
+            max_depth=get_max_trace_depth(),
+            max_segments=get_max_trace_segments(),
+            min_power=get_min_trace_power(),
+        )
 
-    def measure_properties(self, after_object: Layout, beam_index: int = None):
+    def export_trace(self, filename: str, parquet: bool = True) -> TraceResult:
         """
-        Measures the properties of a beam mid-layout
+        Trace the beam path and write one row per segment to columnar files
+        The document is not modified, see TraceWriter for the file layout
 
         Args:
-            after_object (Layout): The object after which to measure the beam
-            beam_index (int): The index of the beam to measure (defaults to the lowest index beam after object)
+            filename (str): Output file name, written as .npz (and .parquet if pyarrow is installed)
+            parquet (bool): Whether to write a Parquet file if pyarrow is available
 
-        Returns: A beam properties object containing the following attributes
-            beam_obj: The BeamSegment object representing the beam
-            beam_waist: The beam waist
-            waist_position: The position of the waist (relative to after_object)
-            rayleigh_range: The beam's rayleigh range
-            wavelength: The beam's wavelength
-            polarization_angle: The beam's polarization angle
-            power: The beam's power
-            initial_radius: The beam's radius at the object
-            final_radius: The beam's final radius (at the time of measurement)
-            segment_length: The beam's segment length
-            position: The position of the beam (relative to the beam path object)
-            rotation: The beam's rotation (relative to the beam path object)
+        Returns:
+            result (TraceResult): The traced segments and placed children
         """
-        self.recompute()
-        for beam in self.get_object().BeamSegments:
-            if beam.EndObject == after_object.get_object():
-                if beam_index is None or beam_index == beam.Proxy.index:
-                    direction = App.Vector(beam.Proxy.direction)
-                    rotation = App.Rotation(App.Vector(1, 0, 0), direction)
-                    return SimpleNamespace(
-                        beam_obj=beam.Proxy,
-                        beam_waist=beam.BeamWaist.Value,
-                        waist_position=beam.WaistPosition.Value,
-                        rayleigh_range=beam.RayleighRange.Value,
-                        wavelength=beam.Wavelength.Value,
-                        polarization_angle=beam.PolarizationAngle.Value,
-                        power=beam.Power.Value,
-                        initial_radius=beam.InitialRadius.Value,
-                        final_radius=beam.FinalRadius.Value,
-                        segment_length=beam.Distance.Value,
-                        position=beam.BasePlacement.Base,
-                        rotation=rotation.getYawPitchRoll()[::-1],
-                    )
 
-    def compute_path(self):
+        with TraceWriter(filename, parquet=parquet) as writer:
+            return self.trace(writer=writer)
+
+    def find_ghosts(
+        self,
+        min_power: float = 1e-6,
+        max_power: float = 0.05,
+        max_segments: int = 10000,
+    ) -> list[Ghost]:
         """
-        Calculate the beam path through the layout
+        Trace all weak branches of the beam path (such as sampler pick-offs and back reflections)
+        down to a power threshold and report where they end, without modifying the document
+
+        Args:
+            min_power (float): Branches below this fraction of the input power are not traced
+            max_power (float): Beams below this fraction of the input power are reported as ghosts
+            max_segments (int): Maximum number of segments traced (None for no limit)
+
+        Returns:
+            ghosts (list[Ghost]): Final segments of weak branches, strongest first, with start and
+                                  end object labels and the global end position
         """
 
         obj = self.get_object()
+        ghosts, result = trace_ghosts(self.snapshot(), min_power, max_power, max_segments)
+        if result.stats.truncated:
+            print(
+                f"Warning: Ghost trace of {obj.Label} was truncated by the segment budget ({result.stats})"
+            )
 
-        # reset rotation so that child placements are correct
-        if obj.Parent != None:
-            obj.Placement.Rotation = obj.Parent.Placement.Rotation
-        else:
-            obj.Placement.Rotation = App.Rotation("XYZ", 0, 0, 0)
+        def get_label(name: str) -> str:
+            return obj.Document.getObject(name).Label if name is not None else None
 
-        # clear previous beam segments
-        if len(obj.BeamSegments) == 0:
-            # add initial input beam
-            direction = obj.BasePlacement.Rotation.multVec(App.Vector(1, 0, 0))
-            input_beam = BeamSegment(
-                index=1,
-                direction=direction,
-                wavelength=self.wavelength,
-                polarization=self.polarization,
-                power=self.power,
-                waist_position=self.waist_position,
-                rayleigh_range=self.rayleigh_range,
+        return [
+            ghost._replace(start=get_label(ghost.start), end=get_label(ghost.end))
+            for ghost in ghosts
+        ]
+
+    def report_stats(self, result: TraceResult):
+        """
+        Keep the queue statistics of a trace and warn if it was truncated
+
+        Args:
+            result (TraceResult): Result of a trace of this beam path
+        """
+
+        self.trace_stats = result.stats.to_dict()
+        if result.stats.truncated:
+            print(
+                f"Warning: Beam path {self.get_object().Label} was truncated by trace limits ({result.stats})"
             )
-            super().add(input_beam, position=(0, 0, 0), rotation=(0, 0, 0))
-            obj.BeamSegments += [input_beam.get_object()]
 
-        # check for loose ends and start simulation from there
-        for beam in obj.BeamSegments:
-            beam.Proxy.compute_placement()
-            if len(beam.Children) == 0:
-                self.step(beam.Proxy)
+    @profiled("materialize")
+    def materialize(self, result: TraceResult):
+        """
+        Apply the result of a trace to the document
+        Writes made here do not flag other objects, afterwards only the shapes drilled by
+        moved beam children and changed segments are flagged, other beam paths are not
+        re-traced since conflicts with placed children are resolved by handle_conflicts
 
-        obj.purgeTouched()  # prevent triggering recompute
+        Args:
+            result (TraceResult): Result of a trace of this beam path
+        """
 
-    def recompute(self):
+        obj = self.get_object()
+        with suspend_invalidation():
+            moved, segments_changed = self.apply_result(result)
+
+        for child_obj in moved:
+            child_obj.Proxy.mark_peers(child_obj, notify=False)
+        if segments_changed:
+            # segments drill the shapes of the ancestors of the beam path
+            self.mark_drilled(obj)
+
+        # keep the rays of this beam path up to date for conflict checks of other beam paths
+        index = get_segment_index(obj.BoundParent)
+        if segments_changed or obj.Name not in index:
+            self.index_segments(index, result.segments)
+
+        # check for conflicts with other beam paths, measured against this beam path
+        # (also when it is re-traced by the conflict pass of another beam path)
+        with profile_scope(obj.Label):
+            for child_obj in moved:
+                self.handle_conflicts(child_obj)
+
+    def apply_result(self, result: TraceResult) -> tuple[list[App.DocumentObject], bool]:
         """
-        Recompute the beam path layout
+        Write placed beam children and traced segments to the document
+
+        Args:
+            result (TraceResult): Result of a trace of this beam path
+
+        Returns:
+            moved (list[App.DocumentObject]): Beam children whose placement changed
+            segments_changed (bool): Whether any segment was added, removed or modified
         """
 
-        super().compute_placement()
-        self.compute_path()
         obj = self.get_object()
-        for child in obj.BeamChildren:
-            if child.Proxy.placed:
-                child.Proxy.recompute()
+        document = obj.Document
+        moved = []
+        segments_changed = False
+
+        # place beam children, base placement is stored in the beam path local frame
+        for child in result.placed:
+            child_obj = document.getObject(child.name)
+            delta = child.base - np.array(obj.Placement.Base)
+            object_position = obj.Placement.Rotation.inverted().multVec(
+                App.Vector(*delta)
+            )
+            if not child_obj.Proxy.placed or not child_obj.BasePlacement.Base.isEqual(
+                object_position, 1e-9
+            ):
+                moved.append(child_obj)
+            child_obj.BasePlacement.Base = object_position
+            child_obj.Proxy.placed = True
+            # shapes are rebuilt once everything is placed (see recompute_beam_children)
+            compute_placements(child_obj)
+
+        # detach reused segments from their previous parents
+        for record in result.records:
+            if record.alive and record.reparented and record.name is not None:
+                beam_obj = document.getObject(record.name)
+                old_parent = beam_obj.Parent
+                if old_parent is not None:
+                    old_parent.Children = [
+                        child for child in old_parent.Children if child != beam_obj
+                    ]
+                beam_obj.Parent = None
+
+        # remove segments that were discarded during the trace
+        removed = [
+            record.name
+            for record in result.records
+            if not record.alive and record.name is not None
+        ]
+        if len(removed) > 0:
+            segments_changed = True
+            obj.BeamSegments = [
+                beam for beam in obj.BeamSegments if beam.Name not in removed
+            ]
+            for name in reversed(removed):
+                document.removeObject(name)
+
+        # create and update beam segments in trace order (parents before children)
+        beams = {}
+        for record in result.records:
+            if not record.alive:
+                continue
+            if record.name is not None:
+                beam = document.getObject(record.name).Proxy
+                if record.reparented:
+                    parent = beams[id(record.parent)]
+                    parent.add(beam, origin=parent.get_relative_position(record.position))
+            elif record.parent is None:
+                # add initial input beam
+                beam = BeamSegment(
+                    index=record.index,
+                    direction=obj.BasePlacement.Rotation.multVec(App.Vector(1, 0, 0)),
+                    wavelength=record.wavelength,
+                    polarization=record.jones,
+                    power=record.power,
+                    waist_position=record.waist_position,
+                    rayleigh_range=record.rayleigh_range,
+                )
+                super().add(beam, position=(0, 0, 0), rotation=(0, 0, 0))
+                obj.BeamSegments += [beam.get_object()]
+            else:
+                beam = beams[id(record.parent)].add_output(record)
+                beam_obj = beam.get_object()
+                beam_obj.StartObject = document.getObject(record.start)
+                obj.BeamSegments += [beam_obj]
+            beams[id(record)] = beam
+
+            beam.compute_placement()
+            if record.modified or record.reparented or record.name is None:
+                segments_changed = True
+            record.name = beam.get_object().Name
+            if record.modified:
+                beam.distance = record.distance
+                if record.bundle is not None or getattr(beam, "bundle", None):
+                    # bundle members may have been split off during the trace
+                    beam_obj = beam.get_object()
+                    beam.index = record.index
+                    beam.direction = tuple(beam.get_relative_direction(record.direction))
+                    beam.power = record.power
+                    beam.frequency = record.frequency
+                    beam.set_bundle(record.bundle, beam_obj.Placement.Rotation)
+                    beam_obj.Label = f"Beam {bin(record.index)}"
+                if record.end is not None:
+                    beam.get_object().EndObject = document.getObject(record.end)
+                beam.recompute()
+
+        return moved, segments_changed
+
+    def retrace(self, names: list[str]):
+        """
+        Discard and re-trace everything downstream of a set of beam segments
+
+        Args:
+            names (list[str]): Names of the segments to re-trace from
+        """
+
+        obj = self.get_object()
+        with profile_scope(obj.Label):
+            self.materialize(self.trace(retrace=names))
+            self.recompute_beam_children()
+        obj.purgeTouched()
+
+    def step(self, input_beam: BeamSegment):
+        """
+        Re-trace everything downstream of a beam segment and apply it to the document
+        Kept for macros written before tracing moved to Tracer.step, same as retrace
+
+        Args:
+            input_beam (Beam_Segment): Input beam segment to process
+        """
+
+        self.retrace([input_beam.get_object().Name])
+
+    def get_tracer(self, input_beam: BeamSegment) -> tuple:
+        """
+        Build a tracer for the current layout and find the record of a beam segment
+        The record is detached from its end so that it extends to infinity, as before tracing
+
+        Args:
+            input_beam (Beam_Segment): Beam segment to look up
+
+        Returns:
+            tracer (Tracer): Tracer for a snapshot of this beam path
+            record (SegmentRecord): Record of the beam segment
+        """
+
+        name = input_beam.get_object().Name
+        tracer = Tracer(self.snapshot())
+        for record in tracer.scene.segments:
+            if record.name == name:
+                start = record.start
+                record = record.derive()
+                record.start = start
+                return tracer, record
+        raise RuntimeError(f"{input_beam.get_object().Label} is not part of this beam path")
 
     def get_next_global(self, input_beam: BeamSegment) -> tuple:
         """
-        Get the next global object the beam will interact with
+        Get the next global object the beam will interact with (see Tracer.get_next_global)
 
         Args:
             input_beam (Beam_Segment): Input beam segment to process
@@ -755,41 +1985,19 @@ class BeamPath(Layout):
             min_distance (float): Distance to the next interaction
         """
 
-        obj = self.get_object()
-        input_beam_obj = input_beam.get_object()
-
-        next_object = None
-        next_interface = None
+        tracer, record = self.get_tracer(input_beam)
+        name, row, distance = tracer.get_next_global(record)
+        if name is None:
+            return None, None, np.inf
 
-        # gather all children of bound parent
-        all_children = []
-        collect_children(obj.BoundParent, all_children)
-
-        # find closest global object
-        min_distance = np.inf
-        for child in all_children:
-            proxy = child.Proxy
-            # skip beam segments, unplaced beam children, and objects without interfaces
-            if not hasattr(proxy, "interfaces") or (
-                child in obj.BeamChildren and not proxy.placed
-            ):
-                continue
-            # check all interfaces of the object
-            for interface in proxy.interfaces():
-                intercept = interface.get_intercept(input_beam)
-                if intercept is not None:
-                    distance = np.linalg.norm(intercept - input_beam_obj.Placement.Base)
-                    # find closest intercept
-                    if distance < min_distance:
-                        min_distance = distance
-                        next_object = child
-                        next_interface = interface
-
-        return next_object, next_interface, min_distance
+        # interfaces of an object occupy consecutive table rows
+        next_object = self.get_object().Document.getObject(name)
+        interfaces = get_interfaces(next_object)
+        return next_object, interfaces[row - tracer.scene.owners.index(name)], distance
 
     def get_next_child(self, input_beam: BeamSegment) -> tuple:
         """
-        Get the next beam child object for placement
+        Get the next beam child object for placement (see Tracer.get_next_child)
 
         Args:
             input_beam (Beam_Segment): Input beam segment to process
@@ -797,47 +2005,16 @@ class BeamPath(Layout):
         Returns:
             next_object (App.DocumentObject): Next beam child object to interact with
             next_interface (Interface): Interface on the next object
-            min_distance (float): Distance to the next interaction
+            min_distance (float): Distance to the interaction
         """
 
-        obj = self.get_object()
-        input_beam_obj = input_beam.get_object()
-
-        next_object = None
-        next_interface = None
-        next_distance = np.inf
-
-        # get next beam child for placement
-        for child in obj.BeamChildren:
-            proxy = child.Proxy
-            if not proxy.placed and proxy.beam_index == input_beam.index:
-                if (
-                    child.AfterObject is None
-                    or child.AfterObject == input_beam_obj.StartObject
-                ):
-                    next_object = child
-                break
-
-        # get info for next beam child
-        if next_object != None:
-            next_interface = self.get_child_interface(next_object)
-
-            # get position from provided constraint
-            try:
-                next_position = input_beam.get_constraint_position(
-                    next_object.ConstraintType, next_object.ConstraintValue.Value
-                )
-            except RuntimeError as e:
-                raise RuntimeError(
-                    f"Error handling constraints for beam child {next_object.Label}: {str(e)}"
-                )
-
-            # get distance and interface for interaction
-            next_distance = np.linalg.norm(
-                next_position - input_beam_obj.Placement.Base
-            )
+        tracer, record = self.get_tracer(input_beam)
+        child, _, distance = tracer.get_next_child(record)
+        if child is None:
+            return None, None, np.inf
 
-        return next_object, next_interface, next_distance
+        next_object = self.get_object().Document.getObject(child.name)
+        return next_object, self.get_child_interface(next_object), distance
 
     def get_child_interface(self, child_object: App.DocumentObject) -> Interface:
         """
@@ -855,9 +2032,8 @@ class BeamPath(Layout):
         collect_children(child_object, object_children)
         interfaces = []
         for obj in object_children:
-            proxy = obj.Proxy
-            if hasattr(proxy, "interfaces"):
-                interfaces.extend(proxy.interfaces())
+            if hasattr(obj.Proxy, "interfaces"):
+                interfaces.extend(get_interfaces(obj))
 
         if len(interfaces) == 0:
             raise RuntimeError(
@@ -866,112 +2042,258 @@ class BeamPath(Layout):
         # get specified interface
         return interfaces[child.interface_index]
 
-    def handle_conflicts(self, last_beam: BeamSegment, placed_obj: App.DocumentObject):
+    @profiled("path_conflicts")
+    def handle_conflicts(self, placed_obj: App.DocumentObject):
         """
-        Handle conflicts between placed object and previously computed beams
+        Handle conflicts between a placed object and beams of other beam paths
+        Conflicts within this beam path are resolved during the trace
+        Only the segment index of the bound parent is queried, so segments
+        of other beam paths are not read from the document
 
         Args:
-            last_beam (Beam_Segment): Last beam segment placed
             placed_obj (App.DocumentObject): Object that was just placed
         """
         obj = self.get_object()
-
-        # gather all previously placed beam segments
-        bound_children = []
-        collect_children(obj.BoundParent, bound_children)
-        beam_paths = []
-        for child in bound_children:
-            if isinstance(child.Proxy, BeamPath):
-                beam_paths.append(child)
-
+        index = get_segment_index(obj.BoundParent)
         interface = self.get_child_interface(placed_obj)
+        table = InterfaceTable.from_interfaces([interface])
+
+        # only test segments whose swept box overlaps the placed interface,
+        # the index is stored in the bound parent frame
+        base, rotation = get_bound_frame(obj.BoundParent)
+        lower, upper = table.bounds()
+        corners = (np.array(list(product(*zip(lower[0], upper[0])))) - base) @ rotation
+        candidates = index.query_box(corners.min(axis=0), corners.max(axis=0))
+        candidates = np.array(
+            [i for i in candidates if index.owners[i] != obj.Name], dtype=int
+        )
+        if len(candidates) == 0:
+            return
 
-        # check for conflicts
-        deleted_objs = []
-        for beam_path in beam_paths:
-            proxy = beam_path.Proxy
-            for beam_obj in beam_path.BeamSegments:
-                if beam_obj == last_beam.get_object() or beam_obj in deleted_objs:
-                    continue
-                beam = beam_obj.Proxy
-                if (
-                    interface.get_intercept(beam) is not None
-                    and beam_obj not in deleted_objs
-                ):
-                    beam_children = []
-                    collect_children(beam_obj, beam_children)
-                    # remove all children and recompute beam
-                    for child in beam_children:
-                        beam_path.BeamSegments.remove(child)
-                        deleted_objs.append(child)
-                        obj.Document.removeObject(child.Name)
-                    proxy.step(beam)
-                    beam_path.purgeTouched()
+        # test all candidate segments in one pass
+        _, distances = intersect(
+            table,
+            base + index.origins[candidates] @ rotation.T,
+            index.directions[candidates] @ rotation.T,
+            index.max_distances[candidates],
+        )
+        hits = {}
+        for i in candidates[np.isfinite(distances[:, 0])]:
+            names = hits.setdefault(index.owners[i], [])
+            if index.segments[i] not in names:
+                names.append(index.segments[i])
+
+        # re-trace from the blocked segments, unchanged subtrees are reused
+        for name, segments in hits.items():
+            beam_path = obj.Document.getObject(name)
+            if beam_path is None or beam_path.BoundParent != obj.BoundParent:
+                index.remove(name)  # deleted or moved to another bound parent
+                continue
+            beam_path.Proxy.retrace(segments)
 
-    def step(self, input_beam: BeamSegment):
+    def index_segments(self, index: SegmentIndex, records: list[SegmentRecord] = None):
         """
-        Perform a single calculation step for the beam path
+        Store the rays of the segments of this beam path in a segment index
 
         Args:
-            input_beam (Beam_Segment): Input beam segment to process
+            index (SegmentIndex): Segment index of the bound parent
+            records (list[SegmentRecord]): Current segments of this beam path
+                                           (read from the document if not given)
         """
 
         obj = self.get_object()
-        beam_obj = input_beam.get_object()
+        key = (obj.Document.Name, obj.BoundParent.Name)
+        for other_key, other in _segment_indices.items():
+            if other_key[0] == key[0] and other is not index:
+                other.remove(obj.Name)  # the bound parent changed
+
+        if records is None:
+            records = [beam.Proxy.to_record() for beam in obj.BeamSegments]
+        if len(records) == 0:
+            index.remove(obj.Name)
+            return
+        rays = [record.rays() for record in records]
+        names = [record.name for record, ray in zip(records, rays) for _ in ray[0]]
+        base, rotation = get_bound_frame(obj.BoundParent)
+        index.set_rays(
+            obj.Name,
+            (np.concatenate([ray[0] for ray in rays]) - base) @ rotation,
+            np.concatenate([ray[1] for ray in rays]) @ rotation,
+            np.concatenate([ray[2] for ray in rays]),
+            names,
+        )
 
-        # get next global object
-        next_global = self.get_next_global(input_beam)
-        # get next beam child object
-        next_child = self.get_next_child(input_beam)
 
-        global_distance, child_distance = next_global[2], next_child[2]
+# traces computed ahead of time by recompute_parallel, keyed by (document, beam path)
+_precomputed_traces = {}
 
-        if global_distance == np.inf and child_distance == np.inf:
-            # no more interactions, clip beam to bound parent
+# measure_properties results of the current layout revision,
+# keyed by (document, beam path, after object, beam index)
+_measurements = {}
+_measurements_revision = None
+register_document_cache(_measurements)
 
-            input_beam.distance = self.final_distance
-            input_beam.recompute()
-            return
+# rays of the segments of all beam paths under a bound parent in the bound parent frame,
+# keyed by (document, bound parent), see get_segment_index
+_segment_indices = {}
+register_document_cache(_segment_indices)
 
-        if global_distance < child_distance:
-            next_object, next_interface, next_distance = next_global
-        else:
-            next_object, next_interface, next_distance = next_child
 
-            # get object placement
-            intercept = input_beam.get_constraint_position(
-                type="distance", value=next_distance
-            )
-            next_object.Proxy.compute_placement()  # update placement
-            object_rotation = next_object.Placement.Rotation
-            offset = np.array(object_rotation.multVec(next_object.Offset))
-            interface_offset = next_interface.get_position_offset()
-            object_position_global = intercept - interface_offset + offset
-
-            # child base placement is stored in the beam path local frame
-            beam_path_rotation = obj.Placement.Rotation
-            delta = object_position_global - np.array(obj.Placement.Base)
-            object_position = np.array(
-                beam_path_rotation.inverted().multVec(App.Vector(*delta))
+def get_segment_index(bound_obj: App.DocumentObject) -> SegmentIndex:
+    """
+    Get the segment index of a bound parent
+    Beam paths keep their entries up to date whenever they are traced, beam paths
+    traced before the index existed (such as in a loaded document) are read once
+
+    Args:
+        bound_obj (App.DocumentObject): Bound parent
+
+    Returns:
+        index (SegmentIndex): Rays of all beam paths bound to the bound parent
+    """
+
+    key = (bound_obj.Document.Name, bound_obj.Name)
+    index = _segment_indices.get(key)
+    if index is None:
+        index = SegmentIndex()
+        _segment_indices[key] = index
+        children = []
+        collect_children(bound_obj, children)
+        for child in children:
+            if isinstance(child.Proxy, BeamPath) and child.BoundParent == bound_obj:
+                child.Proxy.index_segments(index)
+    return index
+
+
+def get_bound_frame(bound_obj: App.DocumentObject) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the global frame of a bound parent
+
+    Args:
+        bound_obj (App.DocumentObject): Bound parent
+
+    Returns:
+        base (np.ndarray): (x, y, z) global position of the bound parent
+        rotation (np.ndarray): 3x3 global rotation matrix of the bound parent
+    """
+
+    placement = bound_obj.Placement
+    return np.array(placement.Base), rotation_matrix(placement.Rotation)
+
+
+def get_independent_beam_paths(
+    objects: list[App.DocumentObject],
+) -> list[App.DocumentObject]:
+    """
+    Find beam paths that do not interact with any other beam path
+    A beam path is independent when its bound parent does not overlap the bound parent
+    of any other beam path and neither beam path lies within the other's bound parent
+
+    Args:
+        objects (list[App.DocumentObject]): Objects to search
+
+    Returns:
+        beam_paths (list[App.DocumentObject]): Independent beam paths
+    """
+
+    def ancestors(obj: App.DocumentObject) -> list[App.DocumentObject]:
+        chain = [obj]
+        while chain[-1].Parent is not None:
+            chain.append(chain[-1].Parent)
+        return chain
+
+    def contains(parent: App.DocumentObject, obj: App.DocumentObject) -> bool:
+        return any(ancestor == parent for ancestor in ancestors(obj))
+
+    beam_paths = [obj for obj in objects if isinstance(obj.Proxy, BeamPath)]
+    independent = []
+    for path in beam_paths:
+        # beam paths inside another beam path move with its trace
+        if any(isinstance(a.Proxy, BeamPath) for a in ancestors(path)[1:]):
+            continue
+        bound = path.BoundParent
+        if all(
+            not contains(bound, other.BoundParent)
+            and not contains(other.BoundParent, bound)
+            and not contains(bound, other)
+            and not contains(other.BoundParent, path)
+            for other in beam_paths
+            if other != path
+        ):
+            independent.append(path)
+    return independent
+
+
+def recompute_parallel(layout: Layout, processes: int = None):
+    """
+    Recompute a layout, tracing independent beam paths in a process pool
+    Snapshots of independent beam paths are traced in worker processes and merged
+    into the document during the recompute, all other beam paths are traced as usual
+    Falls back to a regular recompute where processes cannot be forked
+
+    Args:
+        layout (Layout): Layout to recompute
+        processes (int): Number of worker processes (defaults to the number of cores)
+    """
+
+    obj = layout.get_object()
+    document = obj.Document
+    objects = [obj]
+    collect_children(obj, objects)
+
+    # beam paths that are up to date are not traced again by the recompute
+    beam_paths = [
+        path
+        for path in get_independent_beam_paths(objects)
+        if getattr(path.Proxy, "path_dirty", True)
+    ]
+    if len(beam_paths) < 2 or "fork" not in get_all_start_methods():
+        layout.recompute()
+        return
+
+    # placements are needed for the snapshots
+    compute_placements(obj)
+    scenes = {path.Name: path.Proxy.snapshot() for path in beam_paths}
+
+    # restore beam paths with a checkpoint instead of tracing them
+    directory = get_trace_checkpoint_directory()
+    fingerprints = {}
+    if directory is not None:
+        for path in beam_paths:
+            fingerprint = path.Proxy.get_fingerprint(scenes[path.Name])
+            result = load_trace(directory, fingerprint)
+            if result is not None:
+                _precomputed_traces[(document.Name, path.Name)] = result
+                del scenes[path.Name]
+            else:
+                fingerprints[path.Name] = fingerprint
+
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context("fork")
+    ) as pool:
+        futures = {
+            name: pool.submit(
+                trace_scene,
+                scene,
+                get_trace_queue_policy(),
+                get_max_trace_depth(),
+                get_max_trace_segments(),
+                get_min_trace_power(),
             )
-            # apply placement
-            next_object.BasePlacement.Base = App.Vector(*object_position)
-            next_object.Proxy.placed = True
-            next_object.Proxy.recompute()
-            # check for conflicts with previously placed beams
-            self.handle_conflicts(input_beam, next_object)
-
-        # get output beams from interaction
-        input_beam.distance = next_distance
-        output_beams = next_interface.get_output_beams(input_beam)
-        beam_obj.EndObject = next_object
-        input_beam.recompute()
-        for beam in output_beams:
-            new_beam_obj = beam.get_object()
-            new_beam_obj.StartObject = next_object
-            obj.BeamSegments += [new_beam_obj]
-            beam.compute_placement()
-            self.step(beam)
+            for name, scene in scenes.items()
+        }
+        for name, future in futures.items():
+            result = future.result()
+            _precomputed_traces[(document.Name, name)] = result
+            if name in fingerprints:
+                save_trace(directory, fingerprints[name], result)
+
+    try:
+        layout.recompute()
+    finally:
+        # drop traces of beam paths that were not recomputed
+        for path in beam_paths:
+            _precomputed_traces.pop((document.Name, path.Name), None)
 
 
 class Interface:
@@ -1006,6 +2328,7 @@ class Interface:
         self.transverse = np.array(rotation_obj.multVec(App.Vector(0, 1, 0)))
 
         self.abcd_matrix = [1, 0, 0, 1]  # identity matrix by default
+        self.jones_matrix = np.eye(2, dtype=complex)  # no polarization change by default
 
         # define bound type
         if diameter != None:
@@ -1022,16 +2345,29 @@ class Interface:
         self.single_sided = single_sided
         self.parent = None  # to be set when initialized in parent object
 
+    def get_parent_transform(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the global transform of the parent object
+        Uses the active transform cache while a beam path is being computed
+
+        Returns:
+            base (np.ndarray): (x, y, z) global position of the parent
+            rotation (np.ndarray): 3x3 global rotation matrix of the parent
+        """
+
+        if _transform_cache is not None:
+            return _transform_cache.get_transform(self.parent)
+        placement = self.parent.get_object().Placement
+        return np.array(placement.Base), rotation_matrix(placement.Rotation)
+
     def get_position_offset(self) -> np.ndarray[float]:
         """
         Get the position offset of the interface relative to parent
         Returns:
             offset (np.ndarray): (x, y, z) coordinates of the interface relative to parent
         """
-        parent_obj = self.parent.get_object()
-        rotation = parent_obj.Placement.Rotation
-        local_position = rotation.multVec(App.Vector(*self.position))
-        return np.array(local_position)
+        _, rotation = self.get_parent_transform()
+        return rotation @ self.position
 
     def get_global_position(self) -> np.ndarray[float]:
         """
@@ -1041,11 +2377,8 @@ class Interface:
             position (np.ndarray): (x, y, z) coordinates of the interface
         """
 
-        parent_obj = self.parent.get_object()
-        position = parent_obj.Placement.Base
-        local_position = self.get_position_offset()
-        global_position = np.array(position) + local_position
-        return global_position
+        base, rotation = self.get_parent_transform()
+        return base + rotation @ self.position
 
     def get_global_normal(self) -> np.ndarray[float]:
         """
@@ -1055,10 +2388,8 @@ class Interface:
             normal (np.ndarray): (x, y, z) normalized normal vector
         """
 
-        parent_obj = self.parent.get_object()
-        rotation = parent_obj.Placement.Rotation
-        global_normal = np.array(rotation.multVec(App.Vector(*self.normal)))
-        return global_normal
+        _, rotation = self.get_parent_transform()
+        return rotation @ self.normal
 
     def get_global_transverse(self) -> np.ndarray[float]:
         """
@@ -1068,18 +2399,38 @@ class Interface:
             normal (np.ndarray): (x, y, z) normalized transverse vector
         """
 
-        parent_obj = self.parent.get_object()
-        rotation = parent_obj.Placement.Rotation
-        global_transverse = np.array(rotation.multVec(App.Vector(*self.transverse)))
-        return global_transverse
+        _, rotation = self.get_parent_transform()
+        return rotation @ self.transverse
+
+    def get_global_geometry(self, placement: App.Placement = None) -> tuple:
+        """
+        Get the global position, normal and transverse vectors of the interface
+
+        Args:
+            placement (App.Placement): Global placement of the parent (defaults to current placement)
+
+        Returns:
+            position (np.ndarray): (x, y, z) coordinates of the interface
+            normal (np.ndarray): (x, y, z) normalized normal vector
+            transverse (np.ndarray): (x, y, z) normalized transverse vector
+        """
+
+        if placement is None:
+            base, rotation = self.get_parent_transform()
+        else:
+            base, rotation = np.array(placement.Base), rotation_matrix(placement.Rotation)
+        position = base + rotation @ self.position
+        return position, rotation @ self.normal, rotation @ self.transverse
 
-    def apply_abcd(self, incident_beam: BeamSegment) -> tuple[float, float]:
+    def apply_abcd(
+        self, incident_beam: BeamSegment | SegmentRecord
+    ) -> tuple[float, float]:
         """
         Apply the ABCD matrix of the interface to an incident beam
         Note: this also accounts for the distance traveled to the interface
 
         Args:
-            incident_beam (Beam_Segment): Incident beam segment
+            incident_beam (Beam_Segment | SegmentRecord): Incident beam segment
 
         Returns:
             new_waist_position (float): New waist position relative to interface
@@ -1092,6 +2443,19 @@ class Interface:
         q_out = (A * q_param + B) / (C * q_param + D)
         return -q_out.real, q_out.imag
 
+    def get_jones_matrix(self, reflected: bool = False) -> np.ndarray:
+        """
+        Get the Jones matrix of the interface for one of its outputs
+
+        Args:
+            reflected (bool): Whether to get the matrix of the reflected output
+
+        Returns:
+            matrix (np.ndarray): 2x2 complex Jones matrix
+        """
+
+        return self.jones_matrix
+
     def get_intercept(self, incident_beam: BeamSegment) -> np.ndarray[float] | None:
         """
         Get the intercept point of a beam with the interface plane
@@ -1150,34 +2514,59 @@ class Interface:
 
         return intercept
 
-    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+    def interact(
+        self,
+        incident_beam: SegmentRecord,
+        intercept: np.ndarray[float],
+        position: np.ndarray[float],
+        normal: np.ndarray[float],
+        transverse: np.ndarray[float],
+    ) -> list[SegmentRecord]:
         """
         Get the output beams from an incident beam interacting with the interface
         By default, the beam is transmitted with ABCD transformation and no change in polarization or power
 
         Args:
-            incident_beam (Beam_Segment): Incident beam segment
+            incident_beam (SegmentRecord): Incident beam segment
+            intercept (np.ndarray): (x, y, z) global coordinates of the intercept point
+            position (np.ndarray): (x, y, z) global position of the interface
+            normal (np.ndarray): (x, y, z) global normal vector of the interface
+            transverse (np.ndarray): (x, y, z) global transverse vector of the interface
 
         Returns:
             output_beams (list): List containing a single transmitted beam segment
         """
 
-        intercept = self.get_intercept(incident_beam)
-        local_origin = incident_beam.get_relative_position(intercept)
         waist_position, rayleigh_range = self.apply_abcd(incident_beam)
-
-        output_beam = BeamSegment(
-            index=incident_beam.index,
-            direction=incident_beam.direction,
-            wavelength=incident_beam.wavelength,
-            polarization=incident_beam.polarization_jones,
-            power=incident_beam.power,
+        output_beam = incident_beam.derive(
+            position=intercept,
             waist_position=waist_position,
             rayleigh_range=rayleigh_range,
         )
-        incident_beam.add(output_beam, origin=local_origin)
         return [output_beam]
 
+    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+        """
+        Get the output beam segments from an incident beam interacting with the interface
+        Output segments are added as children of the incident beam segment
+
+        Args:
+            incident_beam (Beam_Segment): Incident beam segment
+
+        Returns:
+            output_beams (list): List of output beam segments
+        """
+
+        intercept = self.get_intercept(incident_beam)
+        if intercept is None:
+            return []
+
+        position, normal, transverse = self.get_global_geometry()
+        records = self.interact(
+            incident_beam.to_record(), intercept, position, normal, transverse
+        )
+        return [incident_beam.add_output(record) for record in records]
+
 
 class Stop(Interface):
     """
@@ -1207,24 +2596,36 @@ class Stop(Interface):
         )
         self.pinhole_diameter = pinhole_diameter
 
-    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+    def interact(
+        self,
+        incident_beam: SegmentRecord,
+        intercept: np.ndarray[float],
+        position: np.ndarray[float],
+        normal: np.ndarray[float],
+        transverse: np.ndarray[float],
+    ) -> list[SegmentRecord]:
         """
         Get the output beams from an incident beam interacting with the stop interface
         For a stop, there are no output beams unless a pinhole diameter is specified, in which case the beam is clipped to the pinhole size
 
         Args:
-            incident_beam (Beam_Segment): Incident beam segment
+            incident_beam (SegmentRecord): Incident beam segment
+            intercept (np.ndarray): (x, y, z) global coordinates of the intercept point
+            position (np.ndarray): (x, y, z) global position of the interface
+            normal (np.ndarray): (x, y, z) global normal vector of the interface
+            transverse (np.ndarray): (x, y, z) global transverse vector of the interface
 
         Returns:
             output_beams (list): Empty list (no output beams)
         """
 
         if self.pinhole_diameter is not None:
-            intercept = self.get_intercept(incident_beam)
-            radial_vector = intercept - self.get_global_position()
+            radial_vector = intercept - position
             radius = np.linalg.norm(radial_vector)  # distance from center in y-z plane
             if radius < self.pinhole_diameter / 2:
-                return super().get_output_beams(incident_beam)
+                return super().interact(
+                    incident_beam, intercept, position, normal, transverse
+                )
 
         return []
 
@@ -1289,6 +2690,14 @@ class Reflection(Interface):
         elif ref_polarization != None:
             self.type = "polarizing"
             self.ref_polarization = ref_polarization
+            self.reflect_axis = _normalize_jones_vector(
+                linear_polarization(ref_polarization)
+            )
+            self.transmit_axis = _normalize_jones_vector(
+                linear_polarization(ref_polarization + 90)
+            )
+            self.reflect_matrix = polarizer_matrix(ref_polarization)
+            self.transmit_matrix = polarizer_matrix(ref_polarization + 90)
         elif ref_wavelengths != None:
             self.type = "dichroic"
             self.ref_wavelengths = ref_wavelengths
@@ -1297,25 +2706,46 @@ class Reflection(Interface):
 
         self.refractive_index_ratio = refractive_index_ratio
 
-    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+    def get_jones_matrix(self, reflected: bool = False) -> np.ndarray:
         """
-        Get the output beams from an incident beam interacting with the interface
+        Get the Jones matrix of the interface for one of its outputs
 
         Args:
-            incident_beam (Beam): Incident beam object
+            reflected (bool): Whether to get the matrix of the reflected output
 
         Returns:
-            output_beams (list): List of output Beam objects
+            matrix (np.ndarray): 2x2 complex Jones matrix
         """
 
-        global_normal = self.get_global_normal()
-        beam_direction = incident_beam.get_global_direction()
-        intercept = self.get_intercept(incident_beam)
+        if self.type == "polarizing":
+            return self.reflect_matrix if reflected else self.transmit_matrix
+        return self.jones_matrix
 
-        if intercept is None:
-            return []
+    def interact(
+        self,
+        incident_beam: SegmentRecord,
+        intercept: np.ndarray[float],
+        position: np.ndarray[float],
+        normal: np.ndarray[float],
+        transverse: np.ndarray[float],
+    ) -> list[SegmentRecord]:
+        """
+        Get the output beams from an incident beam interacting with the interface
+
+        Args:
+            incident_beam (SegmentRecord): Incident beam segment
+            intercept (np.ndarray): (x, y, z) global coordinates of the intercept point
+            position (np.ndarray): (x, y, z) global position of the interface
+            normal (np.ndarray): (x, y, z) global normal vector of the interface
+            transverse (np.ndarray): (x, y, z) global transverse vector of the interface
+
+        Returns:
+            output_beams (list): List of output beam segments
+        """
 
-        incident_jones = _normalize_jones_vector(incident_beam.polarization_jones)
+        global_normal = normal
+        beam_direction = incident_beam.direction
+        incident_jones = _normalize_jones_vector(incident_beam.jones)
 
         # calculate ratio of transmitted to reflected power for different interface types
         if self.type == "mirror":
@@ -1327,15 +2757,11 @@ class Reflection(Interface):
             transmit_jones = incident_jones
             reflect_jones = incident_jones
         if self.type == "polarizing":
-            reflect_axis = _normalize_jones_vector(
-                linear_polarization(self.ref_polarization)
-            )
-            transmit_axis = _normalize_jones_vector(
-                linear_polarization(self.ref_polarization + 90)
-            )
+            reflect_axis = self.reflect_axis
+            transmit_axis = self.transmit_axis
 
-            reflect_component = np.vdot(reflect_axis, incident_jones) * reflect_axis
-            transmit_component = np.vdot(transmit_axis, incident_jones) * transmit_axis
+            reflect_component = self.reflect_matrix @ incident_jones
+            transmit_component = self.transmit_matrix @ incident_jones
 
             reflect_ratio = float(
                 np.real(np.vdot(reflect_component, reflect_component))
@@ -1371,7 +2797,6 @@ class Reflection(Interface):
                     break
         reflect_ratio = 1 - transmit_ratio
 
-        local_origin = incident_beam.get_relative_position(intercept)
         waist_position, rayleigh_range = self.apply_abcd(incident_beam)
 
         output_beams = []
@@ -1410,17 +2835,15 @@ class Reflection(Interface):
                     * global_normal
                     * np.dot(global_normal, beam_direction)
                 )
-                local_direction = incident_beam.get_relative_direction(direction)
-                transmitted_beam = BeamSegment(
+                transmitted_beam = incident_beam.derive(
                     index=index,
-                    direction=local_direction,
-                    wavelength=incident_beam.wavelength,
-                    polarization=transmit_jones,
+                    position=intercept,
+                    direction=direction,
+                    jones=transmit_jones,
                     power=incident_beam.power * transmit_ratio,
                     waist_position=waist_position,
                     rayleigh_range=rayleigh_range,
                 )
-                incident_beam.add(transmitted_beam, origin=local_origin)
                 output_beams.append(transmitted_beam)
 
         # generate reflected beam
@@ -1435,17 +2858,15 @@ class Reflection(Interface):
                 beam_direction
                 - 2 * np.dot(beam_direction, global_normal) * global_normal
             )
-            local_direction = incident_beam.get_relative_direction(direction)
-            reflect_beam = BeamSegment(
+            reflect_beam = incident_beam.derive(
                 index=index,
-                direction=local_direction,
-                wavelength=incident_beam.wavelength,
-                polarization=reflect_jones,
+                position=intercept,
+                direction=direction,
+                jones=reflect_jones,
                 power=incident_beam.power * reflect_ratio,
                 waist_position=waist_position,
                 rayleigh_range=rayleigh_range,
             )
-            incident_beam.add(reflect_beam, origin=local_origin)
             output_beams.append(reflect_beam)
 
         return output_beams
@@ -1485,29 +2906,34 @@ class Lens(Interface):
 
         self.abcd_matrix = [1, 0, -1 / focal_length, 1]
 
-    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+    def interact(
+        self,
+        incident_beam: SegmentRecord,
+        intercept: np.ndarray[float],
+        position: np.ndarray[float],
+        normal: np.ndarray[float],
+        transverse: np.ndarray[float],
+    ) -> list[SegmentRecord]:
         """
         Get the output beams from an incident beam interacting with the interface
 
         Args:
-            incident_beam (Beam): Incident beam object
+            incident_beam (SegmentRecord): Incident beam segment
+            intercept (np.ndarray): (x, y, z) global coordinates of the intercept point
+            position (np.ndarray): (x, y, z) global position of the interface
+            normal (np.ndarray): (x, y, z) global normal vector of the interface
+            transverse (np.ndarray): (x, y, z) global transverse vector of the interface
 
         Returns:
-            output_beams (list): List of output Beam objects
+            output_beams (list): List of output beam segments
         """
 
-        global_normal = self.get_global_normal()
-        beam_direction = incident_beam.get_global_direction()
-        intercept = self.get_intercept(incident_beam)
-
-        if intercept is None:
-            return []
-
-        local_origin = incident_beam.get_relative_position(intercept)
+        global_normal = normal
+        beam_direction = incident_beam.direction
         waist_position, rayleigh_range = self.apply_abcd(incident_beam)
 
         # handle off-center interactions
-        radial_vector = intercept - self.get_global_position()
+        radial_vector = intercept - position
         if np.isclose(np.linalg.norm(radial_vector), 0):
             direction = beam_direction  # on-axis beam, no change in direction
         else:
@@ -1529,19 +2955,13 @@ class Lens(Interface):
             direction += radial_direction * radial_slope * normal_component
             direction /= np.linalg.norm(direction)
 
-        local_direction = incident_beam.get_relative_direction(direction)
-
         # generate output beam
-        output_beam = BeamSegment(
-            index=incident_beam.index,
-            direction=local_direction,
-            wavelength=incident_beam.wavelength,
-            polarization=incident_beam.polarization_jones,
-            power=incident_beam.power,
+        output_beam = incident_beam.derive(
+            position=intercept,
+            direction=direction,
             waist_position=waist_position,
             rayleigh_range=rayleigh_range,
         )
-        incident_beam.add(output_beam, origin=local_origin)
 
         return [output_beam]
 
@@ -1585,52 +3005,44 @@ class Waveplate(Interface):
         )
         self.retardance = retardance
         self.fast_axis_angle = fast_axis_angle
+        self.jones_matrix = waveplate_matrix(retardance, fast_axis_angle)
 
-    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+    def interact(
+        self,
+        incident_beam: SegmentRecord,
+        intercept: np.ndarray[float],
+        position: np.ndarray[float],
+        normal: np.ndarray[float],
+        transverse: np.ndarray[float],
+    ) -> list[SegmentRecord]:
         """
         Get the output beams from an incident beam interacting with the interface
 
         Args:
-            incident_beam (Beam): Incident beam object
+            incident_beam (SegmentRecord): Incident beam segment
+            intercept (np.ndarray): (x, y, z) global coordinates of the intercept point
+            position (np.ndarray): (x, y, z) global position of the interface
+            normal (np.ndarray): (x, y, z) global normal vector of the interface
+            transverse (np.ndarray): (x, y, z) global transverse vector of the interface
 
         Returns:
-            output_beams (list): List of output Beam objects
+            output_beams (list): List of output beam segments
         """
 
-        global_normal = self.get_global_normal()
-        beam_direction = incident_beam.get_global_direction()
-        intercept = self.get_intercept(incident_beam)
-
-        if intercept is None:
-            return []
-
-        local_origin = incident_beam.get_relative_position(intercept)
         waist_position, rayleigh_range = self.apply_abcd(incident_beam)
 
-        # Apply ideal waveplate Jones transform (retardance is specified in waves).
-        theta = np.radians(self.fast_axis_angle)
-        delta = 2 * np.pi * self.retardance
-        rotation = np.array(
-            [[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]],
-            dtype=complex,
-        )
-        phase_delay = np.array([[1, 0], [0, np.exp(1j * delta)]], dtype=complex)
-        transform = rotation @ phase_delay @ rotation.T
+        # Apply ideal waveplate Jones transform (precomputed in the constructor).
         output_jones = _normalize_jones_vector(
-            transform @ _normalize_jones_vector(incident_beam.polarization_jones)
+            self.jones_matrix @ _normalize_jones_vector(incident_beam.jones)
         )
 
         # generate output beam (no change in direction or other properties)
-        output_beam = BeamSegment(
-            index=incident_beam.index,
-            direction=incident_beam.get_relative_direction(beam_direction),
-            wavelength=incident_beam.wavelength,
-            polarization=output_jones,
-            power=incident_beam.power,
+        output_beam = incident_beam.derive(
+            position=intercept,
+            jones=output_jones,
             waist_position=waist_position,
             rayleigh_range=rayleigh_range,
         )
-        incident_beam.add(output_beam, origin=local_origin)
 
         return [output_beam]
 
@@ -1692,6 +3104,8 @@ class AcoustoOptic(Interface):
         width (float): Width for rectangular interface
         height (float): Height for rectangular interface
         max_angle (float): Maximum angle between incident beam and interface normal in degrees
+        bundle (bool): Whether to output all generated beams as a single bundle segment,
+                       members are only split into separate segments where they diverge
     """
 
     def __init__(
@@ -1706,6 +3120,7 @@ class AcoustoOptic(Interface):
         width: dim = None,
         height: dim = None,
         max_angle: float = 90,
+        bundle: bool = False,
     ):
 
         super().__init__(
@@ -1717,6 +3132,7 @@ class AcoustoOptic(Interface):
             max_angle=max_angle,
             single_sided=False,
         )
+        self.bundle = bundle
         self.sound_velocity = sound_velocity
         self.rf_frequencies = rf_frequencies
         if len(orders) != len(order_powers):
@@ -1726,23 +3142,30 @@ class AcoustoOptic(Interface):
         self.orders = orders
         self.order_powers = order_powers
 
-    def get_output_beams(self, incident_beam: BeamSegment) -> list[BeamSegment]:
+    def interact(
+        self,
+        incident_beam: SegmentRecord,
+        intercept: np.ndarray[float],
+        position: np.ndarray[float],
+        normal: np.ndarray[float],
+        transverse: np.ndarray[float],
+    ) -> list[SegmentRecord]:
         """
         Get the output beams from an incident beam interacting with the interface
 
         Args:
-            incident_beam (Beam): Incident beam object
+            incident_beam (SegmentRecord): Incident beam segment
+            intercept (np.ndarray): (x, y, z) global coordinates of the intercept point
+            position (np.ndarray): (x, y, z) global position of the interface
+            normal (np.ndarray): (x, y, z) global normal vector of the interface
+            transverse (np.ndarray): (x, y, z) global transverse vector of the interface
 
         Returns:
-            output_beams (list): List of output Beam objects
+            output_beams (list): List of output beam segments
         """
-        output_beams = []
-        beam_direction = incident_beam.get_global_direction()
-        intercept = self.get_intercept(incident_beam)
 
-        if intercept is None:
-            return []
-        local_origin = incident_beam.get_relative_position(intercept)
+        output_beams = []
+        beam_direction = incident_beam.direction
         waist_position, rayleigh_range = self.apply_abcd(incident_beam)
 
         # figure out how many bits will be needed to count the beams
@@ -1758,12 +3181,10 @@ class AcoustoOptic(Interface):
 
                 direction = (
                     beam_direction * photon_k
-                    + self.get_global_transverse() * phonon_k * order
+                    + transverse * phonon_k * order
                 )
                 direction /= np.linalg.norm(direction)
 
-                local_direction = incident_beam.get_relative_direction(direction)
-
                 # generate output beam
                 # not changing polarization for now (reasonable for longitudinal mode AOMs)
                 # powers can be specified for each order
@@ -1773,17 +3194,18 @@ class AcoustoOptic(Interface):
                 else:
                     power = incident_beam.power
 
-                output_beam = BeamSegment(
+                output_beam = incident_beam.derive(
                     index=(incident_beam.index << num_bits) + i,
-                    direction=local_direction,
-                    wavelength=incident_beam.wavelength,
-                    polarization=incident_beam.polarization_jones,
+                    position=intercept,
+                    direction=direction,
                     power=power,
                     waist_position=waist_position,
                     rayleigh_range=rayleigh_range,
+                    frequency=incident_beam.frequency + order * freq,
                 )
-                incident_beam.add(output_beam, origin=local_origin)
                 output_beams.append(output_beam)
                 i += 1
 
+        if self.bundle and len(output_beams) > 1:
+            return [SegmentRecord.bundle_of(output_beams)]
         return output_beams
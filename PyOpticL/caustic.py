@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from collections import namedtuple
+
+import numpy as np
+
+Caustic = namedtuple("Caustic", ["z", "radius", "curvature", "gouy_phase", "segment"])
+
+
+def beam_radius(q_param: np.ndarray | complex, wavelength: float) -> np.ndarray:
+    """
+    Calculate the beam radius for complex beam parameters
+
+    Args:
+        q_param (np.ndarray | complex): Complex beam parameters (mm units)
+        wavelength (float): Wavelength of the beam in nm
+
+    Returns:
+        radius (np.ndarray): Beam radius in mm
+    """
+
+    q_param = np.asarray(q_param, dtype=complex)
+    z, z_R = q_param.real, q_param.imag
+    w_0 = np.sqrt(np.asarray(wavelength) * 1e-6 * z_R / np.pi)  # beam waist
+    return w_0 * np.sqrt(1 + (z / z_R) ** 2)
+
+
+def wavefront_curvature(q_param: np.ndarray | complex) -> np.ndarray:
+    """
+    Calculate the wavefront curvature (inverse radius of curvature) for complex beam parameters
+
+    Args:
+        q_param (np.ndarray | complex): Complex beam parameters (mm units)
+
+    Returns:
+        curvature (np.ndarray): Wavefront curvature in 1/mm (zero at the waist)
+    """
+
+    q_param = np.asarray(q_param, dtype=complex)
+    z, z_R = q_param.real, q_param.imag
+    return z / (z**2 + z_R**2)
+
+
+def gouy_phase(q_param: np.ndarray | complex) -> np.ndarray:
+    """
+    Calculate the Gouy phase relative to the waist for complex beam parameters
+
+    Args:
+        q_param (np.ndarray | complex): Complex beam parameters (mm units)
+
+    Returns:
+        phase (np.ndarray): Gouy phase in radians
+    """
+
+    q_param = np.asarray(q_param, dtype=complex)
+    return np.arctan2(q_param.real, q_param.imag)
+
+
+def sample_caustic(
+    q_params: np.ndarray,
+    wavelengths: np.ndarray,
+    lengths: np.ndarray,
+    z: np.ndarray,
+) -> Caustic:
+    """
+    Sample the caustic of a chain of beam segments in a single vectorized pass
+    The Gouy phase is accumulated along the chain, starting at zero
+
+    Args:
+        q_params (np.ndarray): (N,) complex beam parameter at the start of each segment (mm units)
+        wavelengths (np.ndarray): (N,) wavelength of each segment in nm
+        lengths (np.ndarray): (N,) length of each segment in mm
+        z (np.ndarray): (M,) distances along the chain to sample at in mm
+
+    Returns:
+        caustic (Caustic): Sampled z, radius, curvature, gouy_phase and segment index arrays
+    """
+
+    q_params = np.asarray(q_params, dtype=complex).reshape(-1)
+    wavelengths = np.asarray(wavelengths, dtype=float).reshape(-1)
+    lengths = np.asarray(lengths, dtype=float).reshape(-1)
+    z = np.asarray(z, dtype=float)
+
+    # find the segment containing each sample
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    segment = np.clip(np.searchsorted(starts, z, side="right") - 1, 0, len(starts) - 1)
+    q = q_params[segment] + (z - starts[segment])
+
+    # gouy phase accumulated over all previous segments
+    start_phase = gouy_phase(q_params)
+    end_phase = gouy_phase(q_params + lengths)
+    offsets = np.concatenate([[0], np.cumsum(end_phase - start_phase)[:-1]])
+    phase = offsets[segment] + gouy_phase(q) - start_phase[segment]
+
+    return Caustic(
+        z=z,
+        radius=beam_radius(q, wavelengths[segment]),
+        curvature=wavefront_curvature(q),
+        gouy_phase=phase,
+        segment=segment,
+    )
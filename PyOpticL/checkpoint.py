@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+from PyOpticL.trace import (
+    BeamBundle,
+    ChildSpec,
+    SegmentRecord,
+    TraceResult,
+    TraceStats,
+)
+
+# bump to invalidate checkpoints written by incompatible versions
+CHECKPOINT_VERSION = 2
+# floats are compared in units of this step
+FINGERPRINT_TOLERANCE = 1e-9
+# trace statistics stored with a checkpoint
+STATS_FIELDS = (
+    "steps",
+    "tasks",
+    "max_queue_size",
+    "max_depth",
+    "truncated_depth",
+    "truncated_segments",
+    "pruned_power",
+)
+
+
+def hash_value(value, digest: hashlib._Hash):
+    """
+    Feed a value into a hash in a form that is stable between sessions
+    Floats are quantized so that round-off does not change the hash
+
+    Args:
+        value: Number, string, array, container or plain object to hash
+        digest (hashlib._Hash): Hash to update
+    """
+
+    if value is None or isinstance(value, (bool, int, str)):
+        digest.update(repr(value).encode())
+    elif isinstance(value, (float, np.floating)):
+        digest.update(repr(round(float(value) / FINGERPRINT_TOLERANCE)).encode())
+    elif isinstance(value, (complex, np.complexfloating)):
+        hash_value(value.real, digest)
+        hash_value(value.imag, digest)
+    elif isinstance(value, np.ndarray):
+        digest.update(repr(value.shape).encode())
+        for item in value.ravel().tolist():
+            hash_value(item, digest)
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"[{len(value)}".encode())
+        for item in value:
+            hash_value(item, digest)
+        digest.update(b"]")
+    elif isinstance(value, dict):
+        digest.update(f"{{{len(value)}".encode())
+        for key in sorted(value, key=repr):
+            hash_value(key, digest)
+            hash_value(value[key], digest)
+        digest.update(b"}")
+    elif hasattr(value, "__dict__"):
+        digest.update(type(value).__qualname__.encode())
+        hash_value(vars(value), digest)
+    else:
+        try:
+            hash_value(tuple(value), digest)
+        except TypeError:
+            digest.update(repr(value).encode())
+
+
+def scene_fingerprint(scene, **settings) -> str:
+    """
+    Compute a fingerprint of everything a trace of a scene depends on:
+    interface parameters and placements, beam children and their constraints,
+    the input beam and existing segments
+
+    Args:
+        scene (TraceScene): Scene to fingerprint
+        **settings: Tracer settings that also affect the result
+
+    Returns:
+        fingerprint (str): Hex digest that changes whenever a trace could change
+    """
+
+    digest = hashlib.sha1()
+    hash_value(CHECKPOINT_VERSION, digest)
+    hash_value(settings, digest)
+
+    table = scene.table
+    hash_value(scene.owners, digest)
+    for interface in scene.interfaces:
+        # interfaces are detached copies, parent is not part of the geometry
+        hash_value(type(interface).__qualname__, digest)
+        hash_value(
+            {key: value for key, value in vars(interface).items() if key != "parent"},
+            digest,
+        )
+    for array in (table.positions, table.normals, scene.transverses, scene.active):
+        hash_value(array, digest)
+
+    for child in scene.children:
+        hash_value(vars(child), digest)
+
+    parents = {id(record): i for i, record in enumerate(scene.segments)}
+    for record in scene.segments:
+        state = {
+            key: value
+            for key, value in vars(record).items()
+            if key not in ("parent", "children")
+        }
+        state["parent"] = parents.get(id(record.parent), -1)
+        hash_value(state, digest)
+
+    hash_value(scene.bound_base, digest)
+    hash_value(scene.bound_rotation, digest)
+    hash_value(scene.final_distance, digest)
+    return digest.hexdigest()
+
+
+def encode_result(result: TraceResult) -> dict[str, np.ndarray]:
+    """
+    Convert a trace result to plain arrays
+    Object references (parents, None names) are stored as indices and empty strings
+
+    Args:
+        result (TraceResult): Result to convert
+
+    Returns:
+        arrays (dict[str, np.ndarray]): Array name to values
+    """
+
+    records = result.records
+    rows = {id(record): i for i, record in enumerate(records)}
+    bundles = [
+        record.bundle if record.bundle is not None else BeamBundle([], [], [], [])
+        for record in records
+    ]
+    placed = result.placed
+    stats = result.stats if result.stats is not None else TraceStats("depth")
+
+    arrays = dict(
+        version=np.array(CHECKPOINT_VERSION),
+        # segment records in trace order
+        index=np.array([record.index for record in records], dtype=int),
+        parent=np.array(
+            [rows.get(id(record.parent), -1) for record in records], dtype=int
+        ),
+        # removed records keep their parent but are no longer among its children
+        attached=np.array(
+            [
+                record.parent is not None
+                and any(child is record for child in record.parent.children)
+                for record in records
+            ],
+            dtype=bool,
+        ),
+        position=np.array([record.position for record in records]).reshape(-1, 3),
+        direction=np.array([record.direction for record in records]).reshape(-1, 3),
+        wavelength=np.array([record.wavelength for record in records], dtype=float),
+        jones=np.array([record.jones for record in records], dtype=complex).reshape(
+            -1, 2
+        ),
+        power=np.array([record.power for record in records], dtype=float),
+        waist_position=np.array(
+            [record.waist_position for record in records], dtype=float
+        ),
+        rayleigh_range=np.array(
+            [record.rayleigh_range for record in records], dtype=float
+        ),
+        frequency=np.array([record.frequency for record in records], dtype=float),
+        distance=np.array([record.distance for record in records], dtype=float),
+        start=np.array([record.start or "" for record in records], dtype=str),
+        end=np.array([record.end or "" for record in records], dtype=str),
+        name=np.array([record.name or "" for record in records], dtype=str),
+        alive=np.array([record.alive for record in records], dtype=bool),
+        modified=np.array([record.modified for record in records], dtype=bool),
+        reparented=np.array([record.reparented for record in records], dtype=bool),
+        is_bundle=np.array([record.bundle is not None for record in records], dtype=bool),
+        # bundle members of all records, concatenated
+        members=np.array([len(bundle) for bundle in bundles], dtype=int),
+        member_index=np.concatenate(
+            [bundle.indices for bundle in bundles] + [np.zeros(0, dtype=int)]
+        ),
+        member_direction=np.concatenate(
+            [bundle.directions for bundle in bundles] + [np.zeros((0, 3))]
+        ),
+        member_power=np.concatenate(
+            [bundle.powers for bundle in bundles] + [np.zeros(0)]
+        ),
+        member_frequency=np.concatenate(
+            [bundle.frequencies for bundle in bundles] + [np.zeros(0)]
+        ),
+        member_distance=np.concatenate(
+            [np.asarray(bundle.distances, dtype=float) for bundle in bundles]
+            + [np.zeros(0)]
+        ),
+        # placed beam children in placement order
+        child_name=np.array([child.name for child in placed], dtype=str),
+        child_label=np.array([child.label for child in placed], dtype=str),
+        child_beam_index=np.array([child.beam_index for child in placed], dtype=int),
+        child_after_object=np.array(
+            [child.after_object or "" for child in placed], dtype=str
+        ),
+        child_constraint_type=np.array(
+            [child.constraint_type for child in placed], dtype=str
+        ),
+        child_constraint_value=np.array(
+            [child.constraint_value for child in placed], dtype=float
+        ),
+        child_offset=np.array([child.offset for child in placed]).reshape(-1, 3),
+        child_base=np.array([child.base for child in placed]).reshape(-1, 3),
+        child_rows=np.array([len(child.rows) for child in placed], dtype=int),
+        child_row=np.array(
+            [row for child in placed for row in child.rows], dtype=int
+        ),
+        child_interface_row=np.array(
+            [
+                -1 if child.interface_row is None else child.interface_row
+                for child in placed
+            ],
+            dtype=int,
+        ),
+        child_interface_offset=np.array(
+            [child.interface_offset for child in placed]
+        ).reshape(-1, 3),
+        child_placed=np.array([child.placed for child in placed], dtype=bool),
+        child_bound=np.array([child.bound for child in placed], dtype=bool),
+        # queue statistics
+        stats_policy=np.array(stats.policy),
+        stats=np.array([getattr(stats, field) for field in STATS_FIELDS], dtype=int),
+    )
+    return arrays
+
+
+def decode_result(arrays: dict[str, np.ndarray]) -> TraceResult:
+    """
+    Rebuild a trace result from the arrays written by encode_result
+
+    Args:
+        arrays (dict[str, np.ndarray]): Array name to values
+
+    Returns:
+        result (TraceResult): The stored result
+    """
+
+    def text(value) -> str:
+        return str(value) or None
+
+    records = []
+    member_ends = np.cumsum(arrays["members"])
+    for i in range(len(arrays["index"])):
+        record = SegmentRecord(
+            index=int(arrays["index"][i]),
+            position=arrays["position"][i],
+            direction=arrays["direction"][i],
+            wavelength=float(arrays["wavelength"][i]),
+            jones=arrays["jones"][i],
+            power=float(arrays["power"][i]),
+            waist_position=float(arrays["waist_position"][i]),
+            rayleigh_range=float(arrays["rayleigh_range"][i]),
+            frequency=float(arrays["frequency"][i]),
+        )
+        record.distance = float(arrays["distance"][i])
+        record.start = text(arrays["start"][i])
+        record.end = text(arrays["end"][i])
+        record.name = text(arrays["name"][i])
+        record.alive = bool(arrays["alive"][i])
+        record.modified = bool(arrays["modified"][i])
+        record.reparented = bool(arrays["reparented"][i])
+        if arrays["is_bundle"][i]:
+            members = slice(member_ends[i] - arrays["members"][i], member_ends[i])
+            record.bundle = BeamBundle(
+                arrays["member_index"][members],
+                arrays["member_direction"][members],
+                arrays["member_power"][members],
+                arrays["member_frequency"][members],
+            )
+            record.bundle.distances = arrays["member_distance"][members].copy()
+        parent = int(arrays["parent"][i])
+        if parent >= 0:
+            record.parent = records[parent]
+            if arrays["attached"][i]:
+                record.parent.children.append(record)
+        records.append(record)
+
+    placed = []
+    row_ends = np.cumsum(arrays["child_rows"])
+    for i in range(len(arrays["child_name"])):
+        interface_row = int(arrays["child_interface_row"][i])
+        placed.append(
+            ChildSpec(
+                name=str(arrays["child_name"][i]),
+                label=str(arrays["child_label"][i]),
+                beam_index=int(arrays["child_beam_index"][i]),
+                after_object=text(arrays["child_after_object"][i]),
+                constraint_type=str(arrays["child_constraint_type"][i]),
+                constraint_value=float(arrays["child_constraint_value"][i]),
+                offset=arrays["child_offset"][i],
+                base=arrays["child_base"][i],
+                rows=[
+                    int(row)
+                    for row in arrays["child_row"][
+                        row_ends[i] - arrays["child_rows"][i] : row_ends[i]
+                    ]
+                ],
+                interface_row=None if interface_row < 0 else interface_row,
+                interface_offset=arrays["child_interface_offset"][i],
+                placed=bool(arrays["child_placed"][i]),
+                bound=bool(arrays["child_bound"][i]),
+            )
+        )
+
+    stats = TraceStats(str(arrays["stats_policy"]))
+    for field, value in zip(STATS_FIELDS, arrays["stats"]):
+        setattr(stats, field, int(value))
+    return TraceResult(records, placed, stats)
+
+
+def save_trace(directory: str | Path, fingerprint: str, result: TraceResult):
+    """
+    Store a trace result under its scene fingerprint
+    Checkpoints hold plain arrays only (see encode_result), so loading one never runs code
+
+    Args:
+        directory (str | Path): Checkpoint directory
+        fingerprint (str): Fingerprint of the traced scene
+        result (TraceResult): Result to store
+    """
+
+    path = Path(directory) / f"{fingerprint}.npz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first so readers never see a partial checkpoint
+    temporary = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temporary, "wb") as file:
+        np.savez(file, **encode_result(result))
+    os.replace(temporary, path)
+
+
+def load_trace(directory: str | Path, fingerprint: str) -> TraceResult:
+    """
+    Load the trace result stored under a scene fingerprint
+
+    Args:
+        directory (str | Path): Checkpoint directory
+        fingerprint (str): Fingerprint of the scene to restore
+
+    Returns:
+        result (TraceResult): Stored result (None if there is no usable checkpoint)
+    """
+
+    path = Path(directory) / f"{fingerprint}.npz"
+    if not path.exists():
+        return None
+    try:
+        # object arrays would need pickle, refuse them
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        if int(arrays["version"]) != CHECKPOINT_VERSION:
+            return None
+        return decode_result(arrays)
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import os
+from zipfile import ZIP_STORED, ZipFile
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# columns written for every segment, in file order
+COLUMNS = (
+    ("row", int),
+    ("segment", int),
+    ("parent", int),
+    ("index", int),
+    ("parent_index", int),
+    ("alive", bool),
+    ("start", str),
+    ("end", str),
+    ("position_x", float),
+    ("position_y", float),
+    ("position_z", float),
+    ("direction_x", float),
+    ("direction_y", float),
+    ("direction_z", float),
+    ("distance", float),
+    ("q_real", float),
+    ("q_imag", float),
+    ("jones_x_real", float),
+    ("jones_x_imag", float),
+    ("jones_y_real", float),
+    ("jones_y_imag", float),
+    ("power", float),
+    ("wavelength", float),
+    ("frequency", float),
+    ("members", int),
+)
+
+# separates the column name from the chunk number in NPZ array names
+CHUNK_SEPARATOR = "."
+
+
+class TraceWriter:
+    """
+    Stream segment records of a headless trace to columnar files
+    Rows are written as segments are traced, a segment that changes later in the trace
+    (or is removed by a re-trace) gets another row with the same segment id,
+    so the last row of each segment id holds its final state (see read_trace)
+    An NPZ file is always written, a Parquet file is also written if pyarrow is installed,
+    both receive each chunk of rows as soon as it is flushed
+    Segments are identified by record identity, so records must stay alive while the
+    writer is open (the tracer keeps all records of a trace, including removed ones)
+
+    Args:
+        filename (str): Output file name, the extension is replaced by .npz and .parquet
+        chunk_size (int): Number of rows buffered before they are flushed as a chunk
+        parquet (bool): Whether to write a Parquet file if pyarrow is available
+    """
+
+    def __init__(self, filename: str, chunk_size: int = 4096, parquet: bool = True):
+        base = os.path.splitext(filename)[0]
+        self.npz_filename = base + ".npz"
+        self.parquet_filename = base + ".parquet" if parquet and pa is not None else None
+        self.chunk_size = chunk_size
+
+        self.buffer = {name: [] for name, _ in COLUMNS}
+        self.npz_file = ZipFile(self.npz_filename, "w", ZIP_STORED, allowZip64=True)
+        self.chunks = 0
+        self.parquet_writer = None
+        self.rows = 0
+
+        # segment id and last written state by record id
+        self.segments = {}
+        self.closed = False
+
+    def get_segment(self, record) -> int:
+        """
+        Get the segment id of a record, assigning a new one if needed
+
+        Args:
+            record (SegmentRecord): Record to look up
+
+        Returns:
+            segment (int): Segment id (-1 for None)
+        """
+
+        if record is None:
+            return -1
+        entry = self.segments.get(id(record))
+        if entry is None:
+            entry = [len(self.segments), None]
+            self.segments[id(record)] = entry
+        return entry[0]
+
+    def get_state(self, record) -> tuple:
+        """
+        Get the parts of a record that can change after it was first traced
+
+        Args:
+            record (SegmentRecord): Record to check
+
+        Returns:
+            state (tuple): Comparable record state
+        """
+
+        return (
+            record.alive,
+            record.distance,
+            record.end,
+            record.index,
+            id(record.parent),
+            record.power,
+            0 if record.bundle is None else len(record.bundle),
+        )
+
+    def write(self, record):
+        """
+        Add a row for the current state of a segment record
+
+        Args:
+            record (SegmentRecord): Record to write
+        """
+
+        if self.closed:
+            raise RuntimeError("Trace writer is already closed")
+
+        segment = self.get_segment(record)
+        self.segments[id(record)][1] = self.get_state(record)
+
+        parent = record.parent
+        jones = record.jones
+        q_param = record.q_parameter
+        values = (
+            self.rows,
+            segment,
+            self.get_segment(parent),
+            record.index,
+            -1 if parent is None else parent.index,
+            record.alive,
+            record.start or "",
+            record.end or "",
+            *record.position,
+            *record.direction,
+            record.distance,
+            q_param.real,
+            q_param.imag,
+            jones[0].real,
+            jones[0].imag,
+            jones[1].real,
+            jones[1].imag,
+            record.power,
+            record.wavelength,
+            record.frequency,
+            0 if record.bundle is None else len(record.bundle),
+        )
+        for (name, _), value in zip(COLUMNS, values):
+            self.buffer[name].append(value)
+        self.rows += 1
+
+        if len(self.buffer["row"]) >= self.chunk_size:
+            self.flush()
+
+    def sync(self, records: list):
+        """
+        Write rows for all records whose state differs from their last written row
+
+        Args:
+            records (list[SegmentRecord]): Records of a trace (including removed ones)
+        """
+
+        for record in records:
+            entry = self.segments.get(id(record))
+            if entry is None or entry[1] is None:
+                # removed records that were never written are skipped
+                if record.alive:
+                    self.write(record)
+            elif entry[1] != self.get_state(record):
+                self.write(record)
+
+    def flush(self):
+        """Convert buffered rows to a chunk of columns and write it to the output files"""
+
+        if len(self.buffer["row"]) == 0:
+            return
+
+        chunk = {
+            name: np.array(self.buffer[name], dtype=dtype) for name, dtype in COLUMNS
+        }
+        self.buffer = {name: [] for name, _ in COLUMNS}
+
+        # each chunk is stored as its own arrays, read_trace joins them
+        for name, column in chunk.items():
+            key = f"{name}{CHUNK_SEPARATOR}{self.chunks}.npy"
+            with self.npz_file.open(key, "w") as file:
+                np.lib.format.write_array(file, column, allow_pickle=False)
+        self.chunks += 1
+
+        if self.parquet_filename is not None:
+            table = pa.table({name: pa.array(column) for name, column in chunk.items()})
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(
+                    self.parquet_filename, table.schema
+                )
+            self.parquet_writer.write_table(table)
+
+    def close(self):
+        """Flush remaining rows and close the output files"""
+
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.npz_file.close()
+        self.segments = None
+
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+    def __enter__(self) -> TraceWriter:
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def read_trace(filename: str, final: bool = True) -> dict[str, np.ndarray]:
+    """
+    Read the columns of an exported trace from its NPZ file
+
+    Args:
+        filename (str): File written by a TraceWriter (any extension)
+        final (bool): Only keep the last row of each segment, dropping removed segments
+
+    Returns:
+        columns (dict[str, np.ndarray]): Column name to values
+    """
+
+    base = os.path.splitext(filename)[0]
+    chunks = {name: [] for name, _ in COLUMNS}
+    with np.load(base + ".npz", allow_pickle=False) as data:
+        for key in data.files:
+            name, chunk = key.rsplit(CHUNK_SEPARATOR, 1)
+            chunks[name].append((int(chunk), data[key]))
+    columns = {
+        name: (
+            np.concatenate([column for _, column in sorted(chunks[name])])
+            if len(chunks[name]) > 0
+            else np.array([], dtype=dtype)
+        )
+        for name, dtype in COLUMNS
+    }
+
+    if final and len(columns["segment"]) > 0:
+        # rows are in write order, keep the last one of each segment
+        segments = columns["segment"][::-1]
+        _, first = np.unique(segments, return_index=True)
+        keep = np.sort(len(segments) - 1 - first)
+        keep = keep[columns["alive"][keep]]
+        columns = {name: column[keep] for name, column in columns.items()}
+
+    return columns
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import numpy as np
+
+from PyOpticL.profiling import count
+
+
+class InterfaceTable:
+    """
+    Structure-of-arrays table of interface geometry in the global frame
+
+    Args:
+        positions (np.ndarray): (N, 3) global interface positions
+        normals (np.ndarray): (N, 3) global interface normals
+        circular (np.ndarray): (N,) whether each interface has a circular aperture
+        radii (np.ndarray): (N,) aperture radius of circular interfaces
+        half_widths (np.ndarray): (N,) half width of rectangular interfaces
+        half_heights (np.ndarray): (N,) half height of rectangular interfaces
+        max_angles (np.ndarray): (N,) maximum angle of incidence in degrees
+        single_sided (np.ndarray): (N,) whether each interface only interacts from one side
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        normals: np.ndarray,
+        circular: np.ndarray,
+        radii: np.ndarray,
+        half_widths: np.ndarray,
+        half_heights: np.ndarray,
+        max_angles: np.ndarray,
+        single_sided: np.ndarray,
+    ):
+        self.positions = np.array(positions, dtype=float).reshape(-1, 3)
+        self.normals = np.array(normals, dtype=float).reshape(-1, 3)
+        self.circular = np.array(circular, dtype=bool)
+        self.radii = np.array(radii, dtype=float)
+        self.half_widths = np.array(half_widths, dtype=float)
+        self.half_heights = np.array(half_heights, dtype=float)
+        self.max_angles = np.array(max_angles, dtype=float)
+        self.single_sided = np.array(single_sided, dtype=bool)
+
+    @classmethod
+    def from_interfaces(
+        cls,
+        interfaces: list,
+        positions: np.ndarray = None,
+        normals: np.ndarray = None,
+    ) -> InterfaceTable:
+        """
+        Build a table from a list of interfaces
+
+        Args:
+            interfaces (list[Interface]): Interfaces to include
+            positions (np.ndarray): (N, 3) global interface positions (defaults to current placement)
+            normals (np.ndarray): (N, 3) global interface normals (defaults to current placement)
+
+        Returns:
+            table (InterfaceTable): Table with one row per interface
+        """
+
+        if positions is None:
+            positions = [interface.get_global_position() for interface in interfaces]
+        if normals is None:
+            normals = [interface.get_global_normal() for interface in interfaces]
+
+        circular = [interface.shape == "circular" for interface in interfaces]
+        return cls(
+            positions=positions,
+            normals=normals,
+            circular=circular,
+            radii=[
+                interface.diameter / 2 if is_circular else np.nan
+                for interface, is_circular in zip(interfaces, circular)
+            ],
+            half_widths=[
+                np.nan if is_circular else interface.width / 2
+                for interface, is_circular in zip(interfaces, circular)
+            ],
+            half_heights=[
+                np.nan if is_circular else interface.height / 2
+                for interface, is_circular in zip(interfaces, circular)
+            ],
+            max_angles=[interface.max_angle for interface in interfaces],
+            single_sided=[interface.single_sided for interface in interfaces],
+        )
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def update(self, rows: list[int], positions: np.ndarray, normals: np.ndarray):
+        """
+        Move a subset of interfaces
+
+        Args:
+            rows (list[int]): Rows to update
+            positions (np.ndarray): (len(rows), 3) new global positions
+            normals (np.ndarray): (len(rows), 3) new global normals
+        """
+
+        self.positions[rows] = positions
+        self.normals[rows] = normals
+
+    def bounds(self, padding: float = 1e-6) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get axis-aligned boxes containing every point where a beam can intercept each interface
+
+        Args:
+            padding (float): Extra margin added on all sides in mm
+
+        Returns:
+            lower (np.ndarray): (N, 3) lower box corners
+            upper (np.ndarray): (N, 3) upper box corners
+        """
+
+        normals = self.normals
+        # extent of a disc along each global axis
+        disc_extent = self.radii[:, None] * np.sqrt(np.clip(1 - normals**2, 0, 1))
+
+        # rectangle bounds apply to the global x and y offsets, z follows from the plane
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z_extent = (
+                np.abs(normals[:, 0]) * self.half_widths
+                + np.abs(normals[:, 1]) * self.half_heights
+            ) / np.abs(normals[:, 2])
+        z_extent = np.where(np.abs(normals[:, 2]) > 1e-9, z_extent, np.inf)
+        rectangle_extent = np.stack([self.half_widths, self.half_heights, z_extent], -1)
+
+        extent = np.where(self.circular[:, None], disc_extent, rectangle_extent)
+        extent = extent + padding
+        return self.positions - extent, self.positions + extent
+
+
+def intersect(
+    table: InterfaceTable,
+    origins: np.ndarray,
+    directions: np.ndarray,
+    max_distances: np.ndarray | float = np.inf,
+    rows: np.ndarray | list[int] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Intersect rays with interfaces in a single vectorized pass
+    Acceptance rules match Interface.get_intercept
+
+    Args:
+        origins (np.ndarray): (M, 3) or (3,) global ray origins
+        directions (np.ndarray): (M, 3) or (3,) global ray directions
+        max_distances (np.ndarray | float): (M,) maximum intercept distance of each ray
+        rows (np.ndarray | list[int]): Subset of table rows to test (defaults to all rows)
+
+    Returns:
+        intercepts (np.ndarray): (M, K, 3) global intercept points (nan where missed)
+        ranges (np.ndarray): (M, K) distance from ray origin to intercept (inf where missed)
+    """
+
+    single_ray = np.ndim(origins) == 1
+    origins = np.array(origins, dtype=float).reshape(-1, 3)
+    directions = np.array(directions, dtype=float).reshape(-1, 3)
+    max_distances = np.broadcast_to(
+        np.asarray(max_distances, dtype=float), (len(origins),)
+    )
+
+    if rows is None:
+        rows = np.arange(len(table))
+    rows = np.asarray(rows, dtype=int)
+    count("intercept_tests", len(origins) * len(rows))
+
+    # (M, K, 3) broadcasting of rays against interfaces
+    positions = table.positions[rows][None, :, :]
+    normals = table.normals[rows][None, :, :]
+    ray_origins = origins[:, None, :]
+    ray_directions = directions[:, None, :]
+
+    # check if beam is within max angle
+    cos_angle = np.sum(normals * -ray_directions, axis=-1)
+    incident_angle = np.abs(np.arccos(np.clip(cos_angle, -1, 1)))
+    double_sided = ~table.single_sided[rows][None, :]
+    incident_angle = np.where(
+        double_sided & (incident_angle > np.pi / 2),
+        incident_angle - np.pi,
+        incident_angle,
+    )
+    valid = incident_angle <= np.deg2rad(table.max_angles[rows])[None, :]
+
+    # check if beam is parallel to interface
+    denom = np.sum(normals * ray_directions, axis=-1)
+    valid &= np.abs(denom) >= 1e-6
+
+    # parallel beams give infinite distances, which are masked out below
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = np.sum(normals * (positions - ray_origins), axis=-1) / denom
+        intercepts = ray_origins + distance[..., None] * ray_directions
+    # check if intercept is behind or too close to the beam origin
+    valid &= distance >= 1e-6
+    # check if intercept is within beam distance
+    valid &= distance <= max_distances[:, None]
+
+    # check if intercept is within the interface bounds
+    offsets = intercepts - positions
+    circular = table.circular[rows][None, :]
+    inside_circle = np.linalg.norm(offsets, axis=-1) <= table.radii[rows][None, :]
+    inside_rectangle = (np.abs(offsets[..., 0]) <= table.half_widths[rows][None, :]) & (
+        np.abs(offsets[..., 1]) <= table.half_heights[rows][None, :]
+    )
+    valid &= np.where(circular, inside_circle, inside_rectangle)
+
+    intercepts = np.where(valid[..., None], intercepts, np.nan)
+    ranges = np.where(
+        valid, np.linalg.norm(intercepts - ray_origins, axis=-1), np.inf
+    )
+
+    if single_ray:
+        return intercepts[0], ranges[0]
+    return intercepts, ranges
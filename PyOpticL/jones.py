@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def linear_states(angle: np.ndarray | float) -> np.ndarray:
+    """
+    Build linear polarization Jones vectors
+
+    Args:
+        angle (np.ndarray | float): Polarization angles in degrees
+
+    Returns:
+        states (np.ndarray): (..., 2) complex Jones vectors
+    """
+
+    angle = np.radians(np.asarray(angle, dtype=float))
+    return np.stack([np.cos(angle), np.sin(angle)], -1).astype(complex)
+
+
+def waveplate_matrix(
+    retardance: np.ndarray | float, fast_axis_angle: np.ndarray | float
+) -> np.ndarray:
+    """
+    Build ideal waveplate Jones matrices
+
+    Args:
+        retardance (np.ndarray | float): Phase delay in waves (0.25 quarter-wave, 0.5 half-wave)
+        fast_axis_angle (np.ndarray | float): Angle of the fast axis in degrees
+
+    Returns:
+        matrix (np.ndarray): (..., 2, 2) complex Jones matrices
+    """
+
+    theta = np.radians(np.asarray(fast_axis_angle, dtype=float))
+    delay = np.exp(2j * np.pi * np.asarray(retardance, dtype=float))
+    cos, sin = np.cos(theta), np.sin(theta)
+    cos, sin, delay = np.broadcast_arrays(cos, sin, delay)
+
+    # rotation @ diag(1, delay) @ rotation.T
+    matrix = np.empty(cos.shape + (2, 2), dtype=complex)
+    matrix[..., 0, 0] = cos**2 + delay * sin**2
+    matrix[..., 0, 1] = cos * sin * (1 - delay)
+    matrix[..., 1, 0] = cos * sin * (1 - delay)
+    matrix[..., 1, 1] = sin**2 + delay * cos**2
+    return matrix
+
+
+def polarizer_matrix(angle: np.ndarray | float) -> np.ndarray:
+    """
+    Build Jones matrices projecting onto a linear polarization axis
+
+    Args:
+        angle (np.ndarray | float): Polarization axis angles in degrees
+
+    Returns:
+        matrix (np.ndarray): (..., 2, 2) complex Jones matrices
+    """
+
+    axis = linear_states(angle)
+    return axis[..., :, None] * axis[..., None, :].conj()
+
+
+class JonesPath:
+    """
+    Chain of interface Jones matrices along a beam
+
+    Args:
+        matrices (list[np.ndarray]): 2x2 Jones matrix of each interface, in beam order
+        labels (list[str]): Label of each interface
+        retardances (list[float]): Retardance of each interface that is a waveplate (None otherwise)
+    """
+
+    def __init__(
+        self,
+        matrices: list[np.ndarray],
+        labels: list[str] = None,
+        retardances: list[float] = None,
+    ):
+        self.matrices = [np.asarray(matrix, dtype=complex) for matrix in matrices]
+        if labels is None:
+            labels = [str(i) for i in range(len(matrices))]
+        if retardances is None:
+            retardances = [None] * len(matrices)
+        self.labels = list(labels)
+        self.retardances = list(retardances)
+
+    def __len__(self) -> int:
+        return len(self.matrices)
+
+    def get_matrix(
+        self, waveplate_angles: dict[int | str, np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Compose the chain into a single Jones matrix
+        All swept arrays are broadcast against each other
+
+        Args:
+            waveplate_angles (dict[int | str, np.ndarray]): Fast axis angles in degrees to override,
+                                                            keyed by element number or label
+
+        Returns:
+            matrix (np.ndarray): (..., 2, 2) total Jones matrices
+        """
+
+        waveplate_angles = {} if waveplate_angles is None else waveplate_angles
+        for key in waveplate_angles:
+            i = key if isinstance(key, int) else self.labels.index(key)
+            if self.retardances[i] is None:
+                raise ValueError(f"Interface {self.labels[i]} is not a waveplate")
+
+        total = np.eye(2, dtype=complex)
+        for i, (matrix, label, retardance) in enumerate(
+            zip(self.matrices, self.labels, self.retardances)
+        ):
+            if i in waveplate_angles:
+                matrix = waveplate_matrix(retardance, waveplate_angles[i])
+            elif label in waveplate_angles:
+                matrix = waveplate_matrix(retardance, waveplate_angles[label])
+            total = matrix @ total
+        return total
+
+    def propagate(
+        self,
+        states: np.ndarray,
+        waveplate_angles: dict[int | str, np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Propagate input Jones vectors through the chain in one batched pass
+        Outputs are not normalized, their squared norm is the transmitted power fraction
+
+        Args:
+            states (np.ndarray): (..., 2) input Jones vectors
+            waveplate_angles (dict[int | str, np.ndarray]): Fast axis angles in degrees to override,
+                                                            keyed by element number or label
+
+        Returns:
+            states (np.ndarray): (..., 2) output Jones vectors
+        """
+
+        matrix = self.get_matrix(waveplate_angles)
+        states = np.asarray(states, dtype=complex)
+        return (matrix @ states[..., :, None])[..., 0]
+
+    def split_ratio(
+        self,
+        states: np.ndarray,
+        ref_polarization: float,
+        waveplate_angles: dict[int | str, np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the power split of a polarizing beamsplitter placed after the chain
+
+        Args:
+            states (np.ndarray): (..., 2) input Jones vectors
+            ref_polarization (float): Polarization axis angle of reflected light in degrees
+            waveplate_angles (dict[int | str, np.ndarray]): Fast axis angles in degrees to override,
+                                                            keyed by element number or label
+
+        Returns:
+            reflected (np.ndarray): Reflected fraction of the input power
+            transmitted (np.ndarray): Transmitted fraction of the input power
+        """
+
+        output = self.propagate(states, waveplate_angles)
+        power = np.sum(np.abs(np.asarray(states)) ** 2, axis=-1)
+        axis = linear_states(ref_polarization)
+        reflected = np.abs(output @ axis.conj()) ** 2 / power
+        transmitted = np.sum(np.abs(output) ** 2, axis=-1) / power - reflected
+        return reflected, transmitted
@@ -1,15 +1,282 @@
 from __future__ import annotations
 
 from collections import namedtuple
+from contextlib import contextmanager
 
 import FreeCAD as App
+import numpy as np
 import Part
 
 from PyOpticL.settings import get_hidden_object_groups
-from PyOpticL.utils import collect_children
+from PyOpticL.utils import collect_children, matrix_placement, placement_matrix
 
 Subcomponent = namedtuple("Subcomponent", ["component", "position", "rotation"])
 
+# properties that describe the structure of a layout rather than derived results
+REVISION_PROPERTIES = (
+    "BasePlacement",
+    "Parent",
+    "Children",
+    "BoundParent",
+    "BeamChildren",
+    "BeamSegments",
+    "StartObject",
+    "EndObject",
+    "AfterObject",
+    "ConstraintType",
+    "ConstraintValue",
+    "Offset",
+)
+
+# incremented whenever any layout changes structurally
+_revision = 0
+
+
+def get_revision() -> int:
+    """
+    Get the layout revision counter, which changes whenever the structure of any layout changes
+
+    Returns:
+        revision (int): Current revision
+    """
+    return _revision
+
+
+# number of active suspend_invalidation contexts
+_suspended = 0
+
+
+@contextmanager
+def suspend_invalidation():
+    """
+    Keep property changes from flagging other objects as dirty, used while a recompute
+    writes its own results back (changed objects still flag themselves and the revision
+    still changes), the caller is responsible for flagging whatever actually changed
+    """
+
+    global _suspended
+    _suspended += 1
+    try:
+        yield
+    finally:
+        _suspended -= 1
+
+
+class HandleObserver:
+    """Document observer that drops cached object handles once they may be stale"""
+
+    def slotDeletedObject(self, obj):
+        _handles.pop((obj.Document.Name, obj.Name), None)
+
+    def slotDeletedDocument(self, doc):
+        drop_handles(doc.Name)
+
+    def slotRelabelDocument(self, doc):
+        drop_handles(doc.Name)
+
+    def slotUndoDocument(self, doc):
+        drop_handles(doc.Name)
+
+    def slotRedoDocument(self, doc):
+        drop_handles(doc.Name)
+
+
+# document objects by (document name, object name), see get_document_object
+_handles = {}
+_handle_observer = None
+
+
+def get_document_object(document_id: str, object_id: str) -> App.DocumentObject:
+    """
+    Get a document object, cached until it is deleted or its document changes
+    The cache lives at module level since proxy attributes are saved with the document
+
+    Args:
+        document_id (str): Name of the document
+        object_id (str): Name of the object
+
+    Returns:
+        obj (App.DocumentObject): The document object (None if it does not exist)
+    """
+
+    global _handle_observer
+
+    key = (document_id, object_id)
+    obj = _handles.get(key)
+    if obj is None:
+        if _handle_observer is None:
+            _handle_observer = HandleObserver()
+            App.addDocumentObserver(_handle_observer)
+        obj = App.getDocument(document_id).getObject(object_id)
+        if obj is not None:
+            _handles[key] = obj
+    return obj
+
+
+# other module level caches keyed by (document name, ...), see register_document_cache
+_document_caches = []
+
+
+def register_document_cache(cache: dict):
+    """
+    Register a module level cache whose keys start with a document name,
+    its entries for a document are dropped along with the object handles of that document
+
+    Args:
+        cache (dict): Cache to register
+    """
+
+    _document_caches.append(cache)
+
+
+def drop_handles(document_id: str):
+    """
+    Drop all cached object handles (and registered cache entries) of a document
+
+    Args:
+        document_id (str): Name of the document
+    """
+
+    for cache in [_handles] + _document_caches:
+        for key in [key for key in cache if key[0] == document_id]:
+            del cache[key]
+
+
+def get_drill_tools(
+    shape: Part.Shape, drill_shapes: list[Part.Shape]
+) -> list[Part.Shape]:
+    """
+    Get the tools that drill a set of drill shapes into a shape with a single cut
+    The result is the same as cutting each drill in turn, together with extrusions of its
+    +z facing faces that lie in material left by the earlier drills (clearing the material above)
+    Tools that miss the shape do not change the cut, so no booleans are used to check overlaps,
+    faces are tested by classifying sample points against the shape and the earlier tools
+
+    Args:
+        shape (Part.Shape): Shape to drill
+        drill_shapes (list[Part.Shape]): Drill shapes in the frame of the shape, in drilling order
+
+    Returns:
+        tools (list[Part.Shape]): Tools to cut from the shape
+    """
+
+    bound_box = shape.BoundBox
+    max_dimension = bound_box.DiagonalLength
+    tools = []
+
+    def in_material(point: App.Vector, earlier: list[Part.Shape]) -> bool:
+        if not bound_box.isInside(point) or not shape.isInside(point, 1e-6, True):
+            return False
+        return not any(
+            tool.BoundBox.isInside(point) and tool.isInside(point, 1e-6, False)
+            for tool in earlier
+        )
+
+    for drill_shape in drill_shapes:
+        # the bounding box check skips most peers cheaply
+        if drill_shape.Volume < 1e-6 or not bound_box.intersect(drill_shape.BoundBox):
+            continue
+        earlier = list(tools)
+        tools.append(drill_shape)
+
+        rotation = drill_shape.Placement.Rotation.inverted()
+        z_direction = rotation.multVec(App.Vector(0, 0, 1))
+
+        # find and extrude +z-facing faces from drill_obj
+        for face in drill_shape.Faces:
+            if (
+                isinstance(face.Surface, Part.Plane)
+                and face.normalAt(0, 0).getAngle(z_direction) < 1e-6
+                and bound_box.intersect(face.BoundBox)
+                and any(
+                    in_material(point, earlier) for point in get_face_samples(face)
+                )
+            ):
+                tools.append(face.extrude(max_dimension * z_direction))
+    return tools
+
+
+def get_face_samples(face: Part.Face, count: int = 7) -> list[App.Vector]:
+    """
+    Get sample points spread over a face
+
+    Args:
+        face (Part.Face): Face to sample
+        count (int): Number of samples along each parameter direction
+
+    Returns:
+        points (list[App.Vector]): Center of mass and grid points that lie on the face
+    """
+
+    u_min, u_max, v_min, v_max = face.ParameterRange
+    points = [face.CenterOfMass]
+    for u in np.linspace(u_min, u_max, count + 2)[1:-1]:
+        for v in np.linspace(v_min, v_max, count + 2)[1:-1]:
+            point = face.valueAt(u, v)
+            if face.isInside(point, 1e-6, True):
+                points.append(point)
+    return points
+
+
+def compute_placements(root: App.DocumentObject, tolerance: float = 1e-9) -> int:
+    """
+    Calculate global placements of an object and its whole subtree at once
+    The tree is read into parent index and 4x4 transform arrays, transforms are
+    composed one depth level at a time and only changed placements are written back
+
+    Args:
+        root (App.DocumentObject): Root of the subtree
+        tolerance (float): Largest matrix difference treated as unchanged
+
+    Returns:
+        written (int): Number of placements that changed
+    """
+
+    # breadth first order, so parents are composed before their children
+    objects, parents, depths = [root], [-1], [0]
+    start = 0
+    while start < len(objects):
+        end = len(objects)
+        for i in range(start, end):
+            for child in objects[i].Children:
+                objects.append(child)
+                parents.append(i)
+                depths.append(depths[i] + 1)
+        start = end
+    parents = np.array(parents)
+    depths = np.array(depths)
+
+    local = np.array([placement_matrix(obj.BasePlacement) for obj in objects])
+    current = np.array([placement_matrix(obj.Placement) for obj in objects])
+    # beam paths keep the rotation of their parent (see BeamPath.compute_path)
+    keep_rotation = np.array(
+        [getattr(obj.Proxy, "keeps_parent_rotation", False) for obj in objects]
+    )
+
+    transforms = np.empty_like(local)
+    if root.Parent is not None:
+        parent_transform = placement_matrix(root.Parent.Placement)
+    else:
+        parent_transform = np.eye(4)
+    transforms[0] = parent_transform @ local[0]
+    if keep_rotation[0]:
+        transforms[0, :3, :3] = parent_transform[:3, :3]
+
+    for depth in range(1, depths.max() + 1):
+        level = np.flatnonzero(depths == depth)
+        parent_transforms = transforms[parents[level]]
+        transforms[level] = parent_transforms @ local[level]
+        kept = level[keep_rotation[level]]
+        transforms[kept, :3, :3] = transforms[parents[kept], :3, :3]
+
+    changed = np.abs(transforms - current).max(axis=(1, 2)) > tolerance
+    for i in np.flatnonzero(changed):
+        objects[i].Placement = matrix_placement(transforms[i])
+    for obj in objects:
+        obj.Proxy.placement_dirty = False
+        obj.purgeTouched()  # prevent triggering recompute
+    return int(np.count_nonzero(changed))
+
 
 class Layout:
     """
@@ -23,6 +290,7 @@ class Layout:
     object_type = "Part"  # FreeCAD object type (must be Part or Mesh)
     object_group = "layout"  # group name for management
     object_icon = ""  # icon for the object in the tree view
+    keeps_parent_rotation = False  # whether the global rotation ignores the base rotation
 
     def __init__(
         self,
@@ -30,6 +298,11 @@ class Layout:
         recompute_priority: int = 0,
     ):
 
+        # everything is computed on the first recompute
+        self.placement_dirty = True
+        self.shape_dirty = True
+        self.subtree_dirty = True
+
         # create or get document
         if App.ActiveDocument != None:
             document = App.ActiveDocument
@@ -63,8 +336,7 @@ class Layout:
         Returns:
             App.DocumentObject: The FreeCAD document object
         """
-        document = App.getDocument(self.document_id)
-        return document.getObject(self.object_id)
+        return get_document_object(self.document_id, self.object_id)
 
     def make_property(
         self, name: str, type: str, visible: bool = False, editable: bool = False
@@ -141,19 +413,117 @@ class Layout:
         obj = self.get_object()
 
         # calculate final placement
-        obj.Placement = obj.BasePlacement
+        placement = obj.BasePlacement
         if obj.Parent != None:
-            obj.Placement = obj.Parent.Placement * obj.Placement
+            placement = obj.Parent.Placement * placement
+        moved = np.abs(placement_matrix(placement) - placement_matrix(obj.Placement))
+        obj.Placement = placement
+        self.placement_dirty = False
+
+        # children are placed relative to this object
+        if moved.max() > 1e-9:
+            for child in obj.Children:
+                child.Proxy.placement_dirty = True
 
         obj.purgeTouched()  # prevent triggering recompute
 
+    def onChanged(self, obj: App.DocumentObject, prop: str):
+        """Called by FreeCAD when a property changes, tracks revisions and dirty flags"""
+
+        global _revision
+
+        if prop in ("Placement", "BasePlacement"):
+            self.placement_revision = getattr(self, "placement_revision", 0) + 1
+        if prop not in REVISION_PROPERTIES:
+            return
+        _revision += 1
+
+        # saved flags are restored along with the object
+        if "Restore" in obj.State:
+            return
+        if prop in ("BasePlacement", "Parent"):
+            self.placement_dirty = True
+            self.shape_dirty = True
+            if _suspended == 0:
+                self.mark_peers(obj)
+        elif _suspended == 0:
+            self.mark_changed(obj)
+
+    def mark_changed(self, obj: App.DocumentObject):
+        """
+        Flag the ancestors of an object as having changed descendants,
+        and notify beam paths bound to any of them
+
+        Args:
+            obj (App.DocumentObject): The changed object
+        """
+
+        parent = getattr(obj, "Parent", None)
+        while parent is not None:
+            parent.Proxy.subtree_dirty = True
+            for child in parent.Children:
+                if getattr(child, "BoundParent", None) == parent:
+                    child.Proxy.bound_changed()
+            parent = parent.Parent
+
+    def mark_peers(self, obj: App.DocumentObject, notify: bool = True):
+        """
+        Flag the shapes drilled by an object after it moved or changed shape,
+        which are its own, its siblings' and its ancestors' (see Component.compute_shape)
+
+        Args:
+            obj (App.DocumentObject): The moved object
+            notify (bool): Whether to notify beam paths bound to its ancestors
+        """
+
+        self.shape_dirty = True
+        parent = getattr(obj, "Parent", None)
+        if parent is not None:
+            for sibling in parent.Children:
+                sibling.Proxy.shape_dirty = True
+        self.mark_drilled(obj)
+        if notify:
+            self.mark_changed(obj)
+
+    def mark_drilled(self, obj: App.DocumentObject):
+        """
+        Flag the shapes of the ancestors of an object, which are drilled by all their descendants
+
+        Args:
+            obj (App.DocumentObject): The changed object
+        """
+
+        parent = getattr(obj, "Parent", None)
+        while parent is not None:
+            parent.Proxy.shape_dirty = True
+            parent.Proxy.subtree_dirty = True
+            parent = parent.Parent
+
+    def bound_changed(self):
+        """Called when an object under the bound parent of this object changes"""
+
+        pass
+
+    def is_dirty(self) -> bool:
+        """
+        Check if this object or any of its descendants needs to be recomputed
+
+        Returns:
+            dirty (bool): Whether a recompute would change anything
+        """
+
+        return getattr(self, "placement_dirty", True) or getattr(
+            self, "subtree_dirty", True
+        )
+
     def recompute(self):
-        """Recursively recompute all children of this object"""
+        """Recompute this object and all children whose inputs changed"""
 
         obj = self.get_object()
-        self.compute_placement()
+        if getattr(self, "placement_dirty", True):
+            compute_placements(obj)
 
-        compute_list = obj.Children
+        compute_list = [child for child in obj.Children if child.Proxy.is_dirty()]
         # sort by recompute priority
         compute_list.sort(
             key=lambda child_obj: child_obj.Proxy.recompute_priority, reverse=True
@@ -161,6 +531,10 @@ class Layout:
         for child_obj in compute_list:
             child_obj.Proxy.recompute()
 
+        # children flag their ancestors while recomputing, only children that are
+        # still dirty (such as beam paths affected by a later sibling) keep this set
+        self.subtree_dirty = any(child.Proxy.is_dirty() for child in obj.Children)
+
     # link built-in FreeCAD execute to internal recompute
     # def execute(self, obj):
     #     """Execute method called by FreeCAD to recompute the object"""
@@ -243,8 +617,6 @@ class Component(Layout):
                     rotation=Subcomponent.rotation,
                 )
 
-        self.computed_shape = False
-
     def compute_shape(self):
         """Calculate and set the shape of the object"""
 
@@ -274,7 +646,8 @@ class Component(Layout):
                 # gather child objects recursively
                 collect_children(obj, drill_objs)
 
-                # apply drilling
+                # gather drill shapes in the frame of this object
+                drill_shapes = []
                 for drill_obj in drill_objs:
                     if hasattr(drill_obj.Proxy, "drill"):
                         if (
@@ -289,29 +662,12 @@ class Component(Layout):
                         drill_shape.Placement = (
                             obj.Placement.inverse() * drill_obj.Placement
                         )
+                        drill_shapes.append(drill_shape)
 
-                        # make sure drill intersects shape
-                        common = shape.common(drill_shape)
-                        if common.Volume < 1e-6 or drill_shape.Volume < 1e-6:
-                            continue
-
-                        rotation = drill_shape.Placement.Rotation.inverted()
-                        z_direction = rotation.multVec(App.Vector(0, 0, 1))
-
-                        # find and extrude +z-facing faces from drill_obj
-                        for face in drill_shape.Faces:
-                            normal = face.normalAt(0, 0)
-                            intersection = face.common(shape)
-                            if (
-                                isinstance(face.Surface, Part.Plane)
-                                and normal.getAngle(z_direction) < 1e-6
-                                and intersection.Area > 1e-6
-                            ):
-                                max_dimension = shape.BoundBox.DiagonalLength
-                                extrusion = face.extrude(max_dimension * z_direction)
-                                drill_shape = drill_shape.fuse(extrusion)
-
-                        shape = shape.cut(drill_shape)
+                # cut with all tools in a single boolean operation
+                tools = get_drill_tools(shape, drill_shapes)
+                if len(tools) > 0:
+                    shape = shape.cut(tools)
 
             # apply placement and set final shape
             shape = shape.removeSplitter()
@@ -325,13 +681,24 @@ class Component(Layout):
 
         obj.purgeTouched()  # prevent triggering recompute
 
+    def is_dirty(self) -> bool:
+        """
+        Check if this object, its shape or any of its descendants needs to be recomputed
+
+        Returns:
+            dirty (bool): Whether a recompute would change anything
+        """
+
+        return super().is_dirty() or getattr(self, "shape_dirty", True)
+
     def recompute(self):
-        """Recursively recompute all children of this object"""
+        """Recompute this object and all children whose inputs changed"""
 
         super().recompute()
-        if not self.computed_shape:
+        # children may have moved drill peers, so the shape is checked last
+        if getattr(self, "shape_dirty", True):
+            self.shape_dirty = False
             self.compute_shape()
-            self.computed_shape = True
 
 
 # ViewProvider handles how the object is handled in the FreeCAD GUI
@@ -345,8 +712,7 @@ class ViewProvider:
         obj.DisplayMode = "Shaded"
 
     def get_object(self) -> App.DocumentObject:
-        document = App.getDocument(self.document_id)
-        return document.getObject(self.object_id)
+        return get_document_object(self.document_id, self.object_id)
 
     def getIcon(self):
         return self.icon
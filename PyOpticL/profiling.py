@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+# profile collecting measurements, None while profiling is off
+_profile = None
+
+
+class Profile:
+    """
+    Call counts, inclusive wall time and counters of instrumented functions,
+    grouped by scope (the beam path being recomputed)
+    """
+
+    def __init__(self):
+        self.timings = {}  # scope -> name -> [calls, seconds]
+        self.counters = {}  # scope -> name -> count
+        self.scope = None
+
+    def add_time(self, name: str, seconds: float):
+        """
+        Record one call of an instrumented function in the current scope
+
+        Args:
+            name (str): Name of the function
+            seconds (float): Wall time of the call
+        """
+
+        entry = self.timings.setdefault(self.scope, {}).setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def add_count(self, name: str, amount: int):
+        """
+        Increase a counter in the current scope
+
+        Args:
+            name (str): Name of the counter
+            amount (int): Amount to add
+        """
+
+        counters = self.counters.setdefault(self.scope, {})
+        counters[name] = counters.get(name, 0) + amount
+
+    def to_dict(self) -> dict:
+        """
+        Convert the profile to plain dictionaries
+
+        Returns:
+            profile (dict): Timings and counters by scope (unscoped work is listed under '')
+        """
+
+        scopes = {}
+        for scope in list(self.timings) + list(self.counters):
+            if (scope or "") in scopes:
+                continue
+            timings = self.timings.get(scope, {})
+            scopes[scope or ""] = dict(
+                timings={
+                    name: dict(calls=calls, seconds=seconds)
+                    for name, (calls, seconds) in sorted(timings.items())
+                },
+                counters=dict(sorted(self.counters.get(scope, {}).items())),
+            )
+        return dict(scopes=scopes)
+
+    def save(self, filename: str):
+        """
+        Write the profile to a JSON file
+
+        Args:
+            filename (str): Output file name
+        """
+
+        with open(filename, "w") as file:
+            json.dump(self.to_dict(), file, indent=2, sort_keys=True)
+
+    def summary(self) -> str:
+        """
+        Format the profile as a table, slowest functions first within each scope
+
+        Returns:
+            summary (str): Table of calls, total and mean time and counters
+        """
+
+        lines = [
+            f"{'scope':<24} {'function':<20} {'calls':>9} {'total ms':>11} {'mean us':>10}"
+        ]
+        for scope, data in self.to_dict()["scopes"].items():
+            timings = sorted(
+                data["timings"].items(),
+                key=lambda item: item[1]["seconds"],
+                reverse=True,
+            )
+            for name, timing in timings:
+                calls, seconds = timing["calls"], timing["seconds"]
+                lines.append(
+                    f"{scope[:24]:<24} {name[:20]:<20} {calls:>9} "
+                    f"{1e3 * seconds:>11.2f} {1e6 * seconds / calls:>10.1f}"
+                )
+            for name, count in data["counters"].items():
+                lines.append(f"{scope[:24]:<24} {name[:20]:<20} {count:>9}")
+        return "\n".join(lines)
+
+
+def start_profiling() -> Profile:
+    """
+    Start collecting a profile of the instrumented trace and shape functions
+
+    Returns:
+        profile (Profile): The new active profile
+    """
+
+    global _profile
+    _profile = Profile()
+    return _profile
+
+
+def stop_profiling() -> Profile:
+    """
+    Stop collecting the active profile
+
+    Returns:
+        profile (Profile): The profile that was active (None if profiling was off)
+    """
+
+    global _profile
+    profile, _profile = _profile, None
+    return profile
+
+
+def get_profile() -> Profile:
+    """
+    Get the active profile
+
+    Returns:
+        profile (Profile): The active profile (None if profiling is off)
+    """
+
+    return _profile
+
+
+def profiled(name: str):
+    """
+    Decorator that records call counts and wall time of a function while profiling is on
+    While profiling is off the only overhead is a single global lookup
+
+    Args:
+        name (str): Name the function is reported under
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _profile
+            if profile is None:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add_time(name, perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, amount: int = 1):
+    """
+    Increase a counter of the active profile (does nothing while profiling is off)
+
+    Args:
+        name (str): Name of the counter
+        amount (int): Amount to add
+    """
+
+    if _profile is not None:
+        _profile.add_count(name, amount)
+
+
+@contextmanager
+def profile_scope(scope: str):
+    """
+    Attribute measurements made inside the context to a scope
+
+    Args:
+        scope (str): Name of the scope (usually a beam path label)
+    """
+
+    profile = _profile
+    if profile is None:
+        yield
+        return
+    previous, profile.scope = profile.scope, scope
+    try:
+        yield
+    finally:
+        profile.scope = previous
@@ -3,6 +3,14 @@ minimum_thread_engagement = 8
 default_extra_drill_depth = 10
 hidden_object_groups = ["hardware"]
 enable_beam_transparency = False
+beam_shape_tolerance = 1e-3
+beam_shape_cache_size = 512
+beam_shape_cache_directory = None
+trace_queue_policy = "depth"
+max_trace_depth = None
+max_trace_segments = None
+min_trace_power = None
+trace_checkpoint_directory = None
 
 
 def set_measurement_system(system: str):
@@ -121,3 +129,193 @@ def get_enable_beam_transparency():
     """
 
     return enable_beam_transparency
+
+
+def set_beam_shape_tolerance(tolerance: float):
+    """
+    Set the global minimum change in beam slope between points of the beam shape profile. Smaller values give smoother beams at the cost of more faces.
+
+    Args:
+        tolerance (float): The minimum change in beam slope.
+    """
+
+    global beam_shape_tolerance
+    if tolerance > 0:
+        beam_shape_tolerance = tolerance
+    else:
+        raise ValueError("Beam shape tolerance must be positive.")
+
+
+def get_beam_shape_tolerance():
+    """
+    Get the current global minimum change in beam slope between points of the beam shape profile.
+
+    Returns:
+        float: The current beam shape tolerance.
+    """
+
+    return beam_shape_tolerance
+
+
+def set_beam_shape_cache_size(size: int):
+    """
+    Set the global maximum number of beam shapes kept in memory. Segments with the same beam parameters and length reuse a cached shape.
+
+    Args:
+        size (int): The maximum number of cached beam shapes.
+    """
+
+    global beam_shape_cache_size
+    beam_shape_cache_size = size
+
+
+def get_beam_shape_cache_size():
+    """
+    Get the current global maximum number of beam shapes kept in memory.
+
+    Returns:
+        int: The current maximum number of cached beam shapes.
+    """
+
+    return beam_shape_cache_size
+
+
+def set_beam_shape_cache_directory(directory: str | None):
+    """
+    Set the global directory beam shapes are persisted to as BREP files, so that unchanged beams are not rebuilt between sessions.
+
+    Args:
+        directory (str | None): The cache directory, or None to only cache shapes in memory.
+    """
+
+    global beam_shape_cache_directory
+    beam_shape_cache_directory = directory
+
+
+def get_beam_shape_cache_directory():
+    """
+    Get the current global directory beam shapes are persisted to.
+
+    Returns:
+        str | None: The current cache directory, or None if shapes are only cached in memory.
+    """
+
+    return beam_shape_cache_directory
+
+
+def set_trace_queue_policy(policy: str):
+    """
+    Set the global order in which beam segments are traced. 'depth' follows each beam to the end before tracing the next, 'breadth' traces all beams one interaction at a time, and 'power' traces the highest power beams first.
+
+    Args:
+        policy (str): The queue policy to use, either 'depth', 'breadth' or 'power'
+    """
+
+    global trace_queue_policy
+    if policy.lower() in ["depth", "breadth", "power"]:
+        trace_queue_policy = policy.lower()
+    else:
+        raise ValueError("Invalid queue policy. Use 'depth', 'breadth' or 'power'.")
+
+
+def get_trace_queue_policy():
+    """
+    Get the current global order in which beam segments are traced.
+
+    Returns:
+        str: The current queue policy, either 'depth', 'breadth' or 'power'
+    """
+
+    return trace_queue_policy
+
+
+def set_max_trace_depth(depth: int | None):
+    """
+    Set the global maximum number of interactions a beam is traced through. Beams reaching this depth are not split any further.
+
+    Args:
+        depth (int | None): The maximum depth, or None for no limit.
+    """
+
+    global max_trace_depth
+    max_trace_depth = depth
+
+
+def get_max_trace_depth():
+    """
+    Get the current global maximum number of interactions a beam is traced through.
+
+    Returns:
+        int | None: The current maximum depth, or None for no limit.
+    """
+
+    return max_trace_depth
+
+
+def set_max_trace_segments(count: int | None):
+    """
+    Set the global maximum number of beam segments in a single beam path. Interactions that would exceed this count produce no output beams.
+
+    Args:
+        count (int | None): The maximum number of segments, or None for no limit.
+    """
+
+    global max_trace_segments
+    max_trace_segments = count
+
+
+def get_max_trace_segments():
+    """
+    Get the current global maximum number of beam segments in a single beam path.
+
+    Returns:
+        int | None: The current maximum number of segments, or None for no limit.
+    """
+
+    return max_trace_segments
+
+
+def set_min_trace_power(power: float | None):
+    """
+    Set the global minimum relative power of traced beams. Output beams with less than this fraction of the input beam power are not traced.
+
+    Args:
+        power (float | None): The minimum relative power, or None for no limit.
+    """
+
+    global min_trace_power
+    min_trace_power = power
+
+
+def get_min_trace_power():
+    """
+    Get the current global minimum relative power of traced beams.
+
+    Returns:
+        float | None: The current minimum relative power, or None for no limit.
+    """
+
+    return min_trace_power
+
+
+def set_trace_checkpoint_directory(directory: str | None):
+    """
+    Set the global directory traced beam paths are checkpointed to, so that beam paths whose inputs did not change are restored instead of re-traced.
+
+    Args:
+        directory (str | None): The checkpoint directory, or None to always trace.
+    """
+
+    global trace_checkpoint_directory
+    trace_checkpoint_directory = directory
+
+
+def get_trace_checkpoint_directory():
+    """
+    Get the current global directory traced beam paths are checkpointed to.
+
+    Returns:
+        str | None: The current checkpoint directory, or None if beam paths are always traced.
+    """
+
+    return trace_checkpoint_directory
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+import Part
+
+
+def quantize(value: float, step: float = 1e-6) -> int:
+    """
+    Quantize a value so that nearly equal values produce the same cache key
+    The default step is well above the round-off of placement math and below the model tolerance
+
+    Args:
+        value (float): Value to quantize
+        step (float): Quantization step (mm for lengths)
+
+    Returns:
+        quantized (int): Value in units of the step
+    """
+
+    return int(round(value / step))
+
+
+class ShapeCache:
+    """
+    Least recently used cache of shapes keyed by tuples of numbers
+    Shapes can optionally be persisted to a directory as BREP files
+
+    Args:
+        max_size (int): Maximum number of shapes kept in memory
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self.shapes = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def get(
+        self,
+        key: tuple,
+        build: Callable[[], Part.Shape],
+        directory: str | Path = None,
+    ) -> Part.Shape:
+        """
+        Get a copy of the shape for a key, building it if it is not cached
+
+        Args:
+            key (tuple): Key describing the shape geometry
+            build (Callable): Function that builds the shape
+            directory (str | Path): Directory to persist shapes in (None to keep shapes in memory only)
+
+        Returns:
+            shape (Part.Shape): Copy of the cached shape
+        """
+
+        if key in self.shapes:
+            self.hits += 1
+            self.shapes.move_to_end(key)
+            return self.shapes[key].copy()
+
+        path = None
+        if directory is not None:
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()
+            path = Path(directory) / f"{digest}.brep"
+
+        if path is not None and path.exists():
+            self.disk_hits += 1
+            shape = Part.Shape()
+            shape.read(str(path))
+        else:
+            self.misses += 1
+            shape = build()
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shape.exportBrep(str(path))
+
+        self.shapes[key] = shape
+        while len(self.shapes) > self.max_size:
+            self.shapes.popitem(last=False)
+        return shape.copy()
+
+    def clear(self):
+        """Remove all shapes from memory"""
+
+        self.shapes.clear()
@@ -0,0 +1,485 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def ray_box_distances(
+    origin: np.ndarray,
+    direction: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Slab test of a single ray against many axis-aligned boxes
+
+    Args:
+        origin (np.ndarray): (x, y, z) origin of the ray
+        direction (np.ndarray): (x, y, z) direction of the ray
+        lower (np.ndarray): (N, 3) lower box corners
+        upper (np.ndarray): (N, 3) upper box corners
+
+    Returns:
+        t_enter (np.ndarray): (N,) ray parameter where each box is entered
+        t_exit (np.ndarray): (N,) ray parameter where each box is exited
+    """
+
+    origin = np.asarray(origin, dtype=float)
+    direction = np.asarray(direction, dtype=float)
+    parallel = direction == 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse = 1.0 / direction
+        t1 = (lower - origin) * inverse
+        t2 = (upper - origin) * inverse
+
+    # axes parallel to the ray only pass if the origin is inside the slab
+    outside = parallel & ((origin < lower) | (origin > upper))
+    t1 = np.where(parallel, -np.inf, t1)
+    t2 = np.where(parallel, np.inf, t2)
+
+    t_enter = np.max(np.minimum(t1, t2), axis=-1)
+    t_exit = np.min(np.maximum(t1, t2), axis=-1)
+    t_enter = np.where(np.any(outside, axis=-1), np.inf, t_enter)
+    return t_enter, t_exit
+
+
+class BoundingVolumeHierarchy:
+    """
+    Static bounding volume hierarchy over axis-aligned boxes
+    Boxes can be moved after construction with update, which keeps the tree topology
+    and only refits the leaves containing the moved boxes and their ancestors
+
+    Args:
+        lower (np.ndarray): (N, 3) lower box corners
+        upper (np.ndarray): (N, 3) upper box corners
+        leaf_size (int): Maximum number of boxes stored in a leaf node
+    """
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray, leaf_size: int = 4):
+        self.lower = np.array(lower, dtype=float).reshape(-1, 3)
+        self.upper = np.array(upper, dtype=float).reshape(-1, 3)
+        self.leaf_size = leaf_size
+
+        # flattened node storage, children always come after their parents
+        self.order = np.arange(len(self.lower))
+        node_start, node_count, node_left, node_right = [], [], [], []
+        node_parent = []
+
+        # split on the longest axis of the box centers (infinite extents are clipped)
+        centers = (
+            np.clip(self.lower, -1e12, 1e12) + np.clip(self.upper, -1e12, 1e12)
+        ) / 2
+
+        stack = [(0, len(self.order), -1, False)]
+        while stack:
+            start, stop, parent, is_right = stack.pop()
+            node = len(node_start)
+            node_start.append(start)
+            node_count.append(stop - start)
+            node_left.append(-1)
+            node_right.append(-1)
+            node_parent.append(parent)
+            if parent >= 0:
+                if is_right:
+                    node_right[parent] = node
+                else:
+                    node_left[parent] = node
+
+            if stop - start <= leaf_size:
+                continue
+
+            indices = self.order[start:stop]
+            spread = np.ptp(centers[indices], axis=0)
+            axis = int(np.argmax(spread))
+            if spread[axis] == 0:
+                continue  # all centers coincide, keep as a leaf
+            ranked = indices[np.argsort(centers[indices, axis], kind="stable")]
+            self.order[start:stop] = ranked
+            middle = (start + stop) // 2
+            stack.append((middle, stop, node, True))
+            stack.append((start, middle, node, False))
+
+        self.node_start = np.array(node_start, dtype=int)
+        self.node_count = np.array(node_count, dtype=int)
+        self.node_left = np.array(node_left, dtype=int)
+        self.node_right = np.array(node_right, dtype=int)
+        self.node_parent = np.array(node_parent, dtype=int)
+        self.node_lower = np.zeros((len(node_start), 3))
+        self.node_upper = np.zeros((len(node_start), 3))
+
+        # leaf node holding each box
+        self.box_leaf = np.zeros(len(self.lower), dtype=int)
+        for node in np.flatnonzero(self.node_left < 0):
+            start = self.node_start[node]
+            self.box_leaf[self.order[start : start + self.node_count[node]]] = node
+        self.refit()
+
+    def __len__(self) -> int:
+        return len(self.lower)
+
+    def refit(self, nodes: list[int] = None):
+        """
+        Recalculate node bounds from the current box corners
+
+        Args:
+            nodes (list[int]): Nodes to recalculate, children before parents (defaults to all nodes)
+        """
+
+        # children are stored after their parents, so walk backwards
+        if nodes is None:
+            nodes = range(len(self.node_start) - 1, -1, -1)
+        for node in nodes:
+            left, right = self.node_left[node], self.node_right[node]
+            if left < 0:
+                start = self.node_start[node]
+                indices = self.order[start : start + self.node_count[node]]
+                if len(indices) == 0:
+                    self.node_lower[node] = np.inf
+                    self.node_upper[node] = -np.inf
+                    continue
+                self.node_lower[node] = self.lower[indices].min(axis=0)
+                self.node_upper[node] = self.upper[indices].max(axis=0)
+            else:
+                self.node_lower[node] = np.minimum(
+                    self.node_lower[left], self.node_lower[right]
+                )
+                self.node_upper[node] = np.maximum(
+                    self.node_upper[left], self.node_upper[right]
+                )
+
+    def update(self, indices: list[int], lower: np.ndarray, upper: np.ndarray):
+        """
+        Move a subset of boxes and refit the hierarchy
+
+        Args:
+            indices (list[int]): Indices of the boxes to move
+            lower (np.ndarray): (len(indices), 3) new lower corners
+            upper (np.ndarray): (len(indices), 3) new upper corners
+        """
+
+        if len(indices) == 0:
+            return
+        self.lower[indices] = lower
+        self.upper[indices] = upper
+
+        # only the leaves holding the moved boxes and their ancestors change
+        nodes = set()
+        for node in np.unique(self.box_leaf[indices]).tolist():
+            while node >= 0 and node not in nodes:
+                nodes.add(node)
+                node = self.node_parent[node]
+        self.refit(sorted(nodes, reverse=True))
+
+    def _traverse(self, test) -> np.ndarray:
+        """Collect sorted box indices from all leaves whose nodes pass the test"""
+
+        if len(self.lower) == 0:
+            return np.zeros(0, dtype=int)
+
+        # visit one tree level at a time so each test is a single numpy call
+        hits = []
+        frontier = np.array([0])
+        while len(frontier):
+            frontier = frontier[test(self.node_lower[frontier], self.node_upper[frontier])]
+            leaves = frontier[self.node_left[frontier] < 0]
+            for node in leaves:
+                start = self.node_start[node]
+                hits.append(self.order[start : start + self.node_count[node]])
+            inner = frontier[self.node_left[frontier] >= 0]
+            frontier = np.concatenate([self.node_left[inner], self.node_right[inner]])
+
+        if len(hits) == 0:
+            return np.zeros(0, dtype=int)
+        candidates = np.concatenate(hits)
+        # final test on the individual boxes
+        candidates = candidates[test(self.lower[candidates], self.upper[candidates])]
+        return np.sort(candidates)
+
+    def query_ray(
+        self,
+        origin: np.ndarray,
+        direction: np.ndarray,
+        max_distance: float = np.inf,
+    ) -> np.ndarray:
+        """
+        Find all boxes crossed by a ray
+
+        Args:
+            origin (np.ndarray): (x, y, z) origin of the ray
+            direction (np.ndarray): (x, y, z) direction of the ray
+            max_distance (float): Maximum ray parameter to consider
+
+        Returns:
+            indices (np.ndarray): Sorted indices of boxes crossed by the ray
+        """
+
+        def test(lower, upper):
+            t_enter, t_exit = ray_box_distances(origin, direction, lower, upper)
+            return (t_enter <= t_exit) & (t_exit >= 0) & (t_enter <= max_distance)
+
+        return self._traverse(test)
+
+    def query_box(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Find all boxes overlapping an axis-aligned box
+
+        Args:
+            lower (np.ndarray): (x, y, z) lower corner of the query box
+            upper (np.ndarray): (x, y, z) upper corner of the query box
+
+        Returns:
+            indices (np.ndarray): Sorted indices of overlapping boxes
+        """
+
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+
+        def test(node_lower, node_upper):
+            return np.all((node_lower <= upper) & (node_upper >= lower), axis=-1)
+
+        return self._traverse(test)
+
+
+def segment_boxes(
+    origins: np.ndarray,
+    directions: np.ndarray,
+    lengths: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the axis-aligned boxes swept by line segments
+
+    Args:
+        origins (np.ndarray): (N, 3) segment origins
+        directions (np.ndarray): (N, 3) segment directions
+        lengths (np.ndarray): (N,) segment lengths (inf for open ended rays)
+
+    Returns:
+        lower (np.ndarray): (N, 3) lower box corners
+        upper (np.ndarray): (N, 3) upper box corners
+    """
+
+    origins = np.array(origins, dtype=float).reshape(-1, 3)
+    directions = np.array(directions, dtype=float).reshape(-1, 3)
+    lengths = np.asarray(lengths, dtype=float).reshape(-1, 1)
+
+    # axes the segment does not move along keep the origin coordinate
+    with np.errstate(invalid="ignore"):
+        ends = origins + directions * lengths
+    ends = np.where(directions == 0, origins, ends)
+    return np.minimum(origins, ends), np.maximum(origins, ends)
+
+
+class IncrementalBoxIndex:
+    """
+    Box index that supports inserting boxes after construction
+    New boxes are tested directly until they outnumber the boxes in the hierarchy,
+    at which point the hierarchy is rebuilt over all boxes
+
+    Args:
+        leaf_size (int): Maximum number of boxes stored in a leaf node
+    """
+
+    def __init__(self, leaf_size: int = 4):
+        self.leaf_size = leaf_size
+        self.hierarchy = None
+        self.indexed = 0  # number of boxes stored in the hierarchy
+        self.pending_lower = []
+        self.pending_upper = []
+
+    def __len__(self) -> int:
+        return self.indexed + len(self.pending_lower)
+
+    def insert(self, lower: np.ndarray, upper: np.ndarray) -> int:
+        """
+        Add a box to the index
+
+        Args:
+            lower (np.ndarray): (x, y, z) lower box corner
+            upper (np.ndarray): (x, y, z) upper box corner
+
+        Returns:
+            index (int): Index of the inserted box (boxes are numbered in insertion order)
+        """
+
+        self.pending_lower.append(np.asarray(lower, dtype=float))
+        self.pending_upper.append(np.asarray(upper, dtype=float))
+        if len(self.pending_lower) > max(self.indexed, 16):
+            self.rebuild()
+        return len(self) - 1
+
+    def update(self, indices: list[int], lower: np.ndarray, upper: np.ndarray):
+        """
+        Move a subset of boxes, without rebuilding the hierarchy
+
+        Args:
+            indices (list[int]): Indices of the boxes to move
+            lower (np.ndarray): (len(indices), 3) new lower corners
+            upper (np.ndarray): (len(indices), 3) new upper corners
+        """
+
+        indices = np.asarray(indices, dtype=int)
+        lower = np.array(lower, dtype=float).reshape(-1, 3)
+        upper = np.array(upper, dtype=float).reshape(-1, 3)
+        indexed = indices < self.indexed
+        if np.any(indexed):
+            self.hierarchy.update(indices[indexed], lower[indexed], upper[indexed])
+        for i in np.flatnonzero(~indexed):
+            self.pending_lower[indices[i] - self.indexed] = lower[i]
+            self.pending_upper[indices[i] - self.indexed] = upper[i]
+
+    def rebuild(self):
+        """Build a new hierarchy containing all boxes"""
+
+        if len(self.pending_lower) == 0:
+            return
+        lower = np.array(self.pending_lower)
+        upper = np.array(self.pending_upper)
+        if self.hierarchy is not None:
+            lower = np.concatenate([self.hierarchy.lower, lower])
+            upper = np.concatenate([self.hierarchy.upper, upper])
+        self.hierarchy = BoundingVolumeHierarchy(lower, upper, self.leaf_size)
+        self.indexed = len(lower)
+        self.pending_lower = []
+        self.pending_upper = []
+
+    def query_box(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Find all boxes overlapping an axis-aligned box
+
+        Args:
+            lower (np.ndarray): (x, y, z) lower corner of the query box
+            upper (np.ndarray): (x, y, z) upper corner of the query box
+
+        Returns:
+            indices (np.ndarray): Sorted indices of overlapping boxes
+        """
+
+        hits = []
+        if self.hierarchy is not None:
+            hits.append(self.hierarchy.query_box(lower, upper))
+        if len(self.pending_lower) > 0:
+            pending = np.all(
+                (np.array(self.pending_lower) <= upper)
+                & (np.array(self.pending_upper) >= lower),
+                axis=-1,
+            )
+            hits.append(np.flatnonzero(pending) + self.indexed)
+        if len(hits) == 0:
+            return np.zeros(0, dtype=int)
+        return np.concatenate(hits)
+
+
+class SegmentIndex:
+    """
+    Box index over the rays of traced beam segments, grouped by owner (such as a beam path)
+    The rays of one owner can be replaced without touching the rest of the index,
+    their boxes are moved in place, new boxes are inserted and unused boxes are emptied
+    so that they no longer match any box query
+
+    Args:
+        leaf_size (int): Maximum number of boxes stored in a leaf node
+    """
+
+    def __init__(self, leaf_size: int = 4):
+        self.boxes = IncrementalBoxIndex(leaf_size)
+        self.origins = np.zeros((0, 3))
+        self.directions = np.zeros((0, 3))
+        self.max_distances = np.zeros(0)
+        self.owners = []  # owner of each box, None for unused boxes
+        self.segments = []  # name of the segment each box belongs to
+        self.slots = {}  # owner -> boxes in use
+        self.free = []  # unused boxes
+
+    def __contains__(self, owner: str) -> bool:
+        return owner in self.slots
+
+    def set_rays(
+        self,
+        owner: str,
+        origins: np.ndarray,
+        directions: np.ndarray,
+        max_distances: np.ndarray,
+        segments: list[str],
+    ):
+        """
+        Replace the rays of an owner
+
+        Args:
+            owner (str): Owner of the rays
+            origins (np.ndarray): (N, 3) ray origins
+            directions (np.ndarray): (N, 3) ray directions
+            max_distances (np.ndarray): (N,) ray lengths (inf for open ends)
+            segments (list[str]): Name of the segment each ray belongs to
+        """
+
+        origins = np.array(origins, dtype=float).reshape(-1, 3)
+        directions = np.array(directions, dtype=float).reshape(-1, 3)
+        max_distances = np.array(max_distances, dtype=float).reshape(-1)
+        count = len(origins)
+
+        # reuse the boxes of the owner first, then unused boxes, then insert new ones
+        old = self.slots.pop(owner, [])
+        reused = old[:count]
+        self.remove_slots(old[count:])
+        while len(reused) < count and len(self.free) > 0:
+            reused.append(self.free.pop())
+
+        added = count - len(reused)
+        if added > 0:
+            self.origins = np.concatenate([self.origins, np.zeros((added, 3))])
+            self.directions = np.concatenate([self.directions, np.zeros((added, 3))])
+            self.max_distances = np.concatenate([self.max_distances, np.zeros(added)])
+            self.owners.extend([None] * added)
+            self.segments.extend([None] * added)
+
+        lower, upper = segment_boxes(origins, directions, max_distances)
+        if len(reused) > 0:
+            self.boxes.update(reused, lower[: len(reused)], upper[: len(reused)])
+        slots = list(reused)
+        for i in range(len(reused), count):
+            slots.append(self.boxes.insert(lower[i], upper[i]))
+
+        self.origins[slots] = origins
+        self.directions[slots] = directions
+        self.max_distances[slots] = max_distances
+        for slot, segment in zip(slots, segments):
+            self.owners[slot] = owner
+            self.segments[slot] = segment
+        self.slots[owner] = slots
+
+    def remove(self, owner: str):
+        """
+        Remove all rays of an owner
+
+        Args:
+            owner (str): Owner of the rays
+        """
+
+        self.remove_slots(self.slots.pop(owner, []))
+
+    def remove_slots(self, slots: list[int]):
+        """Empty a set of boxes and mark them unused"""
+
+        if len(slots) == 0:
+            return
+        empty = np.full((len(slots), 3), np.inf)
+        self.boxes.update(slots, empty, -empty)
+        for slot in slots:
+            self.owners[slot] = None
+            self.segments[slot] = None
+        self.free.extend(slots)
+
+    def query_box(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Find all rays whose swept boxes overlap an axis-aligned box
+
+        Args:
+            lower (np.ndarray): (x, y, z) lower corner of the query box
+            upper (np.ndarray): (x, y, z) upper corner of the query box
+
+        Returns:
+            indices (np.ndarray): Indices of the overlapping rays, use them with
+                                  origins, directions, max_distances, owners and segments
+        """
+
+        return self.boxes.query_box(lower, upper)
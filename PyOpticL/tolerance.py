@@ -0,0 +1,456 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from multiprocessing import get_all_start_methods, get_context
+
+import numpy as np
+
+from PyOpticL.caustic import beam_radius
+from PyOpticL.intersect import intersect
+from PyOpticL.trace import TraceScene, Tracer
+
+
+class Tolerance:
+    """
+    Placement error distribution of an object, expressed in the object's own frame
+
+    Args:
+        position (float | tuple): Position error along (x, y, z) in mm
+        angle (float | tuple): Rotation error about (x, y, z) in degrees
+        distribution (str): 'normal' (values are standard deviations)
+                            or 'uniform' (values are half widths)
+    """
+
+    def __init__(
+        self,
+        position: float | tuple = 0,
+        angle: float | tuple = 0,
+        distribution: str = "normal",
+    ):
+        if distribution not in ("normal", "uniform"):
+            raise ValueError("Distribution must be 'normal' or 'uniform'")
+        self.position = np.broadcast_to(np.asarray(position, dtype=float), (3,))
+        self.angle = np.broadcast_to(np.asarray(angle, dtype=float), (3,))
+        self.distribution = distribution
+
+    def sample(
+        self, rng: np.random.Generator, samples: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Draw placement errors
+
+        Args:
+            rng (np.random.Generator): Random number generator
+            samples (int): Number of errors to draw
+
+        Returns:
+            offsets (np.ndarray): (S, 3) position errors in mm
+            rotations (np.ndarray): (S, 3, 3) rotation error matrices
+        """
+
+        if self.distribution == "normal":
+            draw = lambda scale: rng.normal(0, 1, (samples, 3)) * scale
+        else:
+            draw = lambda scale: rng.uniform(-1, 1, (samples, 3)) * scale
+        offsets = draw(self.position)
+        angles = np.deg2rad(draw(self.angle))
+        return offsets, euler_matrices(angles)
+
+
+def euler_matrices(angles: np.ndarray) -> np.ndarray:
+    """
+    Build rotation matrices from (x, y, z) rotation angles, applied in that order
+
+    Args:
+        angles (np.ndarray): (..., 3) rotation angles in radians
+
+    Returns:
+        rotations (np.ndarray): (..., 3, 3) rotation matrices
+    """
+
+    cos, sin = np.cos(angles), np.sin(angles)
+    one, zero = np.ones(angles.shape[:-1]), np.zeros(angles.shape[:-1])
+
+    def matrix(*rows):
+        return np.stack([np.stack(row, -1) for row in rows], -2)
+
+    rx = matrix(
+        (one, zero, zero),
+        (zero, cos[..., 0], -sin[..., 0]),
+        (zero, sin[..., 0], cos[..., 0]),
+    )
+    ry = matrix(
+        (cos[..., 1], zero, sin[..., 1]),
+        (zero, one, zero),
+        (-sin[..., 1], zero, cos[..., 1]),
+    )
+    rz = matrix(
+        (cos[..., 2], -sin[..., 2], zero),
+        (sin[..., 2], cos[..., 2], zero),
+        (zero, zero, one),
+    )
+    return rz @ ry @ rx
+
+
+class ToleranceResult:
+    """
+    Beam errors at an end object over all samples of a tolerance analysis
+    Errors are measured in the frame of the (perturbed) end interface, relative to the nominal beam
+
+    Args:
+        name (str): Name of the end object
+        hit (np.ndarray): (S,) whether the beam reached the end object
+        offsets (np.ndarray): (S, 2) transverse position errors in mm (nan where missed)
+        angles (np.ndarray): (S,) angle errors in radians (nan where missed)
+        coupling (np.ndarray): (S,) coupling efficiency into the nominal mode (0 where missed)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        hit: np.ndarray,
+        offsets: np.ndarray,
+        angles: np.ndarray,
+        coupling: np.ndarray,
+    ):
+        self.name = name
+        self.hit = hit
+        self.offsets = offsets
+        self.angles = angles
+        self.coupling = coupling
+
+    def __repr__(self):
+        return f"ToleranceResult({self.name}, samples={len(self.hit)})"
+
+    def statistics(self, percentile: float = 95) -> dict:
+        """
+        Summarize the errors over all samples
+        Position and angle errors only exist for samples that reached the end object,
+        coupling is summarized over all samples with misses counted as 0 (so its mean
+        is the expected coupling including the hit rate)
+
+        Args:
+            percentile (float): Percentile to report alongside mean and standard deviation
+
+        Returns:
+            statistics (dict): Hit rate and mean, std and percentile of
+                               position error, angle error and coupling
+        """
+
+        def summarize(values: np.ndarray) -> dict:
+            if len(values) == 0:
+                return dict(mean=np.nan, std=np.nan, percentile=np.nan)
+            return dict(
+                mean=float(np.mean(values)),
+                std=float(np.std(values)),
+                percentile=float(np.percentile(values, percentile)),
+            )
+
+        hit = self.hit
+        return dict(
+            hit_rate=float(np.mean(hit)) if len(hit) > 0 else np.nan,
+            position=summarize(np.linalg.norm(self.offsets[hit], axis=-1)),
+            angle=summarize(self.angles[hit]),
+            coupling=summarize(self.coupling),
+        )
+
+
+class ToleranceAnalysis:
+    """
+    Monte Carlo analysis of how placement errors affect the beam at a set of end objects
+    Each sample perturbs a copy of a traced scene and re-traces it headlessly,
+    beam children stay at their nominal (machined) positions plus the sampled error
+
+    Args:
+        scene (TraceScene): Snapshot of a computed beam path
+        tolerances (dict[str, Tolerance]): Error distribution of each perturbed object by name
+        end_objects (list[str]): Names of the objects to measure the beam at
+        groups (dict[str, list[str]]): Names of all objects moving with each perturbed or
+                                       end object (defaults to the object itself)
+        frames (dict[str, tuple]): (base, 3x3 rotation) global frame of each perturbed object,
+                                   errors are applied in this frame (defaults to the
+                                   centroid of its interfaces and the global axes)
+        policy (str): Work queue policy for tracing
+        max_depth (int): Maximum depth of the beam tree (None for no limit)
+        max_segments (int): Maximum number of segments in the beam tree (None for no limit)
+        min_power (float): Minimum relative power of traced beams (None for no limit)
+    """
+
+    def __init__(
+        self,
+        scene: TraceScene,
+        tolerances: dict[str, Tolerance],
+        end_objects: list[str],
+        groups: dict[str, list[str]] = None,
+        frames: dict[str, tuple] = None,
+        policy: str = "depth",
+        max_depth: int = None,
+        max_segments: int = None,
+        min_power: float = None,
+    ):
+        self.scene = scene
+        self.tolerances = tolerances
+        self.end_objects = list(end_objects)
+        self.policy = policy
+        self.max_depth = max_depth
+        self.max_segments = max_segments
+        self.min_power = min_power
+
+        groups = {} if groups is None else groups
+        owners = np.array(scene.owners, dtype=object)
+
+        def get_rows(name: str) -> np.ndarray:
+            members = groups.get(name, [name])
+            return np.flatnonzero(np.isin(owners, members))
+
+        self.rows = {name: get_rows(name) for name in [*tolerances, *end_objects]}
+        self.members = {
+            name: set(groups.get(name, [name])) for name in self.end_objects
+        }
+
+        frames = {} if frames is None else frames
+        self.frames = {}
+        for name in tolerances:
+            if name in frames:
+                base, rotation = frames[name]
+            else:
+                rows = self.rows[name]
+                base = scene.table.positions[rows].mean(axis=0) if len(rows) else 0
+                rotation = np.eye(3)
+            self.frames[name] = (np.asarray(base, float), np.asarray(rotation, float))
+
+        # every placed object takes part, unplaced children stay where they are
+        self.active = np.ones(len(scene.owners), dtype=bool)
+        for child in scene.children:
+            if not child.placed:
+                self.active[child.rows] = False
+        self.roots = [record for record in scene.segments if record.parent is None]
+
+        self.nominal = None
+
+    def sample(self, samples: int, seed: int = None) -> dict[str, tuple]:
+        """
+        Draw placement errors for all perturbed objects
+
+        Args:
+            samples (int): Number of samples
+            seed (int): Seed for the random number generator
+
+        Returns:
+            errors (dict[str, tuple]): (offsets (S, 3), rotations (S, 3, 3)) of each object by name
+        """
+
+        rng = np.random.default_rng(seed)
+        return {
+            name: tolerance.sample(rng, samples)
+            for name, tolerance in self.tolerances.items()
+        }
+
+    def perturb(
+        self, offsets: dict[str, np.ndarray], rotations: dict[str, np.ndarray]
+    ) -> TraceScene:
+        """
+        Create a copy of the scene with placement errors applied, ready to be traced
+
+        Args:
+            offsets (dict[str, np.ndarray]): (x, y, z) position error of each object by name
+            rotations (dict[str, np.ndarray]): 3x3 rotation error of each object by name
+
+        Returns:
+            scene (TraceScene): Perturbed scene containing only the input beams
+        """
+
+        table = copy(self.scene.table)
+        table.positions = table.positions.copy()
+        table.normals = table.normals.copy()
+        transverses = self.scene.transverses.copy()
+
+        for name in offsets:
+            rows = self.rows[name]
+            base, frame = self.frames[name]
+            rotation = frame @ rotations[name] @ frame.T
+            table.positions[rows] = (
+                base + (table.positions[rows] - base) @ rotation.T + frame @ offsets[name]
+            )
+            table.normals[rows] = table.normals[rows] @ rotation.T
+            transverses[rows] = transverses[rows] @ rotation.T
+
+        scene = copy(self.scene)
+        scene.table = table
+        scene.transverses = transverses
+        scene.active = self.active.copy()
+        scene.children = [copy(child) for child in self.scene.children]
+        scene.segments = [root.derive() for root in self.roots]
+        return scene
+
+    def measure(self, scene: TraceScene) -> dict[str, tuple]:
+        """
+        Trace a scene and measure the beam at each end object
+        The lowest index beam ending at an object is measured
+
+        Args:
+            scene (TraceScene): Scene to trace
+
+        Returns:
+            measurements (dict[str, tuple]): (position (2,), direction (3,), radius, wavelength)
+                                             in the end interface frame, or None where missed
+        """
+
+        result = Tracer(
+            scene,
+            self.policy,
+            self.max_depth,
+            self.max_segments,
+            min_power=self.min_power,
+        ).trace()
+
+        measurements = {}
+        for name in self.end_objects:
+            records = [
+                record
+                for record in result.records
+                if record.alive and record.end in self.members[name]
+            ]
+            rows = self.rows[name]
+            if len(records) == 0 or len(rows) == 0:
+                measurements[name] = None
+                continue
+            record = min(records, key=lambda record: record.index)
+
+            intercepts, distances = intersect(
+                scene.table, record.position, record.direction, np.inf, rows
+            )
+            closest = int(np.argmin(distances))
+            if not np.isfinite(distances[closest]):
+                measurements[name] = None
+                continue
+            row = rows[closest]
+
+            # express the beam in the frame of the interface it hit
+            normal = scene.table.normals[row]
+            transverse = scene.transverses[row]
+            axes = np.stack([normal, transverse, np.cross(normal, transverse)])
+            local = axes @ (intercepts[closest] - scene.table.positions[row])
+            q_param = record.q_parameter + distances[closest]
+            measurements[name] = (
+                local[1:],
+                axes @ record.direction,
+                float(beam_radius(q_param, record.wavelength)),
+                record.wavelength,
+            )
+        return measurements
+
+    def measure_samples(
+        self, offsets: dict[str, np.ndarray], rotations: dict[str, np.ndarray]
+    ) -> list[dict[str, tuple]]:
+        """
+        Perturb, trace and measure a batch of samples
+
+        Args:
+            offsets (dict[str, np.ndarray]): (S, 3) position errors of each object by name
+            rotations (dict[str, np.ndarray]): (S, 3, 3) rotation errors of each object by name
+
+        Returns:
+            measurements (list[dict[str, tuple]]): Measurements of each sample (see measure)
+        """
+
+        samples = len(next(iter(offsets.values()))) if len(offsets) > 0 else 0
+        return [
+            self.measure(
+                self.perturb(
+                    {name: value[i] for name, value in offsets.items()},
+                    {name: value[i] for name, value in rotations.items()},
+                )
+            )
+            for i in range(samples)
+        ]
+
+    def run(
+        self,
+        samples: int,
+        seed: int = None,
+        processes: int = None,
+        chunk_size: int = 250,
+    ) -> list[ToleranceResult]:
+        """
+        Run the analysis, tracing batches of samples in a process pool where processes can be forked
+
+        Args:
+            samples (int): Number of samples
+            seed (int): Seed for the random number generator
+            processes (int): Number of worker processes (defaults to the number of cores, 1 for serial)
+            chunk_size (int): Number of samples traced per task
+
+        Returns:
+            results (list[ToleranceResult]): Errors at each end object, in order
+        """
+
+        if len(self.tolerances) == 0:
+            raise ValueError("At least one tolerance must be specified")
+
+        self.nominal = self.measure(self.perturb({}, {}))
+        for name, nominal in self.nominal.items():
+            if nominal is None:
+                raise RuntimeError(f"Nominal beam does not reach end object {name}")
+
+        errors = self.sample(samples, seed)
+        chunks = [
+            (
+                {name: offsets[i : i + chunk_size] for name, (offsets, _) in errors.items()},
+                {name: rotations[i : i + chunk_size] for name, (_, rotations) in errors.items()},
+            )
+            for i in range(0, samples, chunk_size)
+        ]
+
+        if processes == 1 or len(chunks) < 2 or "fork" not in get_all_start_methods():
+            measurements = [
+                measurement
+                for chunk in chunks
+                for measurement in self.measure_samples(*chunk)
+            ]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=processes, mp_context=get_context("fork")
+            ) as pool:
+                futures = [pool.submit(self.measure_samples, *chunk) for chunk in chunks]
+                measurements = [
+                    measurement for future in futures for measurement in future.result()
+                ]
+
+        return [self.get_result(name, measurements) for name in self.end_objects]
+
+    def get_result(
+        self, name: str, measurements: list[dict[str, tuple]]
+    ) -> ToleranceResult:
+        """
+        Compare the measurements at an end object with the nominal beam
+
+        Args:
+            name (str): Name of the end object
+            measurements (list[dict[str, tuple]]): Measurements of each sample
+
+        Returns:
+            result (ToleranceResult): Errors at the end object
+        """
+
+        nominal_position, nominal_direction, radius, wavelength = self.nominal[name]
+        samples = len(measurements)
+        hit = np.array([m[name] is not None for m in measurements], dtype=bool)
+        positions = np.full((samples, 2), np.nan)
+        directions = np.full((samples, 3), np.nan)
+        for i, measurement in enumerate(measurements):
+            if measurement[name] is not None:
+                positions[i], directions[i] = measurement[name][:2]
+
+        offsets = positions - nominal_position
+        angles = np.arccos(np.clip(directions @ nominal_direction, -1, 1))
+
+        # overlap with the nominal mode, treating the beam radius at the end object as its waist
+        divergence = wavelength * 1e-6 / (np.pi * radius)
+        coupling = np.exp(
+            -np.sum(offsets**2, axis=-1) / radius**2 - (angles / divergence) ** 2
+        )
+        coupling = np.where(hit, coupling, 0)
+
+        return ToleranceResult(name, hit, offsets, angles, coupling)
@@ -0,0 +1,1473 @@
+from __future__ import annotations
+
+import heapq
+from collections import deque, namedtuple
+from math import isclose
+from typing import Callable
+
+import numpy as np
+
+from PyOpticL.export import TraceWriter
+from PyOpticL.intersect import InterfaceTable, intersect
+from PyOpticL.profiling import profiled
+from PyOpticL.spatial import (
+    BoundingVolumeHierarchy,
+    IncrementalBoxIndex,
+    segment_boxes,
+)
+
+# weak beam branch and where it ends up (see trace_ghosts)
+Ghost = namedtuple(
+    "Ghost",
+    ["index", "power", "relative_power", "start", "end", "position", "depth"],
+)
+
+
+class BeamBundle:
+    """
+    Members of a bundle segment, traced as a group while they hit the same interfaces
+    All arrays have one entry per member
+
+    Args:
+        indices (np.ndarray): (K,) beam index of each member
+        directions (np.ndarray): (K, 3) normalized global direction of each member
+        powers (np.ndarray): (K,) power of each member in W
+        frequencies (np.ndarray): (K,) optical frequency shift of each member in Hz
+    """
+
+    def __init__(
+        self,
+        indices: np.ndarray,
+        directions: np.ndarray,
+        powers: np.ndarray,
+        frequencies: np.ndarray,
+    ):
+        self.indices = np.array(indices, dtype=int)
+        self.directions = np.array(directions, dtype=float).reshape(-1, 3)
+        self.powers = np.array(powers, dtype=float)
+        self.frequencies = np.array(frequencies, dtype=float)
+        self.distances = np.zeros(len(self.indices))  # to be set during tracing
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def subset(self, members: list[int]) -> BeamBundle:
+        """
+        Create a bundle from a subset of members
+
+        Args:
+            members (list[int]): Positions of the members to keep
+
+        Returns:
+            bundle (BeamBundle): Bundle containing only those members
+        """
+
+        bundle = BeamBundle(
+            self.indices[members],
+            self.directions[members],
+            self.powers[members],
+            self.frequencies[members],
+        )
+        bundle.distances = self.distances[members]
+        return bundle
+
+    def matches(self, other: BeamBundle) -> bool:
+        """
+        Check if another bundle has the same members
+
+        Args:
+            other (BeamBundle): Bundle to compare with
+
+        Returns:
+            matches (bool): Whether the bundles have the same members
+        """
+
+        return (
+            len(self) == len(other)
+            and np.array_equal(self.indices, other.indices)
+            and np.allclose(self.directions, other.directions, rtol=0, atol=1e-9)
+            and np.allclose(self.powers, other.powers, rtol=1e-9, atol=1e-12)
+            and np.allclose(self.frequencies, other.frequencies, rtol=1e-12, atol=0)
+        )
+
+
+class SegmentRecord:
+    """
+    Lightweight beam segment used by the headless tracer
+    All vectors are expressed in the global frame
+
+    Args:
+        index (int): Index of the beam
+        position (np.ndarray): (x, y, z) origin of the segment
+        direction (np.ndarray): (x, y, z) normalized direction of the segment
+        wavelength (float): Wavelength of the beam in nm
+        jones (np.ndarray): Normalized complex Jones vector
+        power (float): Power of the beam in W
+        waist_position (float): Position of the beam waist relative to the origin in mm
+        rayleigh_range (float): Rayleigh range in mm
+        frequency (float): Optical frequency shift of the beam in Hz
+    """
+
+    def __init__(
+        self,
+        index: int,
+        position: np.ndarray,
+        direction: np.ndarray,
+        wavelength: float,
+        jones: np.ndarray,
+        power: float,
+        waist_position: float,
+        rayleigh_range: float,
+        frequency: float = 0,
+    ):
+        self.index = index
+        self.position = np.asarray(position, dtype=float)
+        self.direction = np.asarray(direction, dtype=float)
+        self.wavelength = wavelength
+        self.jones = np.asarray(jones, dtype=complex)
+        self.power = power
+        self.waist_position = waist_position
+        self.rayleigh_range = rayleigh_range
+        self.frequency = frequency
+        self.bundle = None  # members if this record is a bundle segment
+
+        self.distance = 0  # to be set during tracing
+        self.start = None  # name of the object the segment starts at
+        self.end = None  # name of the object the segment ends at
+        self.parent = None
+        self.children = []
+        self.name = None  # name of the document object this record was read from
+        self.alive = True
+        self.modified = False  # whether the document object needs to be updated
+        self.reparented = False  # whether the record was reused under a new parent
+
+    def __repr__(self):
+        return f"SegmentRecord({bin(self.index)}, distance={self.distance:.3f})"
+
+    @property
+    def q_parameter(self) -> complex:
+        """Complex beam parameter at the segment origin (mm units)"""
+
+        return complex(-self.waist_position, self.rayleigh_range)
+
+    @property
+    def end_position(self) -> np.ndarray:
+        """(x, y, z) position of the end of the segment"""
+
+        return self.position + self.distance * self.direction
+
+    def derive(self, **changes) -> SegmentRecord:
+        """
+        Create a new record that inherits all beam properties not specified
+
+        Args:
+            **changes: Any of the constructor arguments to override
+
+        Returns:
+            record (SegmentRecord): The new record
+        """
+
+        properties = dict(
+            index=self.index,
+            position=self.position,
+            direction=self.direction,
+            wavelength=self.wavelength,
+            jones=self.jones,
+            power=self.power,
+            waist_position=self.waist_position,
+            rayleigh_range=self.rayleigh_range,
+            frequency=self.frequency,
+        )
+        properties.update(changes)
+        return SegmentRecord(**properties)
+
+    @classmethod
+    def bundle_of(cls, records: list[SegmentRecord]) -> SegmentRecord:
+        """
+        Combine beams leaving the same point into a single bundle segment
+        Beam parameters other than direction, power and frequency are taken from the first beam
+
+        Args:
+            records (list[SegmentRecord]): Beams to combine (bundles are merged member by member)
+
+        Returns:
+            record (SegmentRecord): Bundle segment
+        """
+
+        members = [member for record in records for member in record.members()]
+        bundle = BeamBundle(
+            [member.index for member in members],
+            [member.direction for member in members],
+            [member.power for member in members],
+            [member.frequency for member in members],
+        )
+        record = records[0].derive(
+            index=members[0].index,
+            direction=members[0].direction,
+            power=float(np.sum(bundle.powers)),
+            frequency=members[0].frequency,
+        )
+        record.start = records[0].start
+        record.bundle = bundle
+        return record
+
+    def set_bundle(self, bundle: BeamBundle):
+        """
+        Replace the members of a bundle segment, a single member turns the record into a plain beam
+
+        Args:
+            bundle (BeamBundle): New members
+        """
+
+        self.index = int(bundle.indices[0])
+        self.direction = bundle.directions[0]
+        self.power = float(np.sum(bundle.powers))
+        self.frequency = float(bundle.frequencies[0])
+        self.distance = float(bundle.distances[0])
+        self.bundle = bundle if len(bundle) > 1 else None
+
+    def members(self) -> list[SegmentRecord]:
+        """
+        Split a bundle segment into one plain segment per member
+
+        Returns:
+            members (list[SegmentRecord]): Member segments (only this record if it is not a bundle)
+        """
+
+        if self.bundle is None:
+            return [self]
+        bundle = self.bundle
+        members = []
+        for i in range(len(bundle)):
+            member = self.derive(
+                index=int(bundle.indices[i]),
+                direction=bundle.directions[i],
+                power=float(bundle.powers[i]),
+                frequency=float(bundle.frequencies[i]),
+            )
+            member.distance = float(bundle.distances[i])
+            member.start = self.start
+            member.end = self.end
+            members.append(member)
+        return members
+
+    def rays(self, bounded: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the rays covered by the segment (one per bundle member)
+
+        Args:
+            bounded (bool): Whether to limit finished segments to their length
+
+        Returns:
+            origins (np.ndarray): (K, 3) ray origins
+            directions (np.ndarray): (K, 3) ray directions
+            max_distances (np.ndarray): (K,) ray lengths (inf for unfinished segments)
+        """
+
+        if self.bundle is None:
+            directions = self.direction[None, :]
+            distances = np.array([self.distance], dtype=float)
+        else:
+            directions = self.bundle.directions
+            distances = np.array(self.bundle.distances, dtype=float)
+        if not bounded or self.end is None:
+            distances = np.full(len(directions), np.inf)
+        origins = np.broadcast_to(self.position, directions.shape)
+        return origins, directions, distances
+
+    def matches(self, other: SegmentRecord) -> bool:
+        """
+        Check if another record describes the same beam leaving the same object
+
+        Args:
+            other (SegmentRecord): Record to compare with
+
+        Returns:
+            matches (bool): Whether the records have the same inputs
+        """
+
+        return (
+            self.index == other.index
+            and self.start == other.start
+            and self.wavelength == other.wavelength
+            and np.allclose(self.position, other.position, rtol=0, atol=1e-6)
+            and np.allclose(self.direction, other.direction, rtol=0, atol=1e-9)
+            and np.allclose(self.jones, other.jones, rtol=0, atol=1e-9)
+            and isclose(self.power, other.power, rel_tol=1e-9, abs_tol=1e-12)
+            and isclose(self.waist_position, other.waist_position, abs_tol=1e-6)
+            and isclose(self.rayleigh_range, other.rayleigh_range, abs_tol=1e-6)
+            and self.frequency == other.frequency
+            and (self.bundle is None) == (other.bundle is None)
+            and (self.bundle is None or self.bundle.matches(other.bundle))
+        )
+
+    def get_constraint_position(
+        self,
+        type: str,
+        value: float,
+        bound_base: np.ndarray,
+        bound_rotation: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Get the position of the beam at a specified distance or coordinate
+
+        Args:
+            type (str): Type of constraint ('distance', 'xPosition', 'yPosition', 'zPosition')
+            value (float): Value of the constraint in mm
+            bound_base (np.ndarray): (x, y, z) origin of the bound parent frame
+            bound_rotation (np.ndarray): 3x3 rotation matrix of the bound parent frame
+
+        Returns:
+            position (np.ndarray): (x, y, z) global coordinates of the beam position
+        """
+
+        # work in the bound parent's local frame to evaluate constraints
+        position = bound_rotation.T @ (self.position - bound_base)
+        direction = bound_rotation.T @ self.direction
+
+        axes = {"xPosition": 0, "yPosition": 1, "zPosition": 2}
+        planes = {"xPosition": "yz", "yPosition": "xz", "zPosition": "xy"}
+        if type == "distance":
+            output = position + value * direction
+        elif type in axes:
+            axis = axes[type]
+            if isclose(direction[axis], 0):
+                raise RuntimeError(
+                    f"Beam is parallel to {planes[type]} plane, cannot constrain {type[0]} position"
+                )
+            t = (value - position[axis]) / direction[axis]
+            output = position + t * direction
+        else:
+            raise ValueError(f"Unknown constraint type {type}")
+
+        # convert constrained point back to global frame
+        return bound_rotation @ output + bound_base
+
+
+class ChildSpec:
+    """
+    Description of a beam child that is placed by the tracer
+
+    Args:
+        name (str): Name of the child document object
+        label (str): Label of the child object (used in error messages)
+        beam_index (int): Index of the beam the child interacts with
+        after_object (str): Name of the object the beam must start at, or None
+        constraint_type (str): Type of placement constraint
+        constraint_value (float): Value of the placement constraint in mm
+        offset (np.ndarray): (x, y, z) global offset of the child from the beam
+        base (np.ndarray): (x, y, z) current global position of the child
+        rows (list[int]): Interface table rows belonging to the child and its children
+        interface_row (int): Row of the interface the beam is aligned to, or None
+        interface_offset (np.ndarray): (x, y, z) offset of that interface from the child origin
+        placed (bool): Whether the child has already been placed
+        bound (bool): Whether the child lies under the bound parent, only then its interfaces
+                      block other beams once it is placed
+    """
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        beam_index: int,
+        after_object: str,
+        constraint_type: str,
+        constraint_value: float,
+        offset: np.ndarray,
+        base: np.ndarray,
+        rows: list[int],
+        interface_row: int,
+        interface_offset: np.ndarray,
+        placed: bool = False,
+        bound: bool = True,
+    ):
+        self.name = name
+        self.label = label
+        self.beam_index = beam_index
+        self.after_object = after_object
+        self.constraint_type = constraint_type
+        self.constraint_value = constraint_value
+        self.offset = np.asarray(offset, dtype=float)
+        self.base = np.asarray(base, dtype=float)
+        self.rows = list(rows)
+        self.interface_row = interface_row
+        self.interface_offset = np.asarray(interface_offset, dtype=float)
+        self.placed = placed
+        self.bound = bound
+
+
+class ChildIndex:
+    """
+    Unplaced beam children keyed by beam index, in the order they were added
+    Only the first unplaced child of a beam index can be placed next
+
+    Args:
+        children (list[ChildSpec]): Beam children in the order they were added
+    """
+
+    def __init__(self, children: list[ChildSpec]):
+        self.pending = {}
+        for child in children:
+            if not child.placed:
+                self.pending.setdefault(child.beam_index, deque()).append(child)
+
+    def __contains__(self, beam_index: int) -> bool:
+        return beam_index in self.pending
+
+    def get_next(self, beam_index: int, start: str) -> ChildSpec:
+        """
+        Get the next child to place on a beam
+
+        Args:
+            beam_index (int): Index of the beam
+            start (str): Name of the object the beam starts at
+
+        Returns:
+            child (ChildSpec): First unplaced child of the beam index if its
+                               after object matches, otherwise None
+        """
+
+        queue = self.pending.get(beam_index)
+        if queue is None:
+            return None
+        child = queue[0]
+        if child.after_object is None or child.after_object == start:
+            return child
+        return None
+
+    def get_children(self, beam_index: int) -> list[ChildSpec]:
+        """
+        Get all unplaced children of a beam index
+
+        Args:
+            beam_index (int): Index of the beam
+
+        Returns:
+            children (list[ChildSpec]): Unplaced children in the order they were added
+        """
+
+        return list(self.pending.get(beam_index, ()))
+
+    def leads_to(self, beam_index: int) -> bool:
+        """
+        Check if any unplaced child is waiting for a beam or a beam derived from it
+
+        Args:
+            beam_index (int): Index of the beam
+
+        Returns:
+            leads_to (bool): Whether a child targets the beam index or one extending it
+        """
+
+        length = beam_index.bit_length()
+        for target in self.pending:
+            # beam indices are extended bitwise at each interaction
+            shift = target.bit_length() - length
+            if shift >= 0 and target >> shift == beam_index:
+                return True
+        return False
+
+    def remove(self, child: ChildSpec):
+        """
+        Remove a child once it has been placed
+
+        Args:
+            child (ChildSpec): Child to remove
+        """
+
+        queue = self.pending[child.beam_index]
+        if queue[0] is child:
+            queue.popleft()
+        else:
+            queue.remove(child)
+        if len(queue) == 0:
+            del self.pending[child.beam_index]
+
+
+class TraceScene:
+    """
+    Snapshot of everything a beam path interacts with, independent of the FreeCAD document
+
+    Args:
+        interfaces (list[Interface]): Interface objects, one per table row
+        owners (list[str]): Name of the object providing each interface
+        positions (np.ndarray): (N, 3) global interface positions
+        normals (np.ndarray): (N, 3) global interface normals
+        transverses (np.ndarray): (N, 3) global interface transverse vectors
+        active (np.ndarray): (N,) whether each interface currently takes part in tracing
+        children (list[ChildSpec]): Beam children in the order they were added
+        segments (list[SegmentRecord]): Previously traced segments (parents before children)
+        bound_base (np.ndarray): (x, y, z) origin of the bound parent frame
+        bound_rotation (np.ndarray): 3x3 rotation matrix of the bound parent frame
+        final_distance (float): Propagation distance for segments that do not hit anything
+    """
+
+    def __init__(
+        self,
+        interfaces: list,
+        owners: list[str],
+        positions: np.ndarray,
+        normals: np.ndarray,
+        transverses: np.ndarray,
+        active: np.ndarray,
+        children: list[ChildSpec],
+        segments: list[SegmentRecord],
+        bound_base: np.ndarray,
+        bound_rotation: np.ndarray,
+        final_distance: float,
+    ):
+        self.interfaces = interfaces
+        self.owners = owners
+        self.table = InterfaceTable.from_interfaces(interfaces, positions, normals)
+        self.transverses = np.array(transverses, dtype=float).reshape(-1, 3)
+        self.active = np.array(active, dtype=bool)
+        self.children = children
+        self.segments = segments
+        self.bound_base = np.asarray(bound_base, dtype=float)
+        self.bound_rotation = np.asarray(bound_rotation, dtype=float)
+        self.final_distance = final_distance
+
+
+class TraceStats:
+    """
+    Statistics collected by the tracer work queue
+
+    Args:
+        policy (str): Queue policy used for the trace
+    """
+
+    def __init__(self, policy: str):
+        self.policy = policy
+        self.steps = 0  # segments stepped
+        self.tasks = 0  # queue items processed (steps, conflict checks and reuses)
+        self.max_queue_size = 0
+        self.max_depth = 0  # deepest segment reached
+        self.truncated_depth = 0  # segments whose outputs were dropped by the depth cap
+        self.truncated_segments = 0  # segments whose outputs were dropped by the segment cap
+        self.pruned_power = 0  # output beams dropped by the power threshold
+
+    def __repr__(self):
+        return (
+            f"TraceStats(policy={self.policy}, steps={self.steps}, tasks={self.tasks}, "
+            f"max_queue_size={self.max_queue_size}, max_depth={self.max_depth}, "
+            f"truncated_depth={self.truncated_depth}, "
+            f"truncated_segments={self.truncated_segments}, "
+            f"pruned_power={self.pruned_power})"
+        )
+
+    @property
+    def truncated(self) -> bool:
+        """Whether any segment was cut short by a cap"""
+
+        return self.truncated_depth > 0 or self.truncated_segments > 0
+
+    def to_dict(self) -> dict:
+        """
+        Convert the statistics to a plain dictionary
+
+        Returns:
+            stats (dict): All statistics by name
+        """
+
+        return dict(
+            policy=self.policy,
+            steps=self.steps,
+            tasks=self.tasks,
+            max_queue_size=self.max_queue_size,
+            max_depth=self.max_depth,
+            truncated_depth=self.truncated_depth,
+            truncated_segments=self.truncated_segments,
+            pruned_power=self.pruned_power,
+        )
+
+
+class WorkQueue:
+    """
+    Queue of pending tracer tasks
+
+    Policies:
+        depth: last in, first out (same order as recursive tracing)
+        breadth: first in, first out
+        power: highest power segments first, other tasks are processed immediately
+
+    Args:
+        policy (str): Order in which tasks are processed
+    """
+
+    policies = ("depth", "breadth", "power")
+
+    def __init__(self, policy: str = "depth"):
+        if policy not in self.policies:
+            raise ValueError(
+                f"Unknown queue policy {policy}, use one of {', '.join(self.policies)}"
+            )
+        self.policy = policy
+        self.heap = []
+        self.counter = 0  # tie breaker that keeps insertion order
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, task: tuple, power: float = np.inf):
+        """
+        Add a task to the queue
+
+        Args:
+            task (tuple): (kind, *arguments) task to add
+            power (float): Power of the segment the task belongs to
+        """
+
+        self.counter += 1
+        if self.policy == "depth":
+            key = (-self.counter,)
+        elif self.policy == "breadth":
+            key = (self.counter,)
+        else:
+            key = (-power, self.counter)
+        heapq.heappush(self.heap, (key, task))
+
+    def extend(self, tasks: list[tuple], powers: list[float]):
+        """
+        Add several tasks so that they are processed in the given order
+
+        Args:
+            tasks (list[tuple]): Tasks to add
+            powers (list[float]): Power of the segment each task belongs to
+        """
+
+        items = list(zip(tasks, powers))
+        if self.policy == "depth":
+            items.reverse()
+        for task, power in items:
+            self.push(task, power)
+
+    def pop(self) -> tuple:
+        """
+        Remove the next task from the queue
+
+        Returns:
+            task (tuple): (kind, *arguments) next task
+        """
+
+        return heapq.heappop(self.heap)[1]
+
+
+class TraceResult:
+    """
+    Output of a headless trace
+
+    Args:
+        records (list[SegmentRecord]): All records in trace order, including removed ones
+        placed (list[ChildSpec]): Beam children placed during the trace, in placement order
+        stats (TraceStats): Work queue statistics
+    """
+
+    def __init__(
+        self,
+        records: list[SegmentRecord],
+        placed: list[ChildSpec],
+        stats: TraceStats = None,
+    ):
+        self.records = records
+        self.placed = placed
+        self.stats = stats
+
+    @property
+    def segments(self) -> list[SegmentRecord]:
+        """All segments that are part of the final beam tree"""
+
+        return [record for record in self.records if record.alive]
+
+
+class Tracer:
+    """
+    Headless beam tracer operating on a TraceScene
+    Segments are processed from an explicit work queue instead of recursion
+    Interfaces are looked up through a bounding volume hierarchy that is built
+    once per trace and refit whenever a beam child is placed
+    Segments discarded by a re-trace are kept for reuse, so subtrees whose inputs
+    did not change keep their records (and document objects)
+
+    Args:
+        scene (TraceScene): Scene to trace through (modified in place as children are placed)
+        policy (str): Work queue policy ('depth', 'breadth' or 'power')
+        max_depth (int): Maximum number of segments between the input beam and any output (None for no limit)
+        max_segments (int): Maximum number of segments in the beam tree (None for no limit)
+        writer (TraceWriter): Writer that segments are streamed to as they are traced (optional)
+        min_power (float): Output beams below this fraction of the input beam power are not traced
+                           (None for no limit)
+    """
+
+    def __init__(
+        self,
+        scene: TraceScene,
+        policy: str = "depth",
+        max_depth: int = None,
+        max_segments: int = None,
+        writer: TraceWriter = None,
+        min_power: float = None,
+    ):
+        self.scene = scene
+        self.writer = writer
+        self.min_power = min_power
+        self.records = list(scene.segments)
+        # records in the trace and how many of them are alive, kept up to date for the segment cap
+        self.listed = {id(record) for record in self.records}
+        self.alive_count = sum(record.alive for record in self.records)
+        self.queued_outputs = 0  # output beams waiting in the queue to be added
+        self.placed = []
+        self.pending = ChildIndex(scene.children)
+        self.hierarchy = BoundingVolumeHierarchy(*scene.table.bounds())
+
+        self.queue = WorkQueue(policy)
+        self.stats = TraceStats(policy)
+        self.max_depth = max_depth
+        self.max_segments = max_segments
+
+        # power thresholds are relative to the input beams
+        self.input_power = max(
+            (record.power for record in self.records if record.parent is None),
+            default=0,
+        )
+
+        # depth of existing segments in the beam tree
+        depths = {}
+        for record in self.records:
+            if record.parent is not None:
+                depths[id(record)] = depths.get(id(record.parent), 0) + 1
+        self.depths = depths
+
+        # swept boxes of traced segments, used to find segments blocked by placed children
+        self.segment_index = IncrementalBoxIndex()
+        self.indexed_records = []
+        for record in self.records:
+            self.index_segment(record)
+
+        # discarded segments by (index, start), with the number of children placed at the time
+        self.reusable = {}
+
+    def trace(
+        self,
+        seeds: list[SegmentRecord] = None,
+        retrace: list[SegmentRecord] = (),
+        stop: Callable[[SegmentRecord], bool] = None,
+    ) -> TraceResult:
+        """
+        Trace the scene from a set of starting segments
+
+        Args:
+            seeds (list[SegmentRecord]): Segments to step (defaults to all loose ends)
+            retrace (list[SegmentRecord]): Segments whose children should be discarded and re-traced
+            stop (Callable[[SegmentRecord], bool]): End the trace early once a stepped segment satisfies this
+
+        Returns:
+            result (TraceResult): The traced segments, placed children and queue statistics
+        """
+
+        for record in retrace:
+            self.prune(record)
+        if seeds is None:
+            seeds = [record for record in self.records if len(record.children) == 0]
+        self.queue.extend(
+            [("step", record) for record in seeds],
+            [record.power for record in seeds],
+        )
+        self.run(stop)
+        if self.writer is not None:
+            # catch up on segments changed or removed after they were traced
+            self.writer.sync(self.records)
+        return TraceResult(self.records, self.placed, self.stats)
+
+    def run(self, stop: Callable[[SegmentRecord], bool] = None):
+        """
+        Process tasks until the work queue is empty
+
+        Args:
+            stop (Callable[[SegmentRecord], bool]): End early once a stepped segment satisfies this
+        """
+
+        while len(self.queue) > 0:
+            self.stats.max_queue_size = max(self.stats.max_queue_size, len(self.queue))
+            kind, *arguments = self.queue.pop()
+            self.stats.tasks += 1
+            if kind == "step":
+                self.step(*arguments)
+                if self.writer is not None and arguments[0].alive:
+                    self.writer.write(arguments[0])
+                if stop is not None and stop(arguments[0]):
+                    return
+            elif kind == "output":
+                self.process_output(*arguments)
+            elif kind == "conflicts":
+                self.check_blocked(*arguments)
+
+    def get_depth(self, record: SegmentRecord) -> int:
+        """
+        Get the number of segments between the input beam and a segment
+
+        Args:
+            record (SegmentRecord): Segment to check
+
+        Returns:
+            depth (int): Depth of the segment in the beam tree
+        """
+
+        return self.depths.get(id(record), 0)
+
+    def index_segment(self, record: SegmentRecord):
+        """
+        Add the swept box of a segment to the segment index
+
+        Args:
+            record (SegmentRecord): Segment to index
+        """
+
+        lower, upper = segment_boxes(*record.rays())
+        self.segment_index.insert(lower.min(axis=0), upper.max(axis=0))
+        self.indexed_records.append(record)
+
+    def prune(self, record: SegmentRecord):
+        """
+        Remove all children of a segment from the beam tree
+        Removed segments that were already traced are kept for reuse
+
+        Args:
+            record (SegmentRecord): Segment whose children should be removed
+        """
+
+        stack = list(record.children)
+        while stack:
+            child = stack.pop()
+            if child.alive and id(child) in self.listed:
+                self.alive_count -= 1
+            child.alive = False
+            if child.modified or child.name is not None:
+                key = (child.index, child.start)
+                self.reusable.setdefault(key, []).append((child, len(self.placed)))
+            stack.extend(child.children)
+        record.children = []
+
+    def find_reusable(self, beam: SegmentRecord) -> tuple:
+        """
+        Find a discarded segment with the same inputs as a new output beam
+
+        Args:
+            beam (SegmentRecord): New output beam
+
+        Returns:
+            record (SegmentRecord): Matching discarded segment, or None
+            since (int): Number of children placed when the segment was discarded
+        """
+
+        candidates = self.reusable.get((beam.index, beam.start), [])
+        for i, (record, since) in enumerate(candidates):
+            if not record.alive and record.matches(beam):
+                del candidates[i]
+                return record, since
+        return None, None
+
+    def resurrect(self, record: SegmentRecord, parent: SegmentRecord, since: int):
+        """
+        Reattach a discarded segment and its children under a new parent
+
+        Args:
+            record (SegmentRecord): Discarded segment to reuse
+            parent (SegmentRecord): New parent segment
+            since (int): Number of children placed when the segment was discarded
+        """
+
+        if record.parent is not parent:
+            if record.parent is not None:
+                siblings = record.parent.children
+                record.parent.children = [
+                    child for child in siblings if child is not record
+                ]
+            record.parent = parent
+            record.reparented = True
+
+        subtree = []
+        stack = [record]
+        while stack:
+            child = stack.pop()
+            if not child.alive or id(child) not in self.listed:
+                self.alive_count += 1
+            child.alive = True
+            self.depths[id(child)] = self.get_depth(child.parent) + 1
+            subtree.append(child)
+            stack.extend(reversed(child.children))
+
+        # keep parents before children in trace order
+        moved = {id(child) for child in subtree}
+        self.records = [r for r in self.records if id(r) not in moved] + subtree
+        self.listed |= moved
+
+        # children placed in the meantime may block the reused segments
+        rows = [child.interface_row for child in self.placed[since:]]
+        if len(rows) > 0:
+            self.queue.push(("conflicts", subtree, rows, False))
+
+    def get_intercepts(
+        self, record: SegmentRecord, rows: list[int], bounded: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Intersect a segment with a subset of interfaces
+
+        Args:
+            record (SegmentRecord): Segment to test
+            rows (list[int]): Interface table rows to test
+            bounded (bool): Whether to limit finished segments to their length
+
+        Returns:
+            intercepts (np.ndarray): (K, 3) intercept points (nan where missed)
+            distances (np.ndarray): (K,) distances to the intercepts (inf where missed)
+        """
+
+        if record.bundle is None:
+            if bounded and record.end is not None:
+                max_distance = record.distance
+            else:
+                max_distance = np.inf
+            return intersect(
+                self.scene.table, record.position, record.direction, max_distance, rows
+            )
+
+        # closest member intercept of each interface
+        intercepts, distances = intersect(self.scene.table, *record.rays(bounded), rows)
+        closest = np.argmin(distances, axis=0)
+        columns = np.arange(len(closest))
+        return intercepts[closest, columns], distances[closest, columns]
+
+    @profiled("get_next_global")
+    def get_next_global(self, input_beam: SegmentRecord) -> tuple:
+        """
+        Get the next global interface the beam will interact with
+
+        Args:
+            input_beam (SegmentRecord): Input beam segment to process
+
+        Returns:
+            next_object (str): Name of the next object to interact with
+            next_row (int): Interface table row of the next interface
+            min_distance (float): Distance to the next interaction
+        """
+
+        if input_beam.end is not None:
+            max_distance = input_beam.distance
+        else:
+            max_distance = np.inf
+
+        # only test active interfaces whose bounds are crossed by the beam
+        rows = self.hierarchy.query_ray(
+            input_beam.position, input_beam.direction, max_distance
+        )
+        rows = rows[self.scene.active[rows]]
+        if len(rows) == 0:
+            return None, None, np.inf
+
+        _, distances = self.get_intercepts(input_beam, rows)
+        closest = int(np.argmin(distances))  # first of equal distances
+        if not np.isfinite(distances[closest]):
+            return None, None, np.inf
+        row = int(rows[closest])
+        return self.scene.owners[row], row, distances[closest]
+
+    @profiled("get_next_child")
+    def get_next_child(self, input_beam: SegmentRecord) -> tuple:
+        """
+        Get the next beam child for placement
+
+        Args:
+            input_beam (SegmentRecord): Input beam segment to process
+
+        Returns:
+            next_child (ChildSpec): Next beam child to place
+            next_row (int): Interface table row of the child interface
+            next_distance (float): Distance to the placement position
+        """
+
+        next_child = self.pending.get_next(input_beam.index, input_beam.start)
+        if next_child is None:
+            return None, None, np.inf
+
+        if next_child.interface_row is None:
+            raise RuntimeError(
+                f"Child object {next_child.label} does not have any interfaces"
+            )
+
+        # get position from provided constraint
+        try:
+            next_position = input_beam.get_constraint_position(
+                next_child.constraint_type,
+                next_child.constraint_value,
+                self.scene.bound_base,
+                self.scene.bound_rotation,
+            )
+        except RuntimeError as e:
+            raise RuntimeError(
+                f"Error handling constraints for beam child {next_child.label}: {str(e)}"
+            )
+
+        next_distance = np.linalg.norm(next_position - input_beam.position)
+        return next_child, next_child.interface_row, next_distance
+
+    def place_child(self, input_beam: SegmentRecord, child: ChildSpec, distance: float):
+        """
+        Move a beam child so its interface sits on the beam and activate its interfaces
+        (children outside the bound parent only interact with their own beam and stay inactive)
+
+        Args:
+            input_beam (SegmentRecord): Beam segment the child is placed on
+            child (ChildSpec): Child to place
+            distance (float): Distance along the beam to place the child at
+        """
+
+        intercept = input_beam.get_constraint_position(
+            "distance", distance, self.scene.bound_base, self.scene.bound_rotation
+        )
+        position = intercept - child.interface_offset + child.offset
+
+        # move all interfaces of the child and refit the hierarchy
+        rows = child.rows
+        if len(rows) > 0:
+            table = self.scene.table
+            table.positions[rows] += position - child.base
+            self.scene.active[rows] = child.bound
+            lower, upper = table.bounds()
+            self.hierarchy.update(rows, lower[rows], upper[rows])
+
+        child.base = position
+        child.placed = True
+        self.pending.remove(child)
+        self.placed.append(child)
+
+    @profiled("handle_conflicts")
+    def handle_conflicts(self, last_beam: SegmentRecord, child: ChildSpec) -> tuple:
+        """
+        Find previously computed segments that may be blocked by a newly placed child
+
+        Args:
+            last_beam (SegmentRecord): Last beam segment placed
+            child (ChildSpec): Child that was just placed
+
+        Returns:
+            task (tuple): Conflict check task for the work queue, or None
+        """
+
+        # children outside the bound parent do not block other beams
+        if not child.bound:
+            return None
+
+        # only test segments whose swept box overlaps the placed interface
+        row = child.interface_row
+        lower, upper = self.scene.table.bounds()
+        candidates = self.segment_index.query_box(lower[row], upper[row])
+
+        records = []
+        seen = set()
+        for i in candidates:
+            record = self.indexed_records[i]
+            if record.alive and record is not last_beam and id(record) not in seen:
+                seen.add(id(record))
+                records.append(record)
+        if len(records) == 0:
+            return None
+        return ("conflicts", records, [row], False)
+
+    @profiled("check_blocked")
+    def check_blocked(
+        self, records: list[SegmentRecord], rows: list[int], retraced: bool
+    ):
+        """
+        Re-trace the first segment that intersects any of a set of interfaces
+        The remaining segments are checked again once that re-trace has finished
+
+        Args:
+            records (list[SegmentRecord]): Segments to test
+            rows (list[int]): Interface table rows to test against
+            retraced (bool): Whether an earlier segment of the same check was re-traced
+        """
+
+        if len(records) == 0:
+            return
+
+        if not retraced:
+            # test all segments (and bundle members) against the interfaces in one pass
+            rays = [record.rays() for record in records]
+            owners = np.repeat(np.arange(len(records)), [len(ray[0]) for ray in rays])
+            _, distances = intersect(
+                self.scene.table,
+                np.concatenate([ray[0] for ray in rays]),
+                np.concatenate([ray[1] for ray in rays]),
+                np.concatenate([ray[2] for ray in rays]),
+                rows,
+            )
+            hits = np.zeros(len(records), dtype=bool)
+            np.logical_or.at(hits, owners, np.any(np.isfinite(distances), axis=1))
+
+        for i, record in enumerate(records):
+            if not record.alive:
+                continue
+            if retraced:
+                # earlier re-traces may have changed this segment, test it again
+                hit = np.any(np.isfinite(self.get_intercepts(record, rows)[1]))
+            else:
+                hit = hits[i]
+            if hit:
+                self.prune(record)
+                # re-trace this segment fully before checking the rest
+                self.queue.push(("conflicts", records[i + 1 :], rows, True))
+                self.queue.push(("step", record), record.power)
+                return
+
+    @profiled("step")
+    def step(self, input_beam: SegmentRecord):
+        """
+        Perform a single calculation step for a beam segment
+        Output beams are added to the work queue
+
+        Args:
+            input_beam (SegmentRecord): Input beam segment to process
+        """
+
+        if not input_beam.alive:
+            return
+        self.stats.steps += 1
+        if input_beam.bundle is not None:
+            # members with beam children waiting for them are traced on their own
+            bundle = input_beam.bundle
+            targeted = [
+                i for i in range(len(bundle)) if bundle.indices[i] in self.pending
+            ]
+            if len(targeted) > 0:
+                others = [i for i in range(len(bundle)) if i not in targeted]
+                groups = [[i] for i in targeted]
+                self.split_bundle(input_beam, [others] + groups if others else groups)
+        if input_beam.bundle is not None:
+            self.step_bundle(input_beam)
+            return
+
+        next_global = self.get_next_global(input_beam)
+        next_child = self.get_next_child(input_beam)
+
+        global_distance, child_distance = next_global[2], next_child[2]
+
+        if global_distance == np.inf and child_distance == np.inf:
+            # no more interactions, propagate to the final distance
+            input_beam.distance = self.scene.final_distance
+            input_beam.modified = True
+            self.index_segment(input_beam)
+            return
+
+        conflicts = None
+        if global_distance < child_distance:
+            next_object, next_row, next_distance = next_global
+        else:
+            child, next_row, next_distance = next_child
+            next_object = child.name
+            self.place_child(input_beam, child, next_distance)
+            # check for conflicts with previously traced beams
+            conflicts = self.handle_conflicts(input_beam, child)
+
+        # get output beams from interaction
+        input_beam.distance = next_distance
+        input_beam.end = next_object
+        input_beam.modified = True
+        self.index_segment(input_beam)
+
+        intercepts, _ = self.get_intercepts(input_beam, [next_row], bounded=False)
+        intercept = intercepts[0]
+        if np.any(np.isnan(intercept)):
+            output_beams = []
+        else:
+            output_beams = self.scene.interfaces[next_row].interact(
+                input_beam,
+                intercept,
+                self.scene.table.positions[next_row],
+                self.scene.table.normals[next_row],
+                self.scene.transverses[next_row],
+            )
+
+        self.add_outputs(input_beam, next_object, output_beams)
+        if conflicts is not None:
+            self.queue.push(conflicts)
+
+    def add_outputs(
+        self,
+        input_beam: SegmentRecord,
+        next_object: str,
+        output_beams: list[SegmentRecord],
+    ):
+        """
+        Attach the output beams of an interaction and queue them for processing
+
+        Args:
+            input_beam (SegmentRecord): Segment that produced the outputs
+            next_object (str): Name of the object the outputs start at
+            output_beams (list[SegmentRecord]): Output beams
+        """
+
+        # apply caps on the size of the beam tree
+        depth = self.get_depth(input_beam)
+        self.stats.max_depth = max(self.stats.max_depth, depth)
+        if len(output_beams) > 0:
+            if self.max_depth is not None and depth >= self.max_depth:
+                self.stats.truncated_depth += 1
+                output_beams = []
+            elif self.max_segments is not None and (
+                self.alive_count + self.queued_outputs + len(output_beams)
+                > self.max_segments
+            ):
+                self.stats.truncated_segments += 1
+                output_beams = []
+
+        # drop weak branches unless beam children are waiting further down
+        if self.min_power is not None and len(output_beams) > 0:
+            threshold = self.min_power * self.input_power
+            kept = [
+                beam
+                for beam in output_beams
+                if beam.power >= threshold
+                or any(
+                    self.pending.leads_to(int(index))
+                    for index in (
+                        [beam.index] if beam.bundle is None else beam.bundle.indices
+                    )
+                )
+            ]
+            self.stats.pruned_power += len(output_beams) - len(kept)
+            output_beams = kept
+
+        # reuse discarded segments with the same inputs
+        tasks = []
+        for beam in output_beams:
+            beam.start = next_object
+            record, since = self.find_reusable(beam)
+            if record is not None:
+                input_beam.children.append(record)
+                tasks.append(("output", input_beam, record, since))
+            else:
+                beam.parent = input_beam
+                self.depths[id(beam)] = depth + 1
+                input_beam.children.append(beam)
+                tasks.append(("output", input_beam, beam, None))
+
+        # outputs are processed after any conflicts have been re-traced
+        self.queued_outputs += len(tasks)
+        self.queue.extend(tasks, [task[2].power for task in tasks])
+
+    def split_bundle(self, record: SegmentRecord, groups: list[list[int]]):
+        """
+        Split members off a bundle segment into sibling segments
+        The record keeps the first group, every other group is queued as its own segment
+
+        Args:
+            record (SegmentRecord): Bundle segment to split
+            groups (list[list[int]]): Member positions of each resulting segment
+        """
+
+        bundle = record.bundle
+        for group in groups[1:]:
+            sibling = record.derive()
+            sibling.start = record.start
+            sibling.set_bundle(bundle.subset(group))
+            sibling.parent = record.parent
+            if record.parent is not None:
+                record.parent.children.append(sibling)
+            self.depths[id(sibling)] = self.get_depth(record)
+            self.add_record(sibling)
+            self.queue.push(("step", sibling), sibling.power)
+        record.set_bundle(bundle.subset(groups[0]))
+        record.modified = True
+
+    def step_bundle(self, input_beam: SegmentRecord):
+        """
+        Perform a single calculation step for a bundle segment
+        Members are kept together while they hit the same interface and split otherwise
+
+        Args:
+            input_beam (SegmentRecord): Bundle segment to process
+        """
+
+        bundle = input_beam.bundle
+
+        # find the next interface of each member
+        origins, directions, _ = input_beam.rays(bounded=False)
+        rows = np.unique(
+            np.concatenate(
+                [
+                    self.hierarchy.query_ray(origin, direction, np.inf)
+                    for origin, direction in zip(origins, directions)
+                ]
+            )
+        ).astype(int)
+        rows = rows[self.scene.active[rows]]
+        hit_rows = np.full(len(bundle), -1)
+        hit_distances = np.full(len(bundle), np.inf)
+        if len(rows) > 0:
+            _, distances = intersect(self.scene.table, origins, directions, np.inf, rows)
+            closest = np.argmin(distances, axis=1)  # first of equal distances
+            hit_distances = distances[np.arange(len(bundle)), closest]
+            hit_rows = np.where(np.isfinite(hit_distances), rows[closest], -1)
+
+        # members hitting different interfaces continue as separate segments
+        groups = {}
+        for i, row in enumerate(hit_rows):
+            groups.setdefault(row, []).append(i)
+        groups = list(groups.values())
+        if len(groups) > 1:
+            self.split_bundle(input_beam, groups)
+        row = int(hit_rows[groups[0][0]])
+        hit_distances = hit_distances[groups[0]]
+
+        if row < 0:
+            # no more interactions, propagate to the final distance
+            hit_distances = np.full(len(groups[0]), self.scene.final_distance)
+            next_object = None
+        else:
+            next_object = self.scene.owners[row]
+        if input_beam.bundle is not None:
+            input_beam.bundle.distances = hit_distances
+        input_beam.distance = float(hit_distances[0])
+        input_beam.end = next_object
+        input_beam.modified = True
+        self.index_segment(input_beam)
+        if row < 0:
+            return
+
+        # interact member by member and regroup outputs of the same kind
+        interface = self.scene.interfaces[row]
+        outputs = [
+            interface.interact(
+                member,
+                member.end_position,
+                self.scene.table.positions[row],
+                self.scene.table.normals[row],
+                self.scene.transverses[row],
+            )
+            for member in input_beam.members()
+        ]
+        if len(outputs) == 1:
+            output_beams = outputs[0]
+        elif all(len(output) == len(outputs[0]) for output in outputs):
+            output_beams = [SegmentRecord.bundle_of(group) for group in zip(*outputs)]
+        else:
+            output_beams = [beam for output in outputs for beam in output]
+        self.add_outputs(input_beam, next_object, output_beams)
+
+    def process_output(
+        self, input_beam: SegmentRecord, beam: SegmentRecord, since: int = None
+    ):
+        """
+        Add an output beam to the beam tree and queue it for stepping
+
+        Args:
+            input_beam (SegmentRecord): Segment that produced the output
+            beam (SegmentRecord): Output beam
+            since (int): Number of children placed when a reused beam was discarded
+                         (None for new beams)
+        """
+
+        self.queued_outputs -= 1
+        # earlier re-traces may have removed this output
+        if not any(child is beam for child in input_beam.children):
+            return
+        if since is not None:
+            self.resurrect(beam, input_beam, since)
+            return
+        if not beam.alive:
+            return
+        self.add_record(beam)
+        self.queue.push(("step", beam), beam.power)
+
+    def add_record(self, record: SegmentRecord):
+        """
+        Add a live record to the trace
+
+        Args:
+            record (SegmentRecord): Record to add
+        """
+
+        self.records.append(record)
+        self.listed.add(id(record))
+        self.alive_count += 1
+
+
+def trace_scene(
+    scene: TraceScene,
+    policy: str = "depth",
+    max_depth: int = None,
+    max_segments: int = None,
+    min_power: float = None,
+) -> TraceResult:
+    """
+    Trace all loose ends of a scene
+    Defined at module level so scenes can be traced in worker processes
+
+    Args:
+        scene (TraceScene): Scene to trace
+        policy (str): Work queue policy ('depth', 'breadth' or 'power')
+        max_depth (int): Maximum depth of the beam tree (None for no limit)
+        max_segments (int): Maximum number of segments in the beam tree (None for no limit)
+        min_power (float): Minimum relative power of traced beams (None for no limit)
+
+    Returns:
+        result (TraceResult): The traced segments, placed children and queue statistics
+    """
+
+    return Tracer(scene, policy, max_depth, max_segments, min_power=min_power).trace()
+
+
+def trace_ghosts(
+    scene: TraceScene,
+    min_power: float = 1e-6,
+    max_power: float = 0.05,
+    max_segments: int = 10000,
+) -> tuple[list[Ghost], TraceResult]:
+    """
+    Trace every weak branch of a scene down to a power threshold and report where they end
+    The strongest beams are traced first, so when the segment budget runs out
+    only the weakest branches are left untraced
+
+    Args:
+        scene (TraceScene): Scene to trace
+        min_power (float): Branches below this fraction of the input power are not traced
+        max_power (float): Beams below this fraction of the input power are reported as ghosts
+        max_segments (int): Maximum number of segments in the beam tree (None for no limit)
+
+    Returns:
+        ghosts (list[Ghost]): Final segments of weak branches, strongest first
+        result (TraceResult): The full trace
+    """
+
+    tracer = Tracer(scene, "power", None, max_segments, min_power=min_power)
+    result = tracer.trace()
+    threshold = max_power * tracer.input_power
+
+    ghosts = []
+    for record in result.segments:
+        if any(child.alive for child in record.children):
+            continue
+        depth = 0
+        parent = record.parent
+        while parent is not None:
+            depth += 1
+            parent = parent.parent
+        for member in record.members():
+            if member.power >= threshold:
+                continue
+            ghosts.append(
+                Ghost(
+                    index=member.index,
+                    power=member.power,
+                    relative_power=(
+                        member.power / tracer.input_power if tracer.input_power > 0 else 0
+                    ),
+                    start=record.start,
+                    end=record.end,
+                    position=member.end_position,
+                    depth=depth,
+                )
+            )
+
+    ghosts.sort(key=lambda ghost: ghost.power, reverse=True)
+    return ghosts, result
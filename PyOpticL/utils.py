@@ -125,6 +125,48 @@ def collect_children(parent: App.DocumentObject, output_list: list):
             collect_children(child, output_list)
 
 
+def rotation_matrix(rotation: App.Rotation) -> np.ndarray:
+    """
+    Convert a FreeCAD rotation to a numpy rotation matrix
+
+    Args:
+        rotation (App.Rotation): Rotation to convert
+
+    Returns:
+        matrix (np.ndarray): 3x3 rotation matrix
+    """
+
+    return np.array(rotation.toMatrix().A).reshape(4, 4)[:3, :3]
+
+
+def placement_matrix(placement: App.Placement) -> np.ndarray:
+    """
+    Convert a FreeCAD placement to a numpy homogeneous transform
+
+    Args:
+        placement (App.Placement): Placement to convert
+
+    Returns:
+        matrix (np.ndarray): 4x4 transform matrix
+    """
+
+    return np.array(placement.toMatrix().A).reshape(4, 4)
+
+
+def matrix_placement(matrix: np.ndarray) -> App.Placement:
+    """
+    Convert a numpy homogeneous transform to a FreeCAD placement
+
+    Args:
+        matrix (np.ndarray): 4x4 transform matrix without scaling
+
+    Returns:
+        placement (App.Placement): Equivalent placement
+    """
+
+    return App.Placement(App.Matrix(*np.asarray(matrix, dtype=float).ravel()))
+
+
 def wavelength_to_rgb(wl: float) -> tuple:
     """
     Convert a wavelength in nm to an RGB color tuple.
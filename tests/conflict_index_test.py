@@ -0,0 +1,65 @@
+from PyOpticL import optomech
+from PyOpticL.beam_path import BeamPath, BeamSegment
+from PyOpticL.layout import Component
+from PyOpticL.utils import Dimension as dim
+
+mirror = optomech.circular_mirror(
+    diameter=dim(0.5, "in"),
+    thickness=dim(5, "mm"),
+    mount_definition=optomech.mirror_mount_k05s1(drill_depth=dim(1, "in")),
+)
+
+baseplate = Component(
+    label="Baseplate",
+    definition=optomech.baseplate(
+        dimensions=(dim(12, "in"), dim(5, "in"), dim(1, "in")),
+        optical_height=dim(0.5, "in"),
+    ),
+)
+
+# two beam paths far apart on the same baseplate, both indexed by their traces
+beam_paths, mirrors = [], []
+for i in range(2):
+    beam_path = baseplate.add(
+        BeamPath(label=f"Beam Path {i + 1}", waist=dim(1, "mm"), wavelength=780),
+        position=(dim(1 + 9 * i, "in"), 0, 0),
+        rotation=(0, 0, 90),
+    )
+    mirrors.append(
+        beam_path.add(
+            Component(label=f"Mirror {i + 1}", definition=mirror),
+            beam_index=0b1,
+            distance=dim(2, "in"),
+            rotation=(0, 0, -45 if i == 0 else 45),
+        )
+    )
+    beam_paths.append(beam_path)
+
+baseplate.recompute()
+
+# the conflict pass for the first mirror only queries the segment index of the baseplate
+reads, retraces = [], []
+to_record, retrace = BeamSegment.to_record, BeamPath.retrace
+
+
+def counted_to_record(self, placement=None):
+    reads.append(self.get_object().Name)
+    return to_record(self, placement)
+
+
+def counted_retrace(self, names):
+    retraces.append(self.get_object().Label)
+    retrace(self, names)
+
+
+BeamSegment.to_record = counted_to_record
+BeamPath.retrace = counted_retrace
+try:
+    beam_paths[0].handle_conflicts(mirrors[0].get_object())
+finally:
+    BeamSegment.to_record = to_record
+    BeamPath.retrace = retrace
+
+assert retraces == [], f"Placing a distant child re-traced {retraces}"
+assert reads == [], f"Placing a distant child read segments {reads}"
+print("Placing a distant child did not read or re-trace any segments")
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# the package is used from the repository without being installed
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# the *_test.py scripts build FreeCAD documents and are run inside FreeCAD
+collect_ignore_glob = ["*_test.py"]
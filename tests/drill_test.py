@@ -0,0 +1,46 @@
+import FreeCAD as App
+import Part
+
+from PyOpticL.layout import get_drill_tools
+
+
+def drill_sequentially(shape, drill_shapes):
+    """Drilling as done before tools were batched, one cut per drill"""
+
+    for drill_shape in drill_shapes:
+        if shape.common(drill_shape).Volume < 1e-6 or drill_shape.Volume < 1e-6:
+            continue
+        z_direction = drill_shape.Placement.Rotation.inverted().multVec(
+            App.Vector(0, 0, 1)
+        )
+        for face in drill_shape.Faces:
+            if (
+                isinstance(face.Surface, Part.Plane)
+                and face.normalAt(0, 0).getAngle(z_direction) < 1e-6
+                and face.common(shape).Area > 1e-6
+            ):
+                extrusion = face.extrude(shape.BoundBox.DiagonalLength * z_direction)
+                drill_shape = drill_shape.fuse(extrusion)
+        shape = shape.cut(drill_shape)
+    return shape
+
+
+plate = Part.makeBox(100, 100, 10)
+drills = [
+    # closed pocket inside the plate
+    Part.makeBox(40, 40, 4, App.Vector(20, 20, 2)),
+    # drill whose top face lies inside the earlier pocket, the roof above it is kept
+    Part.makeCylinder(5, 3, App.Vector(40, 40, 1)),
+    # drill whose top face lies in material, everything above it is cleared
+    Part.makeCylinder(3, 3, App.Vector(80, 80, 5)),
+    # drill that misses the plate
+    Part.makeCylinder(3, 3, App.Vector(200, 200, 0)),
+]
+
+expected = drill_sequentially(plate, drills)
+result = plate.cut(get_drill_tools(plate, drills))
+
+assert abs(result.Volume - expected.Volume) < 1e-6, (result.Volume, expected.Volume)
+assert result.isInside(App.Vector(40, 40, 8), 1e-6, False), "Roof of the pocket was removed"
+assert not result.isInside(App.Vector(80, 80, 9), 1e-6, True), "Drill was not cleared upwards"
+print("Batched drilling matches sequential drilling")
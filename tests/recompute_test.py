@@ -0,0 +1,65 @@
+from PyOpticL import optomech
+from PyOpticL.beam_path import BeamPath
+from PyOpticL.layout import Component
+from PyOpticL.profiling import start_profiling, stop_profiling
+from PyOpticL.utils import Dimension as dim
+
+mirror = optomech.circular_mirror(
+    diameter=dim(0.5, "in"),
+    thickness=dim(5, "mm"),
+    mount_definition=optomech.mirror_mount_k05s1(drill_depth=dim(1, "in")),
+)
+
+baseplate = Component(
+    label="Baseplate",
+    definition=optomech.baseplate(
+        dimensions=(dim(8, "in"), dim(5, "in"), dim(1, "in")),
+        optical_height=dim(0.5, "in"),
+    ),
+)
+
+# two beam paths bound to the same baseplate
+beam_paths = []
+for i, wavelength in enumerate((670, 780)):
+    beam_path = baseplate.add(
+        BeamPath(
+            label=f"Beam Path {i + 1}",
+            waist=dim(1, "mm"),
+            wavelength=wavelength,
+        ),
+        position=(dim(2 + 3 * i, "in"), 0, 0),
+        rotation=(0, 0, 90),
+    )
+    beam_path.add(
+        Component(label=f"Mirror {i + 1}", definition=mirror),
+        beam_index=0b1,
+        distance=dim(2, "in"),
+        rotation=(0, 0, -45),
+    )
+    beam_paths.append(beam_path)
+
+baseplate.recompute()
+print("Initial recompute done")
+
+# a second recompute of an unchanged layout must not trace, place or drill anything
+start_profiling()
+baseplate.recompute()
+profile = stop_profiling()
+assert not baseplate.is_dirty(), "Layout is still dirty after recompute"
+assert profile.timings == {}, f"Unchanged layout was recomputed:\n{profile.summary()}"
+print("Second recompute did nothing")
+
+# moving a beam path re-traces it, after which the layout settles again
+placement = beam_paths[0].get_object().BasePlacement
+placement.Base.y = dim(0.5, "in")
+beam_paths[0].get_object().BasePlacement = placement
+start_profiling()
+baseplate.recompute()
+profile = stop_profiling()
+assert "Beam Path 1" in profile.to_dict()["scopes"], "Moved beam path was not re-traced"
+
+start_profiling()
+baseplate.recompute()
+profile = stop_profiling()
+assert profile.timings == {}, f"Layout did not settle:\n{profile.summary()}"
+print("Moved beam path was re-traced and the layout settled")
@@ -0,0 +1,103 @@
+"""Synthetic trace scenes shared by the tests of the headless trace modules"""
+
+import numpy as np
+
+from PyOpticL.trace import ChildSpec, SegmentRecord, TraceScene
+
+
+class Interface:
+    """Minimal interface with the attributes read by the tracer"""
+
+    shape = "circular"
+    diameter = 50
+    max_angle = 90
+    single_sided = False
+
+
+class PartialReflector(Interface):
+    def __init__(self, reflectivity):
+        self.reflectivity = reflectivity
+
+    def interact(self, beam, intercept, position, normal, transverse):
+        direction = beam.direction - 2 * np.dot(beam.direction, normal) * normal
+        return [
+            beam.derive(
+                index=beam.index << 1,
+                position=intercept,
+                power=beam.power * (1 - self.reflectivity),
+            ),
+            beam.derive(
+                index=(beam.index << 1) + 1,
+                position=intercept,
+                direction=direction,
+                power=beam.power * self.reflectivity,
+            ),
+        ]
+
+
+class Mirror(Interface):
+    def interact(self, beam, intercept, position, normal, transverse):
+        direction = beam.direction - 2 * np.dot(beam.direction, normal) * normal
+        return [beam.derive(position=intercept, direction=direction)]
+
+
+class Dump(Interface):
+    def interact(self, beam, intercept, position, normal, transverse):
+        return []
+
+
+def make_root(index=1, position=(0, 0, 0), direction=(1, 0, 0)):
+    return SegmentRecord(index, position, direction, 635, [1, 0], 1, -50, 500)
+
+
+def make_ladder(segments=None):
+    """Two parallel partial reflectors, which bounce ghosts between them indefinitely"""
+
+    return TraceScene(
+        interfaces=[PartialReflector(0.04), PartialReflector(0.04)],
+        owners=["W1", "W2"],
+        positions=[[10, 0, 0], [20, 0, 0]],
+        normals=[[1, 0, 0], [1, 0, 0]],
+        transverses=[[0, 1, 0]] * 2,
+        active=[True, True],
+        children=[],
+        segments=[make_root()] if segments is None else segments,
+        bound_base=np.zeros(3),
+        bound_rotation=np.eye(3),
+        final_distance=50,
+    )
+
+
+def make_child_scene(bound=True, end=None):
+    """
+    A mirror placed on beam 1 and a crossing beam 2 that passes its final position,
+    both beams end at the end interface (a dump by default)
+    """
+
+    child = ChildSpec(
+        name="M",
+        label="Mirror",
+        beam_index=1,
+        after_object=None,
+        constraint_type="distance",
+        constraint_value=20,
+        offset=[0, 0, 0],
+        base=[0, 0, 0],
+        rows=[0],
+        interface_row=0,
+        interface_offset=[0, 0, 0],
+        bound=bound,
+    )
+    return TraceScene(
+        interfaces=[Mirror(), Dump() if end is None else end],
+        owners=["M", "D"],
+        positions=[[0, 0, 0], [20, 40, 0]],
+        normals=[np.array([-1, 1, 0]) / np.sqrt(2), [0, -1, 0]],
+        transverses=[[0, 0, 1]] * 2,
+        active=[False, True],
+        children=[child],
+        segments=[make_root(1), make_root(2, (20, -30, 0), (0, 1, 0))],
+        bound_base=np.zeros(3),
+        bound_rotation=np.eye(3),
+        final_distance=50,
+    )
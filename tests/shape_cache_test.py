@@ -0,0 +1,46 @@
+import math
+
+import FreeCAD as App
+import Part
+
+from PyOpticL.shape_cache import ShapeCache, quantize
+
+builds = []
+
+
+def box(size):
+    def build():
+        builds.append(size)
+        return Part.makeBox(size, 1, 1)
+
+    return build
+
+
+# least recently used shapes are evicted first
+cache = ShapeCache(max_size=2)
+cache.get((1,), box(1))
+cache.get((2,), box(2))
+cache.get((1,), box(1))
+cache.get((3,), box(3))
+assert len(cache) == 2 and (2,) not in cache.shapes, list(cache.shapes)
+cache.get((1,), box(1))
+cache.get((2,), box(2))
+assert builds == [1, 2, 3, 2], builds
+assert (cache.hits, cache.misses) == (2, 4), (cache.hits, cache.misses)
+
+# cached shapes are copies, moving one does not move the cached shape
+shape = cache.get((2,), box(2))
+shape.Placement = App.Placement(App.Vector(5, 0, 0), App.Rotation())
+assert cache.get((2,), box(2)).BoundBox.XMin == 0
+
+# segment lengths that went through placement math give the same key
+distance = 25.4 * 3.7
+for angle in range(0, 360, 7):
+    rotation = App.Rotation(App.Vector(0, 0, 1), angle)
+    placement = App.Placement(App.Vector(1.3, -2.9, 0.7), rotation)
+    start = placement.multVec(App.Vector(0, 0, 0))
+    end = placement.multVec(App.Vector(distance, 0, 0))
+    assert quantize((end - start).Length) == quantize(distance), angle
+    direction = rotation.multVec(App.Vector(math.cos(0.1), math.sin(0.1), 0))
+    assert quantize(direction.Length) == quantize(1), angle
+print("Shape cache evicts least recently used shapes and keys are stable under round-off")
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from PyOpticL.abcd import AbcdChain, free_space, get_waist, propagate, thin_lens
+
+
+def trace_q(q_param, distances, focal_lengths):
+    """Scalar q-parameter trace through free space and thin lenses"""
+
+    for distance, focal_length in zip(distances, focal_lengths):
+        q_param = q_param + distance
+        q_param = 1 / (1 / q_param - 1 / focal_length)
+    return q_param
+
+
+def test_free_space_then_thin_lens():
+    q_param = -30 + 200j
+    matrix = thin_lens(100) @ free_space(50)
+    np.testing.assert_allclose(
+        propagate(matrix, q_param), trace_q(q_param, [50], [100])
+    )
+
+
+def test_focused_waist():
+    # a collimated beam is focused slightly before the focal plane
+    wavelength, z_R, f = 780, 1000.0, np.array([50.0, 100.0, 200.0])
+    waist = get_waist(propagate(thin_lens(f), 1j * z_R), wavelength)
+
+    np.testing.assert_allclose(waist.waist_position, f * z_R**2 / (z_R**2 + f**2))
+    np.testing.assert_allclose(waist.rayleigh_range, f**2 * z_R / (z_R**2 + f**2))
+    np.testing.assert_allclose(
+        waist.waist, np.sqrt(wavelength * 1e-6 * waist.rayleigh_range / np.pi)
+    )
+
+
+def test_chain_sweep():
+    q_param = 10 + 300j
+    lenses = [(1, 0, -1 / 75, 1), (1, 0, -1 / 150, 1)]
+    chain = AbcdChain(q_param, 780, [40, 120], lenses, labels=["L1", "L2"])
+    assert len(chain) == 2
+
+    waist = chain.sweep()
+    assert waist.q_param == pytest.approx(trace_q(q_param, [40, 120], [75, 150]))
+
+    # sweep the lens spacing and the second focal length on a grid
+    spacing = np.linspace(80, 160, 5)[:, None]
+    focal_lengths = np.array([100.0, 150.0, 200.0])
+    waist = chain.sweep(distances={1: spacing}, focal_lengths={"L2": focal_lengths})
+    assert waist.q_param.shape == (5, 3)
+    for i, j in np.ndindex(5, 3):
+        assert waist.q_param[i, j] == pytest.approx(
+            trace_q(q_param, [40, spacing[i, 0]], [75, focal_lengths[j]])
+        )
+
+    with pytest.raises(ValueError):
+        chain.sweep(focal_lengths={"L3": 100})
+    with pytest.raises(ValueError):
+        AbcdChain(q_param, 780, [40], lenses)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scenes import make_child_scene
+
+from PyOpticL.alignment import AlignmentSolver, AlignmentVariable, axis_angle_matrix
+
+
+def make_solver(position, direction=None):
+    """Align the beam reflected by the placed mirror onto the dump 40 mm above the beam"""
+
+    return AlignmentSolver(
+        make_child_scene(),
+        [
+            AlignmentVariable("M", "rotation", axis=(0, 0, 1)),
+            AlignmentVariable("M", "constraint"),
+        ],
+        target="D",
+        position=position,
+        direction=direction,
+        beam_index=1,
+    )
+
+
+def test_axis_angle_matrix():
+    np.testing.assert_allclose(
+        axis_angle_matrix([0, 0, 2], 90) @ [1, 0, 0], [0, 1, 0], atol=1e-12
+    )
+    np.testing.assert_allclose(axis_angle_matrix([1, 1, 1], 0), np.eye(3))
+
+
+def test_initial_residuals():
+    solver = make_solver(position=(0, 0))
+    values = solver.get_initial_values()
+    np.testing.assert_array_equal(values, [0, 20])
+    # the nominal beam hits the dump center at normal incidence
+    np.testing.assert_allclose(solver.get_residuals(values), 0, atol=1e-9)
+
+
+def test_converges():
+    # turning the mirror by an angle turns the reflected beam by twice that angle
+    angle, distance = 1.0, 30.0
+    turned = np.deg2rad(2 * angle)
+    direction = np.array([-np.sin(turned), np.cos(turned), 0])
+    offset = distance - 40 * np.tan(turned) - 20
+
+    # target positions are (transverse, normal x transverse) = (z, -x) on the dump
+    solver = make_solver(position=(0, -offset), direction=direction)
+    result = solver.solve(tolerance=1e-9)
+
+    assert result.converged and not result.stalled
+    np.testing.assert_allclose(result.values, [angle, distance], atol=1e-6)
+    assert np.linalg.norm(result.residuals) < 1e-9
+    assert result.evaluations < 50
+    assert result.evaluations == solver.evaluations
+
+
+def test_stalls_on_unreachable_target():
+    # every beam stays in the xy plane, so a target above it cannot be reached
+    result = make_solver(position=(5, 0)).solve(max_iterations=20)
+
+    assert not result.converged and result.stalled
+    assert result.iterations < 20
+    assert np.linalg.norm(result.residuals) == pytest.approx(5, abs=1e-6)
+
+
+def test_missed_target():
+    # beam 2 still reaches the dump, but only the reflection of beam 1 is aligned
+    solver = make_solver(position=(0, 0))
+    with pytest.raises(RuntimeError):
+        solver.get_residuals(np.array([0.0, 50.0]))
+    with pytest.raises(ValueError):
+        AlignmentSolver(make_child_scene(), [], target="X")
+    with pytest.raises(ValueError):
+        AlignmentVariable("M", "position")
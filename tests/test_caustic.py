@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from PyOpticL.caustic import beam_radius, gouy_phase, sample_caustic, wavefront_curvature
+
+
+def test_single_beam():
+    wavelength, z_R = 780, 500.0
+    w_0 = np.sqrt(wavelength * 1e-6 * z_R / np.pi)
+    q_params = np.array([-z_R, 0, z_R]) + 1j * z_R
+
+    np.testing.assert_allclose(
+        beam_radius(q_params, wavelength), [np.sqrt(2) * w_0, w_0, np.sqrt(2) * w_0]
+    )
+    # the radius of curvature is smallest (2 z_R) at the Rayleigh range
+    np.testing.assert_allclose(
+        wavefront_curvature(q_params), [-1 / (2 * z_R), 0, 1 / (2 * z_R)]
+    )
+    np.testing.assert_allclose(gouy_phase(q_params), [-np.pi / 4, 0, np.pi / 4])
+    assert beam_radius(1j * z_R, wavelength) == pytest.approx(w_0)
+
+
+def test_chain_matches_segments():
+    # a beam refocused halfway, samples within each segment match the segment alone
+    q_params = np.array([-100 + 200j, -50 + 80j])
+    lengths = np.array([150.0, 100.0])
+    z = np.linspace(0, 250, 26)
+    caustic = sample_caustic(q_params, [780, 780], lengths, z)
+
+    np.testing.assert_array_equal(caustic.segment, (z >= 150).astype(int))
+    local = np.where(z < 150, q_params[0] + z, q_params[1] + z - 150)
+    np.testing.assert_allclose(caustic.radius, beam_radius(local, 780))
+    np.testing.assert_allclose(caustic.curvature, wavefront_curvature(local))
+
+    # the Gouy phase is continuous across segments and starts at zero
+    first = gouy_phase(q_params[0] + 150) - gouy_phase(q_params[0])
+    expected = np.where(
+        z < 150,
+        gouy_phase(local) - gouy_phase(q_params[0]),
+        first + gouy_phase(local) - gouy_phase(q_params[1]),
+    )
+    np.testing.assert_allclose(caustic.gouy_phase, expected)
+    assert caustic.gouy_phase[0] == 0
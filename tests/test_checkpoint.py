@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from scenes import PartialReflector, make_child_scene
+
+from PyOpticL.checkpoint import (
+    CHECKPOINT_VERSION,
+    FINGERPRINT_TOLERANCE,
+    decode_result,
+    encode_result,
+    load_trace,
+    save_trace,
+    scene_fingerprint,
+)
+from PyOpticL.trace import SegmentRecord, TraceResult, Tracer
+
+
+def trace_with_removed_segments():
+    """Trace a scene where the crossing beam is cut short after its branches were traced"""
+
+    scene = make_child_scene(end=PartialReflector(0.5))
+    root, crossing = scene.segments
+    result = Tracer(scene).trace(seeds=[crossing, root])
+
+    # a bundle leaving the end of the root, as traced with combined outputs
+    reflected = root.children[0]
+    split = reflected.derive(index=0b10, direction=[1, 0, 0], power=0.25)
+    bundle = SegmentRecord.bundle_of([reflected.derive(power=0.25), split])
+    bundle.bundle.distances = np.array([5.0, 7.0])
+    bundle.distance, bundle.start = 5.0, "M"
+    bundle.parent = root
+    root.children.append(bundle)
+    result.records.append(bundle)
+    return result
+
+
+def record_state(record, rows):
+    """Everything stored for a record, with references replaced by record rows"""
+
+    state = {
+        key: value
+        for key, value in vars(record).items()
+        if key not in ("parent", "children", "bundle")
+    }
+    state["parent"] = rows.get(id(record.parent), -1)
+    state["children"] = [rows[id(child)] for child in record.children]
+    if record.bundle is not None:
+        state["bundle"] = {
+            key: value.tolist() for key, value in vars(record.bundle).items()
+        }
+    for key, value in state.items():
+        if isinstance(value, np.ndarray):
+            state[key] = value.tolist()
+    return state
+
+
+def result_state(result):
+    rows = {id(record): i for i, record in enumerate(result.records)}
+    records = [record_state(record, rows) for record in result.records]
+    placed = []
+    for child in result.placed:
+        state = dict(vars(child))
+        for key, value in state.items():
+            if isinstance(value, np.ndarray):
+                state[key] = value.tolist()
+        placed.append(state)
+    return records, placed, vars(result.stats)
+
+
+def test_round_trip():
+    result = trace_with_removed_segments()
+    detached = [
+        record
+        for record in result.records
+        if record.parent is not None
+        and not any(child is record for child in record.parent.children)
+    ]
+    assert len(detached) > 0
+    assert any(record.bundle is not None for record in result.records)
+    assert len(result.placed) == 1 and result.placed[0].placed
+
+    decoded = decode_result(encode_result(result))
+    assert result_state(decoded) == result_state(result)
+
+
+def test_empty_round_trip():
+    decoded = decode_result(encode_result(TraceResult([], [])))
+    assert decoded.records == [] and decoded.placed == []
+    assert decoded.stats.policy == "depth"
+
+
+def test_fingerprint():
+    fingerprint = scene_fingerprint(make_child_scene(), policy="depth")
+    assert fingerprint == scene_fingerprint(make_child_scene(), policy="depth")
+    assert fingerprint != scene_fingerprint(make_child_scene(), policy="breadth")
+
+    # round-off well below the tolerance keeps the fingerprint
+    scene = make_child_scene()
+    scene.table.positions[1] += [0, 1e-3 * FINGERPRINT_TOLERANCE, 0]
+    scene.table.normals[0] *= 1 + 1e-15
+    assert scene_fingerprint(scene, policy="depth") == fingerprint
+
+    # moving a single interface by more than the tolerance changes it
+    scene = make_child_scene()
+    scene.table.positions[1] += [0, 10 * FINGERPRINT_TOLERANCE, 0]
+    assert scene_fingerprint(scene, policy="depth") != fingerprint
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    result = trace_with_removed_segments()
+    save_trace(tmp_path, "scene", result)
+    assert list(tmp_path.iterdir()) == [tmp_path / "scene.npz"]
+    assert result_state(load_trace(tmp_path, "scene")) == result_state(result)
+    assert load_trace(tmp_path, "missing") is None
+
+    # checkpoints written by another version are rejected
+    monkeypatch.setattr(
+        "PyOpticL.checkpoint.CHECKPOINT_VERSION", CHECKPOINT_VERSION + 1
+    )
+    save_trace(tmp_path, "other", result)
+    monkeypatch.undo()
+    assert load_trace(tmp_path, "other") is None
+    assert load_trace(tmp_path, "scene") is not None
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from scenes import PartialReflector, make_child_scene
+
+from PyOpticL.export import COLUMNS, TraceWriter, read_trace
+from PyOpticL.trace import Tracer
+
+
+def trace_with_writer(filename, chunk_size):
+    """Trace a scene where the crossing beam and its branches are re-traced"""
+
+    scene = make_child_scene(end=PartialReflector(0.5))
+    root, crossing = scene.segments
+    with TraceWriter(filename, chunk_size=chunk_size, parquet=False) as writer:
+        # the crossing beam is traced before the mirror is placed on it
+        result = Tracer(scene, writer=writer).trace(seeds=[crossing, root])
+    return result, writer
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4096])
+def test_round_trip(tmp_path, chunk_size):
+    result, writer = trace_with_writer(tmp_path / "trace.npz", chunk_size)
+    removed = [record for record in result.records if not record.alive]
+    assert len(removed) > 0
+    assert writer.chunks == -(-writer.rows // chunk_size)
+
+    columns = read_trace(tmp_path / "trace.npz", final=True)
+    assert set(columns) == {name for name, _ in COLUMNS}
+    assert len(columns["segment"]) == len(result.segments)
+    assert np.all(columns["alive"])
+
+    # final rows hold the final state of every live segment
+    rows = sorted(
+        zip(
+            columns["index"],
+            columns["start"],
+            columns["end"],
+            np.round(columns["distance"], 9),
+            np.round(columns["direction_x"], 9),
+            np.round(columns["direction_y"], 9),
+        )
+    )
+    expected = sorted(
+        (
+            record.index,
+            record.start or "",
+            record.end or "",
+            round(record.distance, 9),
+            round(record.direction[0], 9),
+            round(record.direction[1], 9),
+        )
+        for record in result.segments
+    )
+    assert rows == expected
+
+    # every row is kept without final, including the rows of removed segments
+    columns = read_trace(tmp_path / "trace.npz", final=False)
+    np.testing.assert_array_equal(columns["row"], np.arange(writer.rows))
+    assert np.sum(~columns["alive"]) == len(removed)
+    assert len(np.unique(columns["segment"])) == len(result.records)
+
+
+def test_chunks_written_before_close(tmp_path):
+    scene = make_child_scene()
+    writer = TraceWriter(tmp_path / "trace.npz", chunk_size=1, parquet=False)
+    result = Tracer(scene, writer=writer).trace()
+    assert writer.chunks == writer.rows
+    assert all(len(column) == 0 for column in writer.buffer.values())
+    writer.close()
+    assert len(read_trace(tmp_path / "trace.npz")["segment"]) == len(result.segments)
+
+
+def test_empty_trace(tmp_path):
+    TraceWriter(tmp_path / "empty.npz", parquet=False).close()
+    columns = read_trace(tmp_path / "empty.npz")
+    for name, dtype in COLUMNS:
+        assert len(columns[name]) == 0
+        assert columns[name].dtype == np.array([], dtype=dtype).dtype
+
+
+def test_write_after_close(tmp_path):
+    scene = make_child_scene()
+    writer = TraceWriter(tmp_path / "trace.npz", parquet=False)
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write(scene.segments[0])
@@ -0,0 +1,185 @@
+import numpy as np
+import pytest
+
+from PyOpticL.intersect import InterfaceTable, intersect
+
+
+class Interface:
+    """Minimal interface with the attributes read by InterfaceTable.from_interfaces"""
+
+    def __init__(
+        self,
+        shape="circular",
+        diameter=10.0,
+        width=10.0,
+        height=10.0,
+        max_angle=90.0,
+        single_sided=False,
+    ):
+        self.shape = shape
+        self.diameter = diameter
+        self.width = width
+        self.height = height
+        self.max_angle = max_angle
+        self.single_sided = single_sided
+
+
+def get_intercept(interface, position, normal, beam_position, beam_direction, beam_distance):
+    """Scalar transcription of the rules of Interface.get_intercept"""
+
+    incident_angle = abs(np.arccos(np.clip(np.dot(normal, -beam_direction), -1, 1)))
+    if not interface.single_sided and incident_angle > np.pi / 2:
+        incident_angle -= np.pi
+    if incident_angle > np.deg2rad(interface.max_angle):
+        return None
+
+    denom = np.dot(normal, beam_direction)
+    if np.abs(denom) < 1e-6:
+        return None
+
+    distance = np.dot(normal, position - beam_position) / denom
+    if distance < 0:
+        return None
+    if -1e-6 < distance < 1e-6:
+        return None
+    if distance > beam_distance:
+        return None
+
+    intercept = beam_position + distance * beam_direction
+
+    offset = intercept - position
+    if interface.shape == "circular":
+        if np.linalg.norm(offset) > interface.diameter / 2:
+            return None
+    elif interface.shape == "rectangular":
+        if abs(offset[0]) > interface.width / 2 or abs(offset[1]) > interface.height / 2:
+            return None
+
+    return intercept
+
+
+def random_scene(rng, count):
+    interfaces = [
+        Interface(
+            shape=rng.choice(["circular", "rectangular"]),
+            diameter=rng.uniform(2, 20),
+            width=rng.uniform(2, 20),
+            height=rng.uniform(2, 20),
+            max_angle=rng.choice([30.0, 60.0, 90.0]),
+            single_sided=bool(rng.random() < 0.3),
+        )
+        for _ in range(count)
+    ]
+    positions = rng.uniform(-20, 20, (count, 3))
+    normals = rng.normal(size=(count, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return interfaces, positions, normals
+
+
+def random_rays(rng, count):
+    origins = rng.uniform(-30, 30, (count, 3))
+    # aim most rays near the scene so that hits are common
+    targets = rng.uniform(-20, 20, (count, 3))
+    directions = targets - origins
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    max_distances = np.where(rng.random(count) < 0.5, np.inf, rng.uniform(5, 60, count))
+    return origins, directions, max_distances
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_get_intercept(seed):
+    rng = np.random.default_rng(seed)
+    interfaces, positions, normals = random_scene(rng, 40)
+    origins, directions, max_distances = random_rays(rng, 200)
+    table = InterfaceTable.from_interfaces(interfaces, positions, normals)
+
+    intercepts, ranges = intersect(table, origins, directions, max_distances)
+
+    hits = 0
+    for i in range(len(origins)):
+        for j, interface in enumerate(interfaces):
+            expected = get_intercept(
+                interface,
+                positions[j],
+                normals[j],
+                origins[i],
+                directions[i],
+                max_distances[i],
+            )
+            if expected is None:
+                assert np.all(np.isnan(intercepts[i, j]))
+                assert ranges[i, j] == np.inf
+            else:
+                hits += 1
+                np.testing.assert_allclose(intercepts[i, j], expected, atol=1e-9)
+                assert ranges[i, j] == pytest.approx(
+                    np.linalg.norm(expected - origins[i])
+                )
+    assert hits > 0
+
+
+def test_rows_subset_and_single_ray():
+    rng = np.random.default_rng(10)
+    interfaces, positions, normals = random_scene(rng, 12)
+    origins, directions, _ = random_rays(rng, 30)
+    table = InterfaceTable.from_interfaces(interfaces, positions, normals)
+
+    _, all_ranges = intersect(table, origins, directions)
+    rows = [7, 2, 11]
+    _, ranges = intersect(table, origins, directions, rows=rows)
+    np.testing.assert_array_equal(ranges, all_ranges[:, rows])
+
+    intercept, single = intersect(table, origins[0], directions[0], rows=rows)
+    assert intercept.shape == (3, 3)
+    np.testing.assert_array_equal(single, all_ranges[0, rows])
+
+
+def test_edge_cases():
+    table = InterfaceTable.from_interfaces(
+        [
+            Interface(),
+            Interface(single_sided=True),
+            Interface(max_angle=30),
+            Interface(shape="rectangular", width=4, height=2),
+        ],
+        positions=[[10, 0, 0], [10, 0, 0], [10, 0, 0], [10, 0, 0]],
+        normals=[[-1, 0, 0], [1, 0, 0], [-1, 0, 0], [0, 0, 1]],
+    )
+
+    def ranges(origin, direction, max_distance=np.inf):
+        return intersect(table, origin, direction, max_distance)[1]
+
+    # head on: two sided passes, single sided facing away blocks, rectangle is edge on
+    np.testing.assert_array_equal(
+        ranges([0, 0, 0], [1, 0, 0]), [10, np.inf, 10, np.inf]
+    )
+    # behind the origin and beyond the maximum distance
+    assert np.all(np.isinf(ranges([20, 0, 0], [1, 0, 0])))
+    assert np.all(np.isinf(ranges([0, 0, 0], [1, 0, 0], 9.5)))
+    # starting on the interface plane does not hit it again
+    assert np.all(np.isinf(ranges([10, 0, 0], [1, 0, 0])[:3]))
+    # outside the max angle of the third interface
+    direction = np.array([1, np.tan(np.deg2rad(40)), 0])
+    direction /= np.linalg.norm(direction)
+    result = ranges(np.array([10, 0, 0]) - 10 * direction / direction[0], direction)
+    assert np.isfinite(result[0]) and np.isinf(result[2])
+    # rectangle bounds apply to the global x and y offsets
+    assert np.isfinite(ranges([11.9, 0.9, 5], [0, 0, -1])[3])
+    assert np.isinf(ranges([12.1, 0, 5], [0, 0, -1])[3])
+    assert np.isinf(ranges([10, 1.1, 5], [0, 0, -1])[3])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_bounds_contain_intercepts(seed):
+    rng = np.random.default_rng(seed)
+    interfaces, positions, normals = random_scene(rng, 30)
+    origins, directions, max_distances = random_rays(rng, 300)
+    table = InterfaceTable.from_interfaces(interfaces, positions, normals)
+
+    intercepts, ranges = intersect(table, origins, directions, max_distances)
+    lower, upper = table.bounds()
+    hit = np.isfinite(ranges)
+    assert np.any(hit)
+    rays, rows = np.nonzero(hit)
+    points = intercepts[rays, rows]
+    assert np.all(points >= lower[rows]) and np.all(points <= upper[rows])
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from PyOpticL.jones import JonesPath, linear_states, polarizer_matrix, waveplate_matrix
+
+
+def test_half_wave_plate():
+    horizontal, vertical = linear_states([0, 90])
+    output = waveplate_matrix(0.5, 45) @ horizontal
+    # equal up to a global phase
+    assert abs(np.vdot(vertical, output)) == pytest.approx(1)
+
+    # a half-wave plate rotates linear polarization by twice its angle
+    angles = np.linspace(0, 90, 7)
+    outputs = (waveplate_matrix(0.5, angles) @ horizontal[:, None])[..., 0]
+    overlaps = np.abs(np.sum(linear_states(2 * angles).conj() * outputs, axis=-1))
+    np.testing.assert_allclose(overlaps, 1)
+
+
+def test_quarter_wave_plate():
+    output = waveplate_matrix(0.25, 45) @ linear_states(0)
+    # circular polarization, equal amplitudes a quarter wave apart
+    np.testing.assert_allclose(np.abs(output), np.sqrt(0.5))
+    assert np.angle(output[1] / output[0]) == pytest.approx(-np.pi / 2)
+    # two quarter-wave plates make a half-wave plate
+    np.testing.assert_allclose(
+        waveplate_matrix(0.25, 30) @ waveplate_matrix(0.25, 30),
+        waveplate_matrix(0.5, 30),
+        atol=1e-12,
+    )
+
+
+def test_polarizer():
+    matrix = polarizer_matrix(30)
+    np.testing.assert_allclose(matrix @ matrix, matrix, atol=1e-12)
+    # Malus's law
+    angles = np.array([0, 30, 60, 90])
+    outputs = (matrix @ linear_states(angles)[..., None])[..., 0]
+    np.testing.assert_allclose(
+        np.sum(np.abs(outputs) ** 2, axis=-1), np.cos(np.radians(angles - 30)) ** 2
+    )
+
+
+def test_path_split_ratio():
+    path = JonesPath(
+        [waveplate_matrix(0.5, 0), polarizer_matrix(0)],
+        labels=["HWP", "Polarizer"],
+        retardances=[0.5, None],
+    )
+    assert len(path) == 2
+
+    # the polarizer passes the horizontal part of the rotated beam
+    angles = np.linspace(0, 45, 10)
+    reflected, transmitted = path.split_ratio(
+        linear_states(0), 0, waveplate_angles={"HWP": angles}
+    )
+    np.testing.assert_allclose(
+        reflected, np.cos(np.radians(2 * angles)) ** 2, atol=1e-12
+    )
+    np.testing.assert_allclose(transmitted, 0, atol=1e-12)
+
+    # sweeping by element number matches sweeping by label
+    np.testing.assert_allclose(
+        path.propagate(linear_states(0), {0: angles}),
+        path.propagate(linear_states(0), {"HWP": angles}),
+    )
+    with pytest.raises(ValueError):
+        path.get_matrix({"Polarizer": 10})
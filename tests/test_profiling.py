@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pytest
+from scenes import make_ladder
+
+from PyOpticL.intersect import intersect
+from PyOpticL.profiling import (
+    Profile,
+    count,
+    get_profile,
+    profile_scope,
+    profiled,
+    start_profiling,
+    stop_profiling,
+)
+from PyOpticL.trace import Tracer
+
+
+@pytest.fixture(autouse=True)
+def no_profile():
+    stop_profiling()
+    yield
+    stop_profiling()
+
+
+@profiled("double")
+def double(value):
+    return 2 * value
+
+
+@profiled("fail")
+def fail():
+    raise ValueError("failed")
+
+
+def test_disabled():
+    assert get_profile() is None
+    assert double(3) == 6
+    count("things", 5)
+    with profile_scope("scope"):
+        assert double(4) == 8
+    with pytest.raises(ValueError):
+        fail()
+    assert get_profile() is None
+    assert double.__name__ == "double"
+
+
+def test_scopes_and_counters():
+    profile = start_profiling()
+    assert get_profile() is profile
+
+    double(1)
+    count("things")
+    with profile_scope("Beam Path"):
+        double(2)
+        double(3)
+        count("things", 4)
+        with profile_scope("Other Path"):
+            double(4)
+        double(5)
+    with pytest.raises(ValueError):
+        fail()
+
+    assert stop_profiling() is profile
+    assert get_profile() is None
+    double(6)  # not recorded after stopping
+
+    scopes = profile.to_dict()["scopes"]
+    assert set(scopes) == {"", "Beam Path", "Other Path"}
+    assert scopes[""]["timings"]["double"]["calls"] == 1
+    assert scopes[""]["timings"]["fail"]["calls"] == 1
+    assert scopes[""]["counters"] == {"things": 1}
+    assert scopes["Beam Path"]["timings"]["double"]["calls"] == 3
+    assert scopes["Beam Path"]["counters"] == {"things": 4}
+    assert scopes["Other Path"]["timings"]["double"]["calls"] == 1
+    assert scopes["Other Path"]["counters"] == {}
+    assert all(
+        timing["seconds"] >= 0
+        for data in scopes.values()
+        for timing in data["timings"].values()
+    )
+
+
+def test_counters_without_timings():
+    profile = Profile()
+    profile.scope = "Beam Path"
+    profile.add_count("intercept_tests", 10)
+    assert profile.to_dict() == dict(
+        scopes={"Beam Path": dict(timings={}, counters={"intercept_tests": 10})}
+    )
+
+
+def test_summary_and_save(tmp_path):
+    profile = Profile()
+    profile.add_time("fast", 1e-3)
+    profile.add_time("slow", 2e-3)
+    profile.add_time("slow", 4e-3)
+    profile.scope = "A long beam path label that is cut off"
+    profile.add_count("intercept_tests", 7)
+
+    lines = profile.summary().splitlines()
+    assert lines[0].split() == ["scope", "function", "calls", "total", "ms", "mean", "us"]
+    # slowest function first, with total milliseconds and mean microseconds
+    assert lines[1].split() == ["slow", "2", "6.00", "3000.0"]
+    assert lines[2].split() == ["fast", "1", "1.00", "1000.0"]
+    assert lines[3].startswith("A long beam path label t ")
+    assert lines[3].split()[-2:] == ["intercept_tests", "7"]
+
+    profile.save(tmp_path / "profile.json")
+    with open(tmp_path / "profile.json") as file:
+        assert json.load(file) == profile.to_dict()
+
+
+def test_trace_is_profiled():
+    profile = start_profiling()
+    with profile_scope("Ladder"):
+        Tracer(make_ladder(), max_depth=4).trace()
+    intersect(make_ladder().table, np.zeros(3), np.array([1.0, 0, 0]))
+    stop_profiling()
+
+    scopes = profile.to_dict()["scopes"]
+    assert scopes["Ladder"]["timings"]["step"]["calls"] > 0
+    assert scopes["Ladder"]["counters"]["intercept_tests"] > 0
+    assert scopes[""]["counters"] == {"intercept_tests": 2}
+    assert get_profile() is None
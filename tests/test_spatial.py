@@ -0,0 +1,227 @@
+import numpy as np
+import pytest
+
+from PyOpticL.spatial import (
+    BoundingVolumeHierarchy,
+    IncrementalBoxIndex,
+    SegmentIndex,
+    ray_box_distances,
+    segment_boxes,
+)
+
+
+def random_boxes(rng, count):
+    centers = rng.uniform(-50, 50, (count, 3))
+    sizes = rng.uniform(0, 8, (count, 3))
+    # some flat boxes, as swept by segments along an axis
+    sizes[rng.random((count, 3)) < 0.1] = 0
+    return centers - sizes / 2, centers + sizes / 2
+
+
+def brute_ray(lower, upper, origin, direction, max_distance=np.inf):
+    hits = []
+    for i in range(len(lower)):
+        t_enter, t_exit = -np.inf, np.inf
+        for axis in range(3):
+            if direction[axis] == 0:
+                if not lower[i, axis] <= origin[axis] <= upper[i, axis]:
+                    break
+                continue
+            t1 = (lower[i, axis] - origin[axis]) / direction[axis]
+            t2 = (upper[i, axis] - origin[axis]) / direction[axis]
+            t_enter = max(t_enter, min(t1, t2))
+            t_exit = min(t_exit, max(t1, t2))
+        else:
+            if t_enter <= t_exit and t_exit >= 0 and t_enter <= max_distance:
+                hits.append(i)
+    return np.array(hits, dtype=int)
+
+
+def brute_box(lower, upper, query_lower, query_upper):
+    overlap = np.all((lower <= query_upper) & (upper >= query_lower), axis=1)
+    return np.flatnonzero(overlap)
+
+
+def random_rays(rng, count):
+    origins = rng.uniform(-60, 60, (count, 3))
+    directions = rng.normal(size=(count, 3))
+    # axis aligned rays exercise the parallel slab case
+    directions[rng.random((count, 3)) < 0.2] = 0
+    directions[np.all(directions == 0, axis=1), 0] = 1
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return origins, directions
+
+
+@pytest.mark.parametrize("count", [0, 1, 3, 50, 500])
+@pytest.mark.parametrize("leaf_size", [1, 4])
+def test_queries_match_brute_force(count, leaf_size):
+    rng = np.random.default_rng(count + leaf_size)
+    lower, upper = random_boxes(rng, count)
+    hierarchy = BoundingVolumeHierarchy(lower, upper, leaf_size)
+    assert len(hierarchy) == count
+
+    origins, directions = random_rays(rng, 40)
+    for origin, direction, max_distance in zip(
+        origins, directions, rng.choice([np.inf, 20.0, 80.0], 40)
+    ):
+        np.testing.assert_array_equal(
+            hierarchy.query_ray(origin, direction, max_distance),
+            brute_ray(lower, upper, origin, direction, max_distance),
+        )
+
+    for center, size in zip(rng.uniform(-50, 50, (40, 3)), rng.uniform(0, 30, (40, 3))):
+        np.testing.assert_array_equal(
+            hierarchy.query_box(center - size / 2, center + size / 2),
+            brute_box(lower, upper, center - size / 2, center + size / 2),
+        )
+
+
+def test_coincident_centers():
+    rng = np.random.default_rng(0)
+    sizes = rng.uniform(1, 10, (20, 3))
+    hierarchy = BoundingVolumeHierarchy(-sizes / 2, sizes / 2, leaf_size=2)
+
+    np.testing.assert_array_equal(
+        hierarchy.query_ray([-100, 0, 0], [1, 0, 0]), np.arange(20)
+    )
+    np.testing.assert_array_equal(
+        hierarchy.query_box([4, -1, -1], [6, 1, 1]),
+        brute_box(-sizes / 2, sizes / 2, [4, -1, -1], [6, 1, 1]),
+    )
+
+
+def test_infinite_boxes():
+    origins = np.array([[0, 0, 0], [10, 0, 0], [0, 10, 0]], dtype=float)
+    directions = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=float)
+    lower, upper = segment_boxes(origins, directions, [np.inf, 5, np.inf])
+    hierarchy = BoundingVolumeHierarchy(lower, upper)
+
+    np.testing.assert_array_equal(hierarchy.query_box([1e6, -1, -1], [1e6, 1, 1]), [0])
+    np.testing.assert_array_equal(hierarchy.query_box([9, 1, -1], [11, 2, 1]), [1])
+    np.testing.assert_array_equal(hierarchy.query_box([-1, 9, 1e3], [1, 11, 1e3]), [2])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_update_matches_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    lower, upper = random_boxes(rng, 200)
+    hierarchy = BoundingVolumeHierarchy(lower, upper)
+
+    for _ in range(5):
+        moved = rng.choice(200, size=rng.integers(1, 20), replace=False)
+        new_lower, new_upper = random_boxes(rng, len(moved))
+        hierarchy.update(moved, new_lower, new_upper)
+        lower[moved], upper[moved] = new_lower, new_upper
+
+        # partial refit gives the same bounds as refitting every node
+        node_lower, node_upper = hierarchy.node_lower.copy(), hierarchy.node_upper.copy()
+        hierarchy.refit()
+        np.testing.assert_array_equal(node_lower, hierarchy.node_lower)
+        np.testing.assert_array_equal(node_upper, hierarchy.node_upper)
+
+        origins, directions = random_rays(rng, 20)
+        for origin, direction in zip(origins, directions):
+            np.testing.assert_array_equal(
+                hierarchy.query_ray(origin, direction),
+                brute_ray(lower, upper, origin, direction),
+            )
+        for center in rng.uniform(-50, 50, (20, 3)):
+            np.testing.assert_array_equal(
+                hierarchy.query_box(center - 10, center + 10),
+                brute_box(lower, upper, center - 10, center + 10),
+            )
+
+
+def test_incremental_index():
+    rng = np.random.default_rng(0)
+    lower, upper = random_boxes(rng, 300)
+    index = IncrementalBoxIndex()
+
+    for i in range(len(lower)):
+        assert index.insert(lower[i], upper[i]) == i
+        assert len(index) == i + 1
+        if i % 37 == 0:
+            for center in rng.uniform(-50, 50, (5, 3)):
+                np.testing.assert_array_equal(
+                    index.query_box(center - 15, center + 15),
+                    brute_box(lower[: i + 1], upper[: i + 1], center - 15, center + 15),
+                )
+    assert index.hierarchy is not None
+
+
+def test_incremental_index_update():
+    rng = np.random.default_rng(1)
+    lower, upper = random_boxes(rng, 100)
+    index = IncrementalBoxIndex()
+    for i in range(len(lower)):
+        index.insert(lower[i], upper[i])
+    assert 0 < index.indexed < len(index)
+
+    # move boxes both in the hierarchy and in the pending list
+    moved = np.array([0, 5, 40, 98, 99])
+    lower[moved], upper[moved] = random_boxes(rng, len(moved))
+    index.update(moved, lower[moved], upper[moved])
+    for center in rng.uniform(-50, 50, (20, 3)):
+        np.testing.assert_array_equal(
+            np.sort(index.query_box(center - 15, center + 15)),
+            brute_box(lower, upper, center - 15, center + 15),
+        )
+
+
+def random_segments(rng, count):
+    origins = rng.uniform(-50, 50, (count, 3))
+    directions = rng.normal(size=(count, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return origins, directions, rng.uniform(1, 30, count)
+
+
+def test_segment_index():
+    rng = np.random.default_rng(2)
+    index = SegmentIndex()
+    rays = {}
+
+    def check():
+        lower, upper = {}, {}
+        for owner, (origins, directions, lengths) in rays.items():
+            lower[owner], upper[owner] = segment_boxes(origins, directions, lengths)
+        for center in rng.uniform(-50, 50, (20, 3)):
+            expected = sorted(
+                (owner, f"{owner}{i}")
+                for owner in rays
+                for i in brute_box(lower[owner], upper[owner], center - 10, center + 10)
+            )
+            found = sorted(
+                (index.owners[i], index.segments[i])
+                for i in index.query_box(center - 10, center + 10)
+            )
+            assert found == expected
+
+    # replace the rays of single owners with more, fewer and no rays
+    for owner, count in [("A", 30), ("B", 50), ("A", 10), ("C", 40), ("B", 60), ("A", 0)]:
+        rays[owner] = random_segments(rng, count)
+        index.set_rays(owner, *rays[owner], [f"{owner}{i}" for i in range(count)])
+        check()
+    assert "A" in index
+    index.remove("B")
+    del rays["B"]
+    check()
+    assert "B" not in index
+
+    # unused boxes are reused before new boxes are inserted
+    total = len(index.owners)
+    rays["D"] = random_segments(rng, 20)
+    index.set_rays("D", *rays["D"], [f"D{i}" for i in range(20)])
+    assert len(index.owners) == total
+    check()
+    np.testing.assert_array_equal(
+        index.origins[index.slots["D"]], rays["D"][0]
+    )
+
+
+def test_ray_box_distances():
+    lower = np.array([[1, -1, -1], [-3, -1, -1], [1, 2, -1]], dtype=float)
+    upper = np.array([[2, 1, 1], [-2, 1, 1], [2, 3, 1]], dtype=float)
+    t_enter, t_exit = ray_box_distances([0, 0, 0], [1, 0, 0], lower, upper)
+
+    np.testing.assert_array_equal(t_enter, [1, -3, np.inf])
+    np.testing.assert_array_equal(t_exit, [2, -2, 2])
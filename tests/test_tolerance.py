@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from scenes import make_child_scene
+
+from PyOpticL.tolerance import Tolerance, ToleranceAnalysis, euler_matrices
+from PyOpticL.trace import Tracer
+
+
+def make_analysis(tolerance):
+    """Analysis of the mirror/dump scene, with the mirror placed by a nominal trace"""
+
+    scene = make_child_scene()
+    Tracer(scene).trace()
+    return ToleranceAnalysis(scene, {"M": tolerance}, ["D"])
+
+
+def test_tolerance_sample():
+    rng = np.random.default_rng(0)
+    offsets, rotations = Tolerance(position=(1, 0, 2), angle=0).sample(rng, 1000)
+    assert offsets.shape == (1000, 3) and rotations.shape == (1000, 3, 3)
+    np.testing.assert_allclose(np.std(offsets, axis=0), [1, 0, 2], rtol=0.1)
+    np.testing.assert_array_equal(rotations, np.broadcast_to(np.eye(3), (1000, 3, 3)))
+
+    offsets, _ = Tolerance(position=0.5, distribution="uniform").sample(rng, 1000)
+    assert np.all(np.abs(offsets) <= 0.5)
+    with pytest.raises(ValueError):
+        Tolerance(distribution="triangular")
+
+
+def test_euler_matrices():
+    angles = np.deg2rad([[90, 0, 0], [0, 90, 0], [0, 0, 90]])
+    rotations = euler_matrices(angles)
+    np.testing.assert_allclose(rotations[0] @ [0, 1, 0], [0, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(rotations[1] @ [0, 0, 1], [1, 0, 0], atol=1e-12)
+    np.testing.assert_allclose(rotations[2] @ [1, 0, 0], [0, 1, 0], atol=1e-12)
+
+
+def test_zero_tolerance():
+    (result,) = make_analysis(Tolerance()).run(20, seed=1, processes=1)
+
+    assert result.name == "D"
+    np.testing.assert_array_equal(result.hit, True)
+    np.testing.assert_allclose(result.offsets, 0, atol=1e-9)
+    np.testing.assert_allclose(result.angles, 0, atol=1e-6)
+    np.testing.assert_allclose(result.coupling, 1)
+    statistics = result.statistics()
+    assert statistics["hit_rate"] == 1
+    assert statistics["coupling"]["mean"] == pytest.approx(1)
+
+
+def test_mirror_angle_error():
+    analysis = make_analysis(Tolerance(angle=1))
+    analysis.nominal = analysis.measure(analysis.perturb({}, {}))
+
+    # a mirror turned by an angle turns the reflected beam by twice that angle
+    angle = np.deg2rad(0.1)
+    measurement = analysis.measure(
+        analysis.perturb({"M": np.zeros(3)}, {"M": euler_matrices(np.array([0, 0, angle]))})
+    )
+    result = analysis.get_result("D", [measurement])
+
+    # the dump is 40 mm from the mirror
+    np.testing.assert_allclose(result.offsets[0], [0, 40 * np.tan(2 * angle)], atol=1e-9)
+    assert result.angles[0] == pytest.approx(2 * angle)
+    assert 0 < result.coupling[0] < 1
+
+
+def test_processes_match_serial():
+    analysis = make_analysis(Tolerance(position=0.5, angle=0.5))
+    serial = analysis.run(40, seed=3, processes=1, chunk_size=10)
+    forked = analysis.run(40, seed=3, processes=2, chunk_size=10)
+
+    for a, b in zip(serial, forked):
+        np.testing.assert_array_equal(a.hit, b.hit)
+        np.testing.assert_array_equal(a.offsets, b.offsets)
+        np.testing.assert_array_equal(a.angles, b.angles)
+        np.testing.assert_array_equal(a.coupling, b.coupling)
+
+
+def test_misses_count_against_coupling():
+    # large angle errors turn the beam off the dump in some samples
+    (result,) = make_analysis(Tolerance(angle=20)).run(50, seed=0, processes=1)
+    assert 0 < np.sum(~result.hit) < 50
+    assert np.all(np.isnan(result.offsets[~result.hit]))
+    assert np.all(result.coupling[~result.hit] == 0)
+
+    statistics = result.statistics()
+    assert statistics["hit_rate"] == pytest.approx(np.mean(result.hit))
+    assert statistics["coupling"]["mean"] == pytest.approx(np.mean(result.coupling))
+    assert statistics["angle"]["mean"] == pytest.approx(np.mean(result.angles[result.hit]))
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+from scenes import make_child_scene, make_ladder
+
+from PyOpticL.trace import Tracer
+
+
+def get_depth(record):
+    depth = 0
+    while record.parent is not None:
+        record = record.parent
+        depth += 1
+    return depth
+
+
+@pytest.mark.parametrize("policy", ["depth", "breadth", "power"])
+def test_segment_cap(policy):
+    tracer = Tracer(make_ladder(), policy, max_segments=50)
+    result = tracer.trace()
+
+    assert 0 < len(result.segments) <= 50
+    assert result.stats.truncated_segments > 0
+    assert tracer.alive_count == len(result.segments)
+
+
+@pytest.mark.parametrize("policy", ["depth", "breadth", "power"])
+def test_depth_cap(policy):
+    result = Tracer(make_ladder(), policy, max_depth=6).trace()
+
+    assert max(get_depth(record) for record in result.segments) == 6
+    assert result.stats.max_depth == 6
+    assert result.stats.truncated_depth > 0
+    assert result.stats.truncated_segments == 0
+
+
+def test_policies_trace_the_same_tree():
+    trees = []
+    for policy in ("depth", "breadth", "power"):
+        result = Tracer(make_ladder(), policy, max_depth=6).trace()
+        trees.append(
+            sorted(
+                (record.index, record.start, record.end, round(record.distance, 9))
+                for record in result.segments
+            )
+        )
+    assert trees[0] == trees[1] == trees[2]
+
+
+def test_min_power():
+    tracer = Tracer(make_ladder(), min_power=1e-3)
+    result = tracer.trace()
+
+    assert not result.stats.truncated
+    assert result.stats.pruned_power > 0
+    assert all(record.power >= 1e-3 for record in result.segments)
+    assert tracer.alive_count == len(result.segments)
+
+
+def test_retrace_reuses_records():
+    first = Tracer(make_ladder(), max_depth=6).trace()
+    segments = first.segments
+    root = segments[0]
+    assert root.parent is None
+
+    # re-tracing an unchanged scene from the root keeps every record
+    tracer = Tracer(make_ladder(segments), max_depth=6)
+    second = tracer.trace(retrace=[root])
+
+    assert {id(record) for record in second.segments} == {
+        id(record) for record in segments
+    }
+    assert len(second.records) == len(segments)
+    assert tracer.alive_count == len(segments)
+    assert not any(record.reparented for record in second.segments)
+
+
+def test_retrace_after_move_keeps_unchanged_records():
+    first = Tracer(make_ladder(), max_depth=6).trace()
+    segments = first.segments
+    before = {(record.index, record.start): record for record in segments}
+
+    # moving the second reflector changes everything that reaches it
+    scene = make_ladder(segments)
+    scene.table.positions[1] = [25, 0, 0]
+    second = Tracer(scene, max_depth=6).trace(retrace=[segments[0]])
+
+    reused = [
+        record
+        for record in second.segments
+        if before.get((record.index, record.start)) is record
+    ]
+    # the root and the first reflection from W1 are not affected by the move
+    assert any(record.index == 0b11 and record.start == "W1" for record in reused)
+    assert all(record.alive for record in second.segments)
+    assert sum(record.alive for record in second.records) == len(second.segments)
+
+
+def test_child_placement():
+    scene = make_child_scene(bound=True)
+    result = Tracer(scene).trace()
+    root, crossing = scene.segments
+    child = scene.children[0]
+
+    assert result.placed == [child]
+    assert child.placed
+    np.testing.assert_allclose(child.base, [20, 0, 0])
+    np.testing.assert_allclose(scene.table.positions[0], [20, 0, 0])
+    assert scene.active[0]
+
+    assert root.end == "M" and root.distance == pytest.approx(20)
+    (reflected,) = root.children
+    np.testing.assert_allclose(reflected.direction, [0, 1, 0], atol=1e-12)
+    assert reflected.end == "D"
+
+    # the placed mirror blocks the crossing beam
+    assert crossing.end == "M" and crossing.distance == pytest.approx(30)
+
+
+def test_unbound_child_stays_inactive():
+    scene = make_child_scene(bound=False)
+    result = Tracer(scene).trace()
+    root, crossing = scene.segments
+
+    assert result.placed == [scene.children[0]]
+    assert not scene.active[0]
+    # the child still interacts with its own beam, but not with other beams
+    assert root.end == "M"
+    assert root.children[0].end == "D"
+    assert crossing.end == "D" and crossing.distance == pytest.approx(70)